@@ -0,0 +1,117 @@
+"""
+شمارنده‌های داشبورد مدیریت با cache
+
+همه شمارنده‌های هر مدل در یک aggregate (با Count/Sum و filter) محاسبه و برای
+ADMIN_DASHBOARD_CACHE_TIMEOUT ثانیه cache می‌شوند. ذخیره یا حذف هر مدل مرتبط
+(accounts.signals) cache شمارنده‌ها را باطل می‌کند؛ شمارنده‌های وابسته به زمان
+(هفته گذشته) و آمار بازدید فقط با TTL تازه می‌شوند.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Profile
+
+
+COUNTERS_CACHE_KEY = "admin_dashboard:counters"
+VISITS_CACHE_KEY = "admin_dashboard:visits"
+
+
+def cache_timeout():
+    return getattr(settings, "ADMIN_DASHBOARD_CACHE_TIMEOUT", 60)
+
+
+def _cached(key, compute):
+    timeout = cache_timeout()
+    if not timeout:
+        return compute()
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, timeout)
+    return data
+
+
+def invalidate_counters():
+    cache.delete(COUNTERS_CACHE_KEY)
+
+
+def compute_counters(now=None):
+    """شمارنده‌های کاربران، ویدیوها، مقالات، محصولات، سفارشات و تنظیمات (یک پرس‌وجو برای هر مدل)"""
+    from blog.models import Post
+    from core.models import ContactMessage
+    from courses.models import Video
+    from shop.models import Order, Product
+    from siteconfig.models import HomePageSection, Slide
+
+    week_ago = (now or timezone.now()) - timedelta(days=7)
+    paid = Q(status=Order.Status.PAID)
+
+    counters = get_user_model().objects.aggregate(
+        total_users=Count("id"),
+        total_admins=Count("id", filter=Q(profile__user_category=Profile.UserCategory.ADMIN)),
+        total_regular_users=Count("id", filter=Q(profile__user_category=Profile.UserCategory.USER)),
+        recent_users=Count("id", filter=Q(date_joined__gte=week_ago)),
+    )
+    counters.update(Video.objects.aggregate(
+        total_videos=Count("id"),
+        featured_videos=Count("id", filter=Q(is_featured=True)),
+        free_videos=Count("id", filter=Q(is_free=True)),
+        recent_videos=Count("id", filter=Q(created_at__gte=week_ago)),
+    ))
+    counters.update(Post.objects.aggregate(
+        total_posts=Count("id"),
+        featured_posts=Count("id", filter=Q(is_featured=True)),
+        total_post_views=Sum("views_count"),
+        recent_posts=Count("id", filter=Q(published_at__gte=week_ago)),
+    ))
+    counters.update(Product.objects.aggregate(
+        total_products=Count("id"),
+        active_products=Count("id", filter=Q(is_active=True)),
+    ))
+    counters.update(Order.objects.aggregate(
+        total_orders=Count("id"),
+        paid_orders=Count("id", filter=paid),
+        total_revenue=Sum("total_amount", filter=paid),
+        recent_orders=Count("id", filter=Q(created_at__gte=week_ago)),
+    ))
+    counters["total_post_views"] = counters["total_post_views"] or 0
+    counters["total_revenue"] = counters["total_revenue"] or 0
+    counters["total_contact_messages"] = ContactMessage.objects.count()
+    counters["home_sections_count"] = HomePageSection.objects.filter(is_active=True).count()
+    counters["active_slides_count"] = Slide.objects.filter(is_active=True).count()
+    return counters
+
+
+def compute_visit_stats(now=None):
+    """آمار بازدید ۷ روز گذشته از rollup های روزانه + داده خام امروز"""
+    from core.models import DailyTopK
+    from core.rollups import RollupRange
+
+    week_ago = (now or timezone.now()) - timedelta(days=7)
+    visits_range = RollupRange(timezone.localdate(week_ago))
+    visits_total_7_days = visits_range.visit_totals()["visits"]
+    device_counts = {row["device_type"]: row["count"] for row in visits_range.top_visits("device_type")}
+    mobile_visits = device_counts.get("mobile", 0)
+    return {
+        "visits_total_7_days": visits_total_7_days,
+        "visits_by_day": list(visits_range.visits_by_day()),
+        # فقط اولین صفحه برای خلاصه داشبورد
+        "top_pages": visits_range.top_k(DailyTopK.Dimension.PATH, ["path"])[:1],
+        "top_referrers": visits_range.top_k(DailyTopK.Dimension.REFERRER, ["referrer"])[:10],
+        "mobile_visits": mobile_visits,
+        "desktop_visits": visits_total_7_days - mobile_visits,
+    }
+
+
+def dashboard_counters():
+    return _cached(COUNTERS_CACHE_KEY, compute_counters)
+
+
+def dashboard_visit_stats():
+    # SiteVisit با bulk_create نوشته می‌شود و سیگنال ندارد؛ فقط TTL
+    return _cached(VISITS_CACHE_KEY, compute_visit_stats)
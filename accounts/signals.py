@@ -1,6 +1,14 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+
+from blog.models import Post
+from core.models import ContactMessage
+from courses.models import Video
+from shop.models import Order, Product
+from siteconfig.models import HomePageSection, Slide
+
+from .dashboard import invalidate_counters
 from .models import Profile
 
 
@@ -17,5 +25,17 @@ def create_profile(sender, instance: User, created: bool, **kwargs):
             profile.save()
 
 
+# مدل‌هایی که شمارنده‌های داشبورد مدیریت از آن‌ها خوانده می‌شود
+DASHBOARD_MODELS = (User, Profile, Video, Post, Product, Order, ContactMessage, HomePageSection, Slide)
+
+
+def invalidate_dashboard_counters(sender, update_fields=None, **kwargs):
+    # افزایش views_count در هر بازدید مقاله cache را باطل نمی‌کند (با TTL تازه می‌شود)
+    if update_fields is not None and set(update_fields) == {"views_count"}:
+        return
+    invalidate_counters()
 
 
+for model in DASHBOARD_MODELS:
+    post_save.connect(invalidate_dashboard_counters, sender=model, dispatch_uid=f"dashboard_save_{model.__name__}")
+    post_delete.connect(invalidate_dashboard_counters, sender=model, dispatch_uid=f"dashboard_delete_{model.__name__}")
@@ -1,10 +1,19 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from accounts.forms import SignUpForm
 from accounts.models import Profile
-from tests.factories import create_user
+from core.geoip import enrich_countries
+from core.models import AnonymousVisitor, SiteVisit
+from core.rollups import day_start, rollup_day
+from tests.factories import create_user, create_video
 
 
 class SignUpFormTests(TestCase):
@@ -63,3 +72,84 @@ class ProfileEditViewTests(TestCase):
         self.assertEqual(profile.level, "B1")
         self.assertTrue(profile.newsletter_opt_in)
         self.assertEqual(profile.website, "https://example.com")
+
+
+class AnalyticsViewsTests(TestCase):
+    def setUp(self):
+        self.user, self.password = create_user(username="site_admin")
+        Profile.objects.filter(user=self.user).update(user_category=Profile.UserCategory.ADMIN)
+        self.client.login(username=self.user.username, password=self.password)
+        cache.clear()
+
+    def test_admin_dashboard_renders(self):
+        response = self.client.get(reverse("accounts:admin_dashboard"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_dashboard_counters_are_cached_and_invalidated(self):
+        self.client.get(reverse("accounts:admin_dashboard"))
+        # شمارنده‌ها، تعداد کل صفحه‌بندی‌ها و آمار بازدید از cache خوانده می‌شوند
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("accounts:admin_dashboard"))
+        self.assertFalse([query["sql"] for query in queries if "COUNT(" in query["sql"]])
+        self.assertEqual(response.context["total_videos"], 0)
+
+        create_video(title="Cached Counters")
+        response = self.client.get(reverse("accounts:admin_dashboard"))
+        self.assertEqual(response.context["total_videos"], 1)
+        self.assertEqual(len(response.context["latest_videos"].object_list), 1)
+
+    def test_analytics_lists_use_cursor_pagination(self):
+        for _ in range(3):
+            self.client.get(reverse("core:about"))
+        # شماره صفحه قدیمی (OFFSET) cursor معتبر نیست و صفحه اول نمایش داده می‌شود
+        response = self.client.get(reverse("accounts:analytics_anonymous_visitors"), {"visitors_page": "2"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse("accounts:analytics_user_detail", args=[self.user.id]), {"user_visits_page": "2"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["latest_visits"]), response.context["total_visits"])
+        self.assertFalse(response.context["latest_visits"].has_other_pages())
+
+    def test_anonymous_visitor_pages_are_stable_when_visitors_return(self):
+        AnonymousVisitor.objects.bulk_create(AnonymousVisitor(session_key=f"s{i}") for i in range(30))
+        url = reverse("accounts:analytics_anonymous_visitors")
+        first_page = self.client.get(url).context["visitors"]
+        # بازدیدکننده‌ای از صفحه دوم دوباره بازدید می‌کند و last_seen آن تازه می‌شود
+        returning = AnonymousVisitor.objects.order_by("id").first()
+        returning.save()
+        second_page = self.client.get(url, {"visitors_page": first_page.next_cursor}).context["visitors"]
+        seen = [visitor.session_key for visitor in [*first_page, *second_page]]
+        self.assertEqual(sorted(seen), sorted(f"s{i}" for i in range(30)))
+
+    def test_analytics_detail_shows_countries_enriched_after_rollup(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        SiteVisit.objects.create(path="/", method="GET", ip_address="8.8.8.8", created_at=day_start(yesterday))
+        SiteVisit.objects.create(path="/", method="GET", ip_address="8.8.8.8")
+        SiteVisit.objects.create(path="/", method="GET", ip_address="5.0.0.1")
+        rollup_day(yesterday)
+
+        stats = enrich_countries(resolve={"8.8.8.8": "US", "5.0.0.1": "IR"}.get)
+        self.assertEqual(stats["rebuilt_days"], [yesterday])
+        response = self.client.get(reverse("accounts:analytics_detail"))
+        self.assertEqual(
+            [(row["country"], row["count"]) for row in response.context["top_countries"]],
+            [("US", 2), ("IR", 1)],
+        )
+
+    def test_analytics_detail_renders(self):
+        self.client.get(reverse("core:about"))
+        self.client.post(
+            reverse("core:youtube_click"), {"youtube_url": "https://youtu.be/abc123"}, HTTP_REFERER="https://example.com/"
+        )
+        response = self.client.get(reverse("accounts:analytics_detail"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_visits"], 1)
+        self.assertEqual(
+            response.context["top_youtube_users"],
+            [{"user__id": self.user.id, "count": 1, "user__username": "site_admin", "user__email": self.user.email}],
+        )
+        self.assertEqual(
+            response.context["top_youtube_referrers"], [{"referrer_text": "https://example.com/", "count": 1}]
+        )
+        self.assertEqual(response.context["top_youtube_videos"][0]["unique_clickers"], 1)
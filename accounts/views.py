@@ -3,10 +3,11 @@ from django.urls import reverse_lazy
 from django.views.generic import CreateView, TemplateView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q, Sum
+from django.db.models import Count, F, Q, Sum
 from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from core.pagination import InvalidCursor, KeysetPaginator
 from datetime import timedelta
 from .models import Profile
 from .forms import SignUpForm, CustomAuthForm, ProfileEditForm
@@ -79,43 +80,16 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
         # Import models
         from courses.models import Video
         from blog.models import Post
-        from shop.models import Product, Order
-        from siteconfig.models import HomePageSection, Slide
-        from core.models import SiteVisit, ContactMessage
-        
-        # آمار کلی
-        total_users = User.objects.count()
-        total_admins = User.objects.filter(profile__user_category=Profile.UserCategory.ADMIN).count()
-        total_regular_users = User.objects.filter(profile__user_category=Profile.UserCategory.USER).count()
-        
-        total_videos = Video.objects.count()
-        featured_videos = Video.objects.filter(is_featured=True).count()
-        free_videos = Video.objects.filter(is_free=True).count()
-        
-        total_posts = Post.objects.count()
-        featured_posts = Post.objects.filter(is_featured=True).count()
-        total_post_views = Post.objects.aggregate(total=Sum("views_count"))["total"] or 0
-        
-        total_products = Product.objects.count()
-        active_products = Product.objects.filter(is_active=True).count()
-        
-        total_orders = Order.objects.count()
-        paid_orders = Order.objects.filter(status=Order.Status.PAID).count()
-        total_revenue = Order.objects.filter(status=Order.Status.PAID).aggregate(
-            total=Sum("total_amount")
-        )["total"] or 0
-        
-        # آمار پیام‌های تماس
-        total_contact_messages = ContactMessage.objects.count()
+        from shop.models import Order
+        from core.models import ContactMessage
+        from .dashboard import dashboard_counters, dashboard_visit_stats
         
-        # آمار هفته گذشته
-        week_ago = timezone.now() - timedelta(days=7)
-        recent_users = User.objects.filter(date_joined__gte=week_ago).count()
-        recent_videos = Video.objects.filter(created_at__gte=week_ago).count()
-        recent_posts = Post.objects.filter(published_at__gte=week_ago).count()
-        recent_orders = Order.objects.filter(created_at__gte=week_ago).count()
+        # شمارنده‌ها و آمار بازدید از cache (accounts.dashboard)
+        counters = dashboard_counters()
+        context.update(counters)
+        context.update(dashboard_visit_stats())
         
-        # آخرین فعالیت‌ها با pagination
+        # آخرین فعالیت‌ها با pagination (تعداد کل از همان شمارنده‌های cache شده، بدون COUNT جداگانه)
         videos_qs = Video.objects.order_by("-created_at")
         posts_qs = Post.objects.order_by("-published_at")
         orders_qs = Order.objects.order_by("-created_at")
@@ -124,6 +98,7 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
         
         # Pagination برای ویدیوها
         videos_paginator = Paginator(videos_qs, 10)
+        videos_paginator.count = counters["total_videos"]
         videos_page = self.request.GET.get('videos_page', 1)
         try:
             latest_videos = videos_paginator.page(videos_page)
@@ -132,6 +107,7 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
         
         # Pagination برای مقالات
         posts_paginator = Paginator(posts_qs, 10)
+        posts_paginator.count = counters["total_posts"]
         posts_page = self.request.GET.get('posts_page', 1)
         try:
             latest_posts = posts_paginator.page(posts_page)
@@ -140,6 +116,7 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
         
         # Pagination برای سفارشات
         orders_paginator = Paginator(orders_qs, 10)
+        orders_paginator.count = counters["total_orders"]
         orders_page = self.request.GET.get('orders_page', 1)
         try:
             latest_orders = orders_paginator.page(orders_page)
@@ -148,6 +125,7 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
         
         # Pagination برای کاربران
         users_paginator = Paginator(users_qs, 10)
+        users_paginator.count = counters["total_users"]
         users_page = self.request.GET.get('users_page', 1)
         try:
             latest_users = users_paginator.page(users_page)
@@ -155,73 +133,13 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
             latest_users = users_paginator.page(1)
         
         # Pagination برای پیام‌های تماس (خلاصه داشبورد)
-        messages_paginator = Paginator(messages_qs, 5)
-        messages_page = self.request.GET.get('messages_page', 1)
+        messages_paginator = KeysetPaginator(messages_qs, 5, count=counters["total_contact_messages"])
         try:
-            latest_messages = messages_paginator.page(messages_page)
-        except (PageNotAnInteger, EmptyPage):
-            latest_messages = messages_paginator.page(1)
-        
-        # تعداد بخش‌های صفحه هوم
-        home_sections_count = HomePageSection.objects.filter(is_active=True).count()
-        active_slides_count = Slide.objects.filter(is_active=True).count()
-
-        # آمار بازدید سایت (۷ روز گذشته)
-        visits_7_days_qs = SiteVisit.objects.filter(created_at__gte=week_ago)
-        visits_total_7_days = visits_7_days_qs.count()
-
-        visits_by_day = (
-            visits_7_days_qs.annotate(day=TruncDate("created_at"))
-            .values("day")
-            .annotate(count=Count("id"))
-            .order_by("day")
-        )
-
-        top_pages = (
-            visits_7_days_qs.values("path")
-            .annotate(count=Count("id"))
-            .order_by("-count")[:1]  # فقط اولین صفحه برای خلاصه داشبورد
-        )
-
-        top_referrers = (
-            visits_7_days_qs.exclude(referrer="")
-            .values("referrer")
-            .annotate(count=Count("id"))
-            .order_by("-count")[:10]
-        )
-
-        mobile_visits = visits_7_days_qs.filter(user_agent__icontains="mobile").count()
-        desktop_visits = visits_7_days_qs.count() - mobile_visits
+            latest_messages = messages_paginator.page(self.request.GET.get('messages_page'))
+        except InvalidCursor:
+            latest_messages = messages_paginator.page()
         
         context.update({
-            # آمار کاربران
-            "total_users": total_users,
-            "total_admins": total_admins,
-            "total_regular_users": total_regular_users,
-            "recent_users": recent_users,
-            
-            # آمار ویدیوها
-            "total_videos": total_videos,
-            "featured_videos": featured_videos,
-            "free_videos": free_videos,
-            "recent_videos": recent_videos,
-            
-            # آمار مقالات
-            "total_posts": total_posts,
-            "featured_posts": featured_posts,
-            "total_post_views": total_post_views,
-            "recent_posts": recent_posts,
-            
-            # آمار محصولات
-            "total_products": total_products,
-            "active_products": active_products,
-            
-            # آمار سفارشات
-            "total_orders": total_orders,
-            "paid_orders": paid_orders,
-            "total_revenue": total_revenue,
-            "recent_orders": recent_orders,
-            
             # آخرین فعالیت‌ها با pagination
             "latest_videos": latest_videos,
             "latest_posts": latest_posts,
@@ -233,21 +151,8 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
             "users_paginator": users_paginator,
             
             # پیام‌های تماس
-            "total_contact_messages": total_contact_messages,
             "latest_messages": latest_messages,
             "messages_paginator": messages_paginator,
-            
-            # تنظیمات صفحه هوم
-            "home_sections_count": home_sections_count,
-            "active_slides_count": active_slides_count,
-
-            # آمار بازدید سایت
-            "visits_total_7_days": visits_total_7_days,
-            "visits_by_day": list(visits_by_day),
-            "top_pages": list(top_pages),
-            "top_referrers": list(top_referrers),
-            "mobile_visits": mobile_visits,
-            "desktop_visits": desktop_visits,
         })
         
         return context
@@ -270,20 +175,25 @@ class AnalyticsDetailView(LoginRequiredMixin, TemplateView):
         
         # Import models
         from core.models import SiteVisit, YouTubeClick
-        from courses.models import Video
-        from blog.models import Post
+        from core.rollups import RollupRange, weighted_count
         
         # دریافت بازه زمانی از query parameter (پیش‌فرض: 30 روز)
         days = int(self.request.GET.get("days", 30))
         days = min(max(days, 1), 365)  # محدود کردن بین 1 تا 365 روز
         
-        date_from = timezone.now() - timedelta(days=days)
+        # روزهای کامل از rollup های روزانه و فقط امروز از داده خام خوانده می‌شود
+        stats_range = RollupRange(timezone.localdate(timezone.now() - timedelta(days=days)))
+        date_from = stats_range.date_from
         
         # آمار بازدیدها
-        visits_qs = SiteVisit.objects.filter(created_at__gte=date_from)
-        total_visits = visits_qs.count()
-        unique_visitors = visits_qs.values("ip_address").distinct().count()
-        logged_in_visits = visits_qs.exclude(user=None).count()
+        visit_totals = stats_range.visit_totals()
+        total_visits = visit_totals["visits"]
+        # شمارش یکتا با sketch های HyperLogLog روزانه (خطای حدود 0.8٪، بدون DISTINCT روی کل بازه)
+        from core.models import DailySketch, DailyTopK
+        uniques = stats_range.uniques(DailySketch.Metric)
+        unique_visitors = uniques[DailySketch.Metric.VISIT_IPS]
+        estimated_unique_visitors = uniques[DailySketch.Metric.VISITORS]
+        logged_in_visits = visit_totals["logged_in_visits"]
         anonymous_visits = total_visits - logged_in_visits
         
         # آمار بازدیدکنندگان ناشناس
@@ -295,40 +205,29 @@ class AnalyticsDetailView(LoginRequiredMixin, TemplateView):
             anonymous_visitor__isnull=False,
             anonymous_visitor__last_seen__gte=date_from,
             created_at__gte=date_from
-        ).count()
+        ).aggregate(total=weighted_count())["total"]
+        
+        # درخواست‌های ربات‌ها (فقط در شمارنده روزانه ثبت می‌شوند)
+        from core.models import DailyBotCounter
+        bot_counters = DailyBotCounter.objects.filter(day__gte=timezone.localdate(date_from))
+        bot_hits = bot_counters.aggregate(total=Sum("hits"))["total"] or 0
+        top_bots = bot_counters.values("bot").annotate(hits=Sum("hits")).order_by("-hits")[:5]
         
         # بازدیدها به تفکیک روز
-        visits_by_day = (
-            visits_qs.annotate(day=TruncDate("created_at"))
-            .values("day")
-            .annotate(count=Count("id"), unique_ips=Count("ip_address", distinct=True))
-            .order_by("day")
-        )
+        visits_by_day = stats_range.visits_by_day()
         
-        # محبوب‌ترین صفحات با pagination
-        top_pages_qs = (
-            visits_qs.values("path")
-            .annotate(
-                count=Count("id"),
-                unique_visitors=Count("ip_address", distinct=True)
-            )
-            .order_by("-count")
-        )
-        top_pages_paginator = Paginator(list(top_pages_qs), 20)
+        # محبوب‌ترین صفحات با pagination (از خلاصه‌های Top-K روزانه، حداکثر ANALYTICS_TOP_K ردیف)
+        top_pages_paginator = Paginator(stats_range.top_k(DailyTopK.Dimension.PATH, ["path"]), 20)
         top_pages_page = self.request.GET.get('top_pages_page', 1)
         try:
             top_pages = top_pages_paginator.page(top_pages_page)
         except (PageNotAnInteger, EmptyPage):
             top_pages = top_pages_paginator.page(1)
+        # آی‌پی‌های یکتا فقط برای صفحات همین صفحه‌بندی، از sketch های روزانه هر صفحه
+        stats_range.annotate_unique(top_pages.object_list, DailyTopK.Dimension.PATH, "unique_visitors")
         
         # منابع ورودی (Referrers) با pagination
-        top_referrers_qs = (
-            visits_qs.exclude(referrer="")
-            .values("referrer")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
-        top_referrers_paginator = Paginator(list(top_referrers_qs), 20)
+        top_referrers_paginator = Paginator(stats_range.top_k(DailyTopK.Dimension.REFERRER, ["referrer"]), 20)
         top_referrers_page = self.request.GET.get('top_referrers_page', 1)
         try:
             top_referrers = top_referrers_paginator.page(top_referrers_page)
@@ -336,170 +235,85 @@ class AnalyticsDetailView(LoginRequiredMixin, TemplateView):
             top_referrers = top_referrers_paginator.page(1)
         
         # بازدیدها به تفکیک دستگاه (بر اساس تعداد بازدیدکننده، نه تعداد بازدید)
-        # برای سادگی، بازدیدکننده را بر اساس IP در نظر می‌گیریم
-        mobile_visits = (
-            visits_qs.filter(device_type="mobile")
-            .values("ip_address")
-            .distinct()
-            .count()
-        )
-        tablet_visits = (
-            visits_qs.filter(device_type="tablet")
-            .values("ip_address")
-            .distinct()
-            .count()
-        )
-        desktop_visits = (
-            visits_qs.filter(device_type="desktop")
-            .values("ip_address")
-            .distinct()
-            .count()
-        )
-        unknown_device_visits = (
-            visits_qs.filter(device_type__in=["", "unknown"])
-            .values("ip_address")
-            .distinct()
-            .count()
-        )
-        
-        # بازدیدکنندگان ناشناس به تفکیک دستگاه (Distinct بر اساس AnonymousVisitor)
-        anonymous_mobile_visits = (
-            visits_qs.filter(anonymous_visitor__isnull=False, device_type="mobile")
-            .values("anonymous_visitor_id")
-            .distinct()
-            .count()
-        )
-        anonymous_tablet_visits = (
-            visits_qs.filter(anonymous_visitor__isnull=False, device_type="tablet")
-            .values("anonymous_visitor_id")
-            .distinct()
-            .count()
-        )
-        anonymous_desktop_visits = (
-            visits_qs.filter(anonymous_visitor__isnull=False, device_type="desktop")
-            .values("anonymous_visitor_id")
-            .distinct()
-            .count()
-        )
-        
-        # بازدیدکنندگان لاگین شده به تفکیک دستگاه (Distinct بر اساس کاربر)
-        logged_mobile_visits = (
-            visits_qs.exclude(user=None)
-            .filter(device_type="mobile")
-            .values("user_id")
-            .distinct()
-            .count()
-        )
-        logged_tablet_visits = (
-            visits_qs.exclude(user=None)
-            .filter(device_type="tablet")
-            .values("user_id")
-            .distinct()
-            .count()
-        )
-        logged_desktop_visits = (
-            visits_qs.exclude(user=None)
-            .filter(device_type="desktop")
-            .values("user_id")
-            .distinct()
-            .count()
-        )
+        # کل بازدیدکنندگان بر اساس IP، ناشناس‌ها بر اساس AnonymousVisitor و لاگین‌شده‌ها بر اساس کاربر
+        # (از sketch های روزانه؛ فقط داده خام امروز خوانده می‌شود)
+        mobile_visits = uniques[DailySketch.Metric.MOBILE_IPS]
+        tablet_visits = uniques[DailySketch.Metric.TABLET_IPS]
+        desktop_visits = uniques[DailySketch.Metric.DESKTOP_IPS]
+        unknown_device_visits = uniques[DailySketch.Metric.UNKNOWN_DEVICE_IPS]
+        anonymous_mobile_visits = uniques[DailySketch.Metric.MOBILE_ANONYMOUS]
+        anonymous_tablet_visits = uniques[DailySketch.Metric.TABLET_ANONYMOUS]
+        anonymous_desktop_visits = uniques[DailySketch.Metric.DESKTOP_ANONYMOUS]
+        logged_mobile_visits = uniques[DailySketch.Metric.MOBILE_USERS]
+        logged_tablet_visits = uniques[DailySketch.Metric.TABLET_USERS]
+        logged_desktop_visits = uniques[DailySketch.Metric.DESKTOP_USERS]
         
         # بازدیدها به تفکیک کد وضعیت
-        status_code_stats = (
-            visits_qs.values("status_code")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
+        status_code_stats = stats_range.top_visits("status_code")
         
         # بازدیدها به تفکیک کشور
-        top_countries_qs = (
-            visits_qs.exclude(country="")
-            .values("country")
-            .annotate(
-                count=Count("id"),
-                unique_ips=Count("ip_address", distinct=True)
-            )
-            .order_by("-count")
-        )
-        top_countries_paginator = Paginator(list(top_countries_qs), 20)
+        top_countries_paginator = Paginator(stats_range.top_k(DailyTopK.Dimension.COUNTRY, ["country"]), 20)
         top_countries_page = self.request.GET.get('top_countries_page', 1)
         try:
             top_countries = top_countries_paginator.page(top_countries_page)
         except (PageNotAnInteger, EmptyPage):
             top_countries = top_countries_paginator.page(1)
+        stats_range.annotate_unique(top_countries.object_list, DailyTopK.Dimension.COUNTRY, "unique_ips")
         
         # آمار کلیک‌های یوتیوب
         youtube_clicks_qs = YouTubeClick.objects.filter(created_at__gte=date_from)
-        total_youtube_clicks = youtube_clicks_qs.count()
-        unique_youtube_clickers = youtube_clicks_qs.values("ip_address").distinct().count()
-        logged_in_youtube_clicks = youtube_clicks_qs.exclude(user=None).count()
+        click_totals = stats_range.click_totals()
+        total_youtube_clicks = click_totals["clicks"]
+        unique_youtube_clickers = uniques[DailySketch.Metric.CLICK_IPS]
+        logged_in_youtube_clicks = click_totals["logged_in_clicks"]
         
         # کلیک‌های یوتیوب به تفکیک روز
-        youtube_clicks_by_day = (
-            youtube_clicks_qs.annotate(day=TruncDate("created_at"))
-            .values("day")
-            .annotate(count=Count("id"))
-            .order_by("day")
-        )
+        youtube_clicks_by_day = stats_range.clicks_by_day()
         
         # محبوب‌ترین ویدیوهای یوتیوب (بر اساس کلیک) با pagination
-        top_youtube_videos_qs = (
-            youtube_clicks_qs.exclude(youtube_id="")
-            .values("youtube_id", "source_title", "source_type")
-            .annotate(
-                count=Count("id"),
-                unique_clickers=Count("ip_address", distinct=True)
-            )
-            .order_by("-count")
-        )
-        top_youtube_videos_paginator = Paginator(list(top_youtube_videos_qs), 20)
+        video_fields = ["youtube_id", "source_title", "source_type"]
+        top_youtube_videos_paginator = Paginator(stats_range.top_k(DailyTopK.Dimension.YOUTUBE_VIDEO, video_fields), 20)
         top_youtube_videos_page = self.request.GET.get('top_youtube_videos_page', 1)
         try:
             top_youtube_videos = top_youtube_videos_paginator.page(top_youtube_videos_page)
         except (PageNotAnInteger, EmptyPage):
             top_youtube_videos = top_youtube_videos_paginator.page(1)
+        stats_range.annotate_unique(top_youtube_videos.object_list, DailyTopK.Dimension.YOUTUBE_VIDEO, "unique_clickers")
         
         # کلیک‌های یوتیوب به تفکیک منبع (ویدیو / مقاله)
-        youtube_clicks_by_source = (
-            youtube_clicks_qs.values("source_type")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
+        youtube_clicks_by_source = stats_range.top_clicks(["source_type"])
         
-        # کاربرانی که بیشترین کلیک روی یوتیوب داشته‌اند
-        top_youtube_users = (
-            youtube_clicks_qs.exclude(user=None)
-            .values("user__id", "user__username", "user__email")
-            .annotate(count=Count("id"))
-            .order_by("-count")[:10]
-        )
+        # کاربرانی که بیشترین کلیک روی یوتیوب داشته‌اند (از خلاصه‌های Top-K؛ فقط 10 کاربر خوانده می‌شوند)
+        top_youtube_users = stats_range.top_k(DailyTopK.Dimension.YOUTUBE_USER, ["user__id"])[:10]
+        youtube_users = User.objects.in_bulk([row["user__id"] for row in top_youtube_users])
+        top_youtube_users = [
+            dict(row, user__username=youtube_users[row["user__id"]].username, user__email=youtube_users[row["user__id"]].email)
+            for row in top_youtube_users
+            if row["user__id"] in youtube_users
+        ]
         
         # مراجعانی که بیشترین کلیک روی یوتیوب داشته‌اند
-        top_youtube_referrers = (
-            youtube_clicks_qs.exclude(referrer="")
-            .values("referrer")
-            .annotate(count=Count("id"))
-            .order_by("-count")[:10]
-        )
+        top_youtube_referrers = stats_range.top_k(DailyTopK.Dimension.YOUTUBE_REFERRER, ["referrer_text"])[:10]
         
         # آخرین کلیک‌های یوتیوب با pagination
         latest_youtube_clicks_qs = youtube_clicks_qs.select_related("user").order_by("-created_at")
-        youtube_clicks_paginator = Paginator(latest_youtube_clicks_qs, 25)
-        youtube_clicks_page = self.request.GET.get('youtube_clicks_page', 1)
+        youtube_clicks_paginator = KeysetPaginator(latest_youtube_clicks_qs, 25, count_mode="estimate")
         try:
-            latest_youtube_clicks = youtube_clicks_paginator.page(youtube_clicks_page)
-        except (PageNotAnInteger, EmptyPage):
-            latest_youtube_clicks = youtube_clicks_paginator.page(1)
+            latest_youtube_clicks = youtube_clicks_paginator.page(self.request.GET.get('youtube_clicks_page'))
+        except InvalidCursor:
+            latest_youtube_clicks = youtube_clicks_paginator.page()
         
         # لیست بازدیدکنندگان ناشناس با pagination
-        anonymous_visitors_list_qs = AnonymousVisitor.objects.filter(last_seen__gte=date_from).order_by("-last_seen")
-        anonymous_visitors_list_paginator = Paginator(anonymous_visitors_list_qs, 20)
-        anonymous_visitors_list_page = self.request.GET.get('anonymous_visitors_list_page', 1)
+        # keyset روی id (ترتیب اولین بازدید)؛ last_seen با هر بازدید تغییر می‌کند و
+        # ردیف‌ها بین صفحه‌ها جابه‌جا می‌شدند
+        anonymous_visitors_list_qs = AnonymousVisitor.objects.filter(last_seen__gte=date_from)
+        anonymous_visitors_list_paginator = KeysetPaginator(
+            anonymous_visitors_list_qs, 20, ordering=("-id",), count_mode="estimate"
+        )
         try:
-            anonymous_visitors_list = anonymous_visitors_list_paginator.page(anonymous_visitors_list_page)
-        except (PageNotAnInteger, EmptyPage):
-            anonymous_visitors_list = anonymous_visitors_list_paginator.page(1)
+            anonymous_visitors_list = anonymous_visitors_list_paginator.page(self.request.GET.get('anonymous_visitors_list_page'))
+        except InvalidCursor:
+            anonymous_visitors_list = anonymous_visitors_list_paginator.page()
         
         context.update({
             "days": days,
@@ -508,10 +322,13 @@ class AnalyticsDetailView(LoginRequiredMixin, TemplateView):
             # آمار کلی بازدیدها
             "total_visits": total_visits,
             "unique_visitors": unique_visitors,
+            "estimated_unique_visitors": estimated_unique_visitors,
             "logged_in_visits": logged_in_visits,
             "anonymous_visits": anonymous_visits,
             "total_anonymous_visitors": total_anonymous_visitors,
             "total_anonymous_visitor_visits": total_anonymous_visitor_visits,
+            "bot_hits": bot_hits,
+            "top_bots": top_bots,
             
             # آمار تفصیلی بازدیدها
             "visits_by_day": list(visits_by_day),
@@ -585,7 +402,6 @@ class AnalyticsUserDetailView(LoginRequiredMixin, TemplateView):
         # بازدیدهای این کاربر
         visits_qs = SiteVisit.objects.filter(user=target_user, created_at__gte=date_from)
         total_visits = visits_qs.count()
-        unique_ips = visits_qs.values("ip_address").distinct().count()
 
         # بازدیدها به تفکیک روز
         visits_by_day = (
@@ -599,9 +415,10 @@ class AnalyticsUserDetailView(LoginRequiredMixin, TemplateView):
         top_pages_qs = (
             visits_qs.values("path")
             .annotate(count=Count("id"))
-            .order_by("-count")
+            .order_by("-count", "path")
         )
-        user_top_pages_paginator = Paginator(list(top_pages_qs), 20)
+        # LIMIT/OFFSET در پایگاه داده (بدون ساختن لیست کامل در پایتون)
+        user_top_pages_paginator = Paginator(top_pages_qs, 20)
         user_top_pages_page = self.request.GET.get('user_top_pages_page', 1)
         try:
             top_pages = user_top_pages_paginator.page(user_top_pages_page)
@@ -609,17 +426,20 @@ class AnalyticsUserDetailView(LoginRequiredMixin, TemplateView):
             top_pages = user_top_pages_paginator.page(1)
 
         # IP ها و دستگاه‌ها
-        recent_ips = (
+        # همه IP های این بازدیدکننده با یک GROUP BY (تعداد یکتا و پرتکرارترین‌ها از همین نتیجه)
+        ip_rows = list(
             visits_qs.exclude(ip_address="")
             .values("ip_address", "country")
             .annotate(count=Count("id"))
-            .order_by("-count")[:10]
+            .order_by("-count", "ip_address")
         )
+        unique_ips = len({row["ip_address"] for row in ip_rows})
+        recent_ips = ip_rows[:10]
 
         recent_user_agents = (
-            visits_qs.exclude(user_agent="")
+            visits_qs.exclude(user_agent=None)
             .values("user_agent", "device_type")
-            .annotate(count=Count("id"))
+            .annotate(count=Count("id"), user_agent_text=F("user_agent__value"))
             .order_by("-count")[:10]
         )
         
@@ -655,9 +475,9 @@ class AnalyticsUserDetailView(LoginRequiredMixin, TemplateView):
             yt_qs.exclude(youtube_id="")
             .values("youtube_id", "source_title", "source_type")
             .annotate(count=Count("id"))
-            .order_by("-count")
+            .order_by("-count", "youtube_id", "source_title", "source_type")
         )
-        user_youtube_top_videos_paginator = Paginator(list(youtube_top_videos_qs), 20)
+        user_youtube_top_videos_paginator = Paginator(youtube_top_videos_qs, 20)
         user_youtube_top_videos_page = self.request.GET.get('user_youtube_top_videos_page', 1)
         try:
             youtube_top_videos = user_youtube_top_videos_paginator.page(user_youtube_top_videos_page)
@@ -666,21 +486,19 @@ class AnalyticsUserDetailView(LoginRequiredMixin, TemplateView):
 
         # آخرین بازدیدها با pagination
         latest_visits_qs = visits_qs.order_by("-created_at")
-        user_visits_paginator = Paginator(latest_visits_qs, 25)
-        user_visits_page = self.request.GET.get('user_visits_page', 1)
+        user_visits_paginator = KeysetPaginator(latest_visits_qs, 25, count=total_visits)
         try:
-            latest_visits = user_visits_paginator.page(user_visits_page)
-        except (PageNotAnInteger, EmptyPage):
-            latest_visits = user_visits_paginator.page(1)
+            latest_visits = user_visits_paginator.page(self.request.GET.get('user_visits_page'))
+        except InvalidCursor:
+            latest_visits = user_visits_paginator.page()
         
         # آخرین کلیک‌های یوتیوب با pagination
         latest_youtube_clicks_qs = yt_qs.order_by("-created_at")
-        user_youtube_clicks_paginator = Paginator(latest_youtube_clicks_qs, 25)
-        user_youtube_clicks_page = self.request.GET.get('user_youtube_clicks_page', 1)
+        user_youtube_clicks_paginator = KeysetPaginator(latest_youtube_clicks_qs, 25, count=total_youtube_clicks)
         try:
-            latest_youtube_clicks = user_youtube_clicks_paginator.page(user_youtube_clicks_page)
-        except (PageNotAnInteger, EmptyPage):
-            latest_youtube_clicks = user_youtube_clicks_paginator.page(1)
+            latest_youtube_clicks = user_youtube_clicks_paginator.page(self.request.GET.get('user_youtube_clicks_page'))
+        except InvalidCursor:
+            latest_youtube_clicks = user_youtube_clicks_paginator.page()
 
         context.update(
             {
@@ -736,22 +554,24 @@ class AnalyticsAnonymousVisitorsView(LoginRequiredMixin, TemplateView):
         date_from = timezone.now() - timedelta(days=days)
         
         # فیلتر بازدیدکنندگان ناشناس بر اساس بازه زمانی
-        visitors_qs = AnonymousVisitor.objects.filter(last_seen__gte=date_from).order_by("-last_seen")
-        
-        # Pagination
-        visitors_paginator = Paginator(visitors_qs, 25)
-        visitors_page = self.request.GET.get('visitors_page', 1)
-        try:
-            visitors = visitors_paginator.page(visitors_page)
-        except (PageNotAnInteger, EmptyPage):
-            visitors = visitors_paginator.page(1)
+        visitors_qs = AnonymousVisitor.objects.filter(last_seen__gte=date_from)
         
         # آمار کلی
         total_anonymous_visitors = AnonymousVisitor.objects.filter(last_seen__gte=date_from).count()
         total_anonymous_visits = AnonymousVisitor.objects.filter(last_seen__gte=date_from).aggregate(
-            total=Count("site_visits")
+            total=Sum("site_visits__sample_weight")
         )["total"] or 0
         
+        # Pagination (keyset روی id، به ترتیب اولین بازدید؛ last_seen با هر بازدید تغییر
+        # می‌کند و نمی‌تواند کلید صفحه باشد. تعداد کل همان شمارش بالا است)
+        visitors_paginator = KeysetPaginator(
+            visitors_qs, 25, ordering=("-id",), count=total_anonymous_visitors
+        )
+        try:
+            visitors = visitors_paginator.page(self.request.GET.get('visitors_page'))
+        except InvalidCursor:
+            visitors = visitors_paginator.page()
+        
         context.update({
             "days": days,
             "date_from": date_from,
@@ -781,6 +601,7 @@ class AnalyticsAnonymousVisitorDetailView(LoginRequiredMixin, TemplateView):
         
         from django.shortcuts import get_object_or_404
         from core.models import AnonymousVisitor, SiteVisit, YouTubeClick
+        from core.rollups import weighted_count
         
         visitor_id = self.kwargs.get("visitor_id")
         visitor = get_object_or_404(AnonymousVisitor, id=visitor_id)
@@ -792,24 +613,24 @@ class AnalyticsAnonymousVisitorDetailView(LoginRequiredMixin, TemplateView):
         
         # بازدیدهای این بازدیدکننده ناشناس
         visits_qs = SiteVisit.objects.filter(anonymous_visitor=visitor, created_at__gte=date_from)
-        total_visits = visits_qs.count()
-        unique_ips = visits_qs.values("ip_address").distinct().count()
+        total_visits = visits_qs.aggregate(total=weighted_count())["total"]
         
         # بازدیدها به تفکیک روز
         visits_by_day = (
             visits_qs.annotate(day=TruncDate("created_at"))
             .values("day")
-            .annotate(count=Count("id"))
+            .annotate(count=weighted_count())
             .order_by("day")
         )
         
         # مسیرهای پربازدید با pagination
         top_pages_qs = (
             visits_qs.values("path")
-            .annotate(count=Count("id"))
-            .order_by("-count")
+            .annotate(count=weighted_count())
+            .order_by("-count", "path")
         )
-        visitor_top_pages_paginator = Paginator(list(top_pages_qs), 20)
+        # LIMIT/OFFSET در پایگاه داده (بدون ساختن لیست کامل در پایتون)
+        visitor_top_pages_paginator = Paginator(top_pages_qs, 20)
         visitor_top_pages_page = self.request.GET.get('visitor_top_pages_page', 1)
         try:
             top_pages = visitor_top_pages_paginator.page(visitor_top_pages_page)
@@ -817,17 +638,20 @@ class AnalyticsAnonymousVisitorDetailView(LoginRequiredMixin, TemplateView):
             top_pages = visitor_top_pages_paginator.page(1)
         
         # IP ها و دستگاه‌ها
-        recent_ips = (
+        # همه IP های این بازدیدکننده با یک GROUP BY (تعداد یکتا و پرتکرارترین‌ها از همین نتیجه)
+        ip_rows = list(
             visits_qs.exclude(ip_address="")
             .values("ip_address", "country")
-            .annotate(count=Count("id"))
-            .order_by("-count")[:10]
+            .annotate(count=weighted_count())
+            .order_by("-count", "ip_address")
         )
+        unique_ips = len({row["ip_address"] for row in ip_rows})
+        recent_ips = ip_rows[:10]
         
         recent_user_agents = (
-            visits_qs.exclude(user_agent="")
+            visits_qs.exclude(user_agent=None)
             .values("user_agent", "device_type")
-            .annotate(count=Count("id"))
+            .annotate(count=weighted_count(), user_agent_text=F("user_agent__value"))
             .order_by("-count")[:10]
         )
         
@@ -835,7 +659,7 @@ class AnalyticsAnonymousVisitorDetailView(LoginRequiredMixin, TemplateView):
         visitor_top_countries = (
             visits_qs.exclude(country="")
             .values("country")
-            .annotate(count=Count("id"))
+            .annotate(count=weighted_count())
             .order_by("-count")[:10]
         )
         
@@ -843,18 +667,18 @@ class AnalyticsAnonymousVisitorDetailView(LoginRequiredMixin, TemplateView):
         visitor_device_types = (
             visits_qs.exclude(device_type="")
             .values("device_type")
-            .annotate(count=Count("id"))
+            .annotate(count=weighted_count())
             .order_by("-count")
         )
         
         # آمار کلیک‌های یوتیوب برای این بازدیدکننده ناشناس
         yt_qs = YouTubeClick.objects.filter(anonymous_visitor=visitor, created_at__gte=date_from)
-        total_youtube_clicks = yt_qs.count()
+        total_youtube_clicks = yt_qs.aggregate(total=weighted_count())["total"]
         
         youtube_clicks_by_day = (
             yt_qs.annotate(day=TruncDate("created_at"))
             .values("day")
-            .annotate(count=Count("id"))
+            .annotate(count=weighted_count())
             .order_by("day")
         )
         
@@ -862,10 +686,10 @@ class AnalyticsAnonymousVisitorDetailView(LoginRequiredMixin, TemplateView):
         youtube_top_videos_qs = (
             yt_qs.exclude(youtube_id="")
             .values("youtube_id", "source_title", "source_type")
-            .annotate(count=Count("id"))
-            .order_by("-count")
+            .annotate(count=weighted_count())
+            .order_by("-count", "youtube_id", "source_title", "source_type")
         )
-        visitor_youtube_top_videos_paginator = Paginator(list(youtube_top_videos_qs), 20)
+        visitor_youtube_top_videos_paginator = Paginator(youtube_top_videos_qs, 20)
         visitor_youtube_top_videos_page = self.request.GET.get('visitor_youtube_top_videos_page', 1)
         try:
             youtube_top_videos = visitor_youtube_top_videos_paginator.page(visitor_youtube_top_videos_page)
@@ -874,21 +698,19 @@ class AnalyticsAnonymousVisitorDetailView(LoginRequiredMixin, TemplateView):
         
         # آخرین بازدیدها با pagination
         latest_visits_qs = visits_qs.order_by("-created_at")
-        visitor_visits_paginator = Paginator(latest_visits_qs, 25)
-        visitor_visits_page = self.request.GET.get('visitor_visits_page', 1)
+        visitor_visits_paginator = KeysetPaginator(latest_visits_qs, 25, count_mode="estimate")
         try:
-            latest_visits = visitor_visits_paginator.page(visitor_visits_page)
-        except (PageNotAnInteger, EmptyPage):
-            latest_visits = visitor_visits_paginator.page(1)
+            latest_visits = visitor_visits_paginator.page(self.request.GET.get('visitor_visits_page'))
+        except InvalidCursor:
+            latest_visits = visitor_visits_paginator.page()
         
         # آخرین کلیک‌های یوتیوب با pagination
         latest_youtube_clicks_qs = yt_qs.order_by("-created_at")
-        visitor_youtube_clicks_paginator = Paginator(latest_youtube_clicks_qs, 25)
-        visitor_youtube_clicks_page = self.request.GET.get('visitor_youtube_clicks_page', 1)
+        visitor_youtube_clicks_paginator = KeysetPaginator(latest_youtube_clicks_qs, 25, count_mode="estimate")
         try:
-            latest_youtube_clicks = visitor_youtube_clicks_paginator.page(visitor_youtube_clicks_page)
-        except (PageNotAnInteger, EmptyPage):
-            latest_youtube_clicks = visitor_youtube_clicks_paginator.page(1)
+            latest_youtube_clicks = visitor_youtube_clicks_paginator.page(self.request.GET.get('visitor_youtube_clicks_page'))
+        except InvalidCursor:
+            latest_youtube_clicks = visitor_youtube_clicks_paginator.page()
         
         context.update({
             "visitor": visitor,
@@ -954,12 +776,11 @@ class ContactMessagesAdminView(LoginRequiredMixin, TemplateView):
         messages_last_7_days = ContactMessage.objects.filter(created_at__gte=week_ago).count()
 
         # Pagination
-        paginator = Paginator(messages_qs, 25)
-        page = self.request.GET.get("page", 1)
+        paginator = KeysetPaginator(messages_qs, 25)
         try:
-            messages_page = paginator.page(page)
-        except (PageNotAnInteger, EmptyPage):
-            messages_page = paginator.page(1)
+            messages_page = paginator.page(self.request.GET.get("page"))
+        except InvalidCursor:
+            messages_page = paginator.page()
 
         context.update(
             {
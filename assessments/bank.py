@@ -0,0 +1,202 @@
+"""
+snapshot نسخه‌دار بانک سوالات هر آزمون
+
+هر snapshot شامل آزمون و همه سوال‌هایش با choices، answer_patterns، ordering_items،
+match_pairs و media_items از پیش prefetch شده است. یک بار از پایگاه داده ساخته
+می‌شود، به صورت pickle در cache مشترک و در یک LRU درون‌پروسسی نگه داشته می‌شود
+و در درخواست‌های بعدی انتخاب سوال‌ها فقط در حافظه انجام می‌شود.
+
+کلیدها شامل «نسخه بانک» هستند که در پایگاه داده (QuestionBankVersion) نگه داشته
+می‌شود؛ هر ذخیره / حذف آزمون، سوال یا اجزای آن در پنل مدیریت (assessments.signals)
+نسخه را افزایش می‌دهد و snapshot های قبلی دیگر خوانده نمی‌شوند. snapshot ها فقط‌خواندنی‌اند و بین درخواست‌ها مشترک‌اند.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models import F, Prefetch, Value
+from django.db.models.functions import Greatest
+
+from .models import Assessment, QuestionBankVersion, QuestionMedia
+
+
+SNAPSHOT_CACHE_KEY = "assessments:bank:{version}:{assessment_id}"
+LEVELS_CACHE_KEY = "assessments:bank_levels:{version}"
+
+
+def cache_timeout():
+    return getattr(settings, "ASSESSMENT_BANK_CACHE_TIMEOUT", 86400)
+
+
+def version_ttl():
+    return getattr(settings, "ASSESSMENT_BANK_VERSION_TTL", 2)
+
+
+# آخرین نسخه خوانده‌شده از پایگاه داده و زمان (monotonic) انقضای آن در این پروسس
+_local_version = None
+_local_expires = 0.0
+_version_lock = threading.Lock()
+
+
+def _remember(version):
+    global _local_version, _local_expires
+    with _version_lock:
+        _local_version = version
+        _local_expires = time.monotonic() + version_ttl()
+    return version
+
+
+def current_version():
+    """
+    نسخه فعلی بانک سوالات
+
+    نسخه در پایگاه داده (QuestionBankVersion) نگه داشته می‌شود تا بین همه پروسس‌ها
+    مشترک باشد؛ هر پروسس آن را حداکثر ASSESSMENT_BANK_VERSION_TTL ثانیه در حافظه
+    نگه می‌دارد، پس ویرایش در یک پروسس حداکثر پس از همین مدت در بقیه دیده می‌شود.
+    """
+    with _version_lock:
+        if _local_version is not None and time.monotonic() < _local_expires:
+            return _local_version
+    version = QuestionBankVersion.objects.filter(pk=1).values_list("version", flat=True).first()
+    if version is None:
+        return bump_version()
+    return _remember(version)
+
+
+def bump_version():
+    """
+    افزایش نسخه بانک سوالات
+
+    نسخه جدید حداقل زمان فعلی (میلی‌ثانیه) است تا پس از rollback یا بازیابی پایگاه داده
+    کلیدهای قبلی cache دوباره استفاده نشوند.
+    """
+    now = int(time.time() * 1000)
+    updated = QuestionBankVersion.objects.filter(pk=1).update(
+        version=Greatest(F("version") + 1, Value(now), output_field=models.PositiveBigIntegerField())
+    )
+    if not updated:
+        _, created = QuestionBankVersion.objects.get_or_create(pk=1, defaults={"version": now})
+        if not created:
+            return bump_version()
+    version = QuestionBankVersion.objects.filter(pk=1).values_list("version", flat=True).get()
+    return _remember(version)
+
+
+class QuestionBank:
+    """snapshot فقط‌خواندنی سوالات یک آزمون (به ترتیب شناسه)"""
+
+    def __init__(self, assessment, questions, version):
+        self.assessment = assessment
+        self.questions = tuple(questions)
+        self.version = version
+        self.by_id = {question.id: question for question in self.questions}
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __repr__(self):
+        return f"<QuestionBank assessment={self.assessment.id} v{self.version} questions={len(self.questions)}>"
+
+    def get(self, ids):
+        """سوال‌های ids به همان ترتیب (شناسه‌های ناموجود نادیده گرفته می‌شوند)"""
+        return [self.by_id[pk] for pk in ids if pk in self.by_id]
+
+    def select_batch(self, size, exclude=()):
+        """اولین size سوال پرسیده‌نشده؛ اگر همه پرسیده شده باشند از ابتدای بانک"""
+        exclude = set(exclude)
+        batch = []
+        for question in self.questions:
+            if question.id not in exclude:
+                batch.append(question)
+                if len(batch) >= size:
+                    break
+        return batch or list(self.questions[:size])
+
+
+def build_bank(assessment, version):
+    media_qs = QuestionMedia.objects.order_by("order", "id")
+    questions = assessment.questions.order_by("id").prefetch_related(
+        "choices",
+        "answer_patterns",
+        "ordering_items",
+        "match_pairs",
+        Prefetch("media_items", queryset=media_qs),
+    )
+    return QuestionBank(assessment, list(questions), version)
+
+
+class BankStore:
+    def __init__(self, lru_size=None):
+        self._lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def lru_size(self):
+        if self._lru_size is not None:
+            return self._lru_size
+        return getattr(settings, "ASSESSMENT_BANK_LRU_SIZE", 64)
+
+    def _lru_get(self, key):
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+            return value
+
+    def _lru_set(self, key, value):
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def for_assessment(self, assessment_id, version=None):
+        """snapshot آزمون فعال assessment_id یا None"""
+        version = current_version() if version is None else version
+        try:
+            key = SNAPSHOT_CACHE_KEY.format(version=version, assessment_id=int(assessment_id))
+        except (TypeError, ValueError):
+            return None
+        bank = self._lru_get(key)
+        if bank is not None:
+            return bank
+        bank = cache.get(key)
+        if bank is None:
+            assessment = Assessment.objects.filter(id=assessment_id, is_active=True).first()
+            if assessment is None:
+                return None
+            bank = build_bank(assessment, version)
+            cache.set(key, bank, cache_timeout())
+        self._lru_set(key, bank)
+        return bank
+
+    def for_level(self, level, version=None):
+        """snapshot آزمون فعال سطح level (کمترین شناسه اگر چند آزمون فعال باشد) یا None"""
+        version = current_version() if version is None else version
+        key = LEVELS_CACHE_KEY.format(version=version)
+        levels = self._lru_get(key)
+        if levels is None:
+            levels = cache.get(key)
+            if levels is None:
+                levels = {}
+                for assessment_id, assessment_level in (
+                    Assessment.objects.filter(is_active=True).order_by("-id").values_list("id", "level")
+                ):
+                    levels[assessment_level] = assessment_id
+                cache.set(key, levels, cache_timeout())
+            self._lru_set(key, levels)
+        assessment_id = levels.get(level)
+        if assessment_id is None:
+            return None
+        return self.for_assessment(assessment_id, version)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+
+banks = BankStore()
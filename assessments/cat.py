@@ -0,0 +1,242 @@
+"""
+آزمون تطبیقی کامپیوتری (CAT) برای تعیین سطح بر پایه مدل Rasch (IRT یک‌پارامتری)
+
+- دشواری هر سوال (b در مقیاس logit) با calibrate از پاسخ‌های ثبت‌شده SubmissionItem
+  (برآورد همزمان توانایی ارسال‌ها و دشواری سوال‌ها، JMLE) برآورد و در
+  Question.irt_difficulty ذخیره می‌شود؛ سوال‌های بدون داده کافی مقدار اولیه را از
+  target_level و difficulty می‌گیرند.
+- توانایی (theta) و خطای استاندارد آن با EAP روی یک شبکه ثابت و پیشین نرمال برآورد
+  می‌شود؛ پاسخ با نمره جزئی به نسبت gained / weight حساب می‌شود.
+- در هر مرحله ASSESSMENT_CAT_BATCH_SIZE سوال با بیشترین اطلاعات فیشر در theta
+  فعلی از مجموع بانک سوالات سطوح A1 تا B2 انتخاب می‌شود.
+- آزمون وقتی تمام می‌شود که خطای استاندارد به ASSESSMENT_CAT_TARGET_SE برسد، بازه
+  اطمینان ۹۵٪ کاملاً در یک سطح باشد، ASSESSMENT_CAT_MAX_ITEMS سوال پرسیده شده
+  باشد یا سوالی باقی نمانده باشد.
+
+وضعیت هر آزمون‌دهنده فقط فهرست پاسخ‌ها در session است و theta هر بار از آن محاسبه می‌شود.
+"""
+import math
+import time
+
+from django.conf import settings
+
+from .bank import banks, bump_version, current_version
+from .models import Question, SubmissionItem
+
+
+LEVEL_ORDER = ("A1", "A2", "B1", "B2")
+# مرکز هر سطح در مقیاس theta (برای مقدار اولیه دشواری سوال‌ها)
+LEVEL_THETA = {"A1": -3.0, "A2": -1.0, "B1": 1.0, "B2": 3.0, "C1": 5.0}
+# مرزهای سطوح: A1 < -2 <= A2 < 0 <= B1 < 2 <= B2
+LEVEL_CUTS = ((-2.0, "A1"), (0.0, "A2"), (2.0, "B1"))
+DIFFICULTY_OFFSET = {
+    Question.Difficulty.EASY: -0.5,
+    Question.Difficulty.MEDIUM: 0.0,
+    Question.Difficulty.HARD: 0.5,
+}
+PRIOR_MEAN = 0.0
+PRIOR_SD = 2.0
+# وزن مقدار اولیه دشواری در کالیبراسیون، برابر با این تعداد پاسخ
+PRIOR_WEIGHT = 10
+# تعداد دورهای برآورد همزمان توانایی و دشواری در کالیبراسیون
+CALIBRATION_ITERATIONS = 20
+GRID = tuple(-6.0 + i * 0.1 for i in range(121))
+Z_95 = 1.96
+
+
+def target_se():
+    return getattr(settings, "ASSESSMENT_CAT_TARGET_SE", 0.6)
+
+
+def max_items():
+    return getattr(settings, "ASSESSMENT_CAT_MAX_ITEMS", 15)
+
+
+def batch_size():
+    return max(getattr(settings, "ASSESSMENT_CAT_BATCH_SIZE", 3), 1)
+
+
+# --- مدل ---
+
+
+def probability(theta, b):
+    """احتمال پاسخ صحیح در مدل Rasch"""
+    p = 1.0 / (1.0 + math.exp(b - theta))
+    return min(max(p, 1e-9), 1.0 - 1e-9)
+
+
+def information(theta, b):
+    p = probability(theta, b)
+    return p * (1.0 - p)
+
+
+def prior_difficulty(question):
+    return LEVEL_THETA.get(question.target_level, PRIOR_MEAN) + DIFFICULTY_OFFSET.get(question.difficulty, 0.0)
+
+
+def item_difficulty(question):
+    if question.irt_difficulty is not None:
+        return question.irt_difficulty
+    return prior_difficulty(question)
+
+
+def estimate(responses):
+    """(theta, خطای استاندارد) برای [(b, نمره بین ۰ و ۱)] با EAP"""
+    responses = list(responses)
+    log_posterior = []
+    for theta in GRID:
+        value = -0.5 * ((theta - PRIOR_MEAN) / PRIOR_SD) ** 2
+        for b, score in responses:
+            p = probability(theta, b)
+            value += score * math.log(p) + (1.0 - score) * math.log(1.0 - p)
+        log_posterior.append(value)
+    top = max(log_posterior)
+    weights = [math.exp(value - top) for value in log_posterior]
+    total = sum(weights)
+    mean = sum(w * theta for w, theta in zip(weights, GRID)) / total
+    variance = sum(w * (theta - mean) ** 2 for w, theta in zip(weights, GRID)) / total
+    return mean, math.sqrt(variance)
+
+
+def level_for_theta(theta):
+    for cut, level in LEVEL_CUTS:
+        if theta < cut:
+            return level
+    return LEVEL_ORDER[-1]
+
+
+def should_stop(theta, se, asked):
+    if asked >= max_items() or se <= target_se():
+        return True
+    return level_for_theta(theta - Z_95 * se) == level_for_theta(theta + Z_95 * se)
+
+
+# --- بانک سوالات ---
+
+
+def level_banks(version=None):
+    """{سطح: snapshot آزمون فعال آن سطح} برای سطوحی که آزمون فعال دارند"""
+    version = current_version() if version is None else version
+    result = {}
+    for level in LEVEL_ORDER:
+        bank = banks.for_level(level, version)
+        if bank is not None:
+            result[level] = bank
+    return result
+
+
+def item_pool(banks_by_level):
+    return [question for bank in banks_by_level.values() for question in bank.questions]
+
+
+def select_items(pool, theta, exclude=(), count=1):
+    """count سوال پرسیده‌نشده با بیشترین اطلاعات در theta"""
+    exclude = set(exclude)
+    candidates = [question for question in pool if question.id not in exclude]
+    candidates.sort(key=lambda question: (-information(theta, item_difficulty(question)), question.id))
+    return candidates[:count]
+
+
+# --- وضعیت آزمون‌دهنده (session) ---
+
+
+def new_state():
+    return {"responses": [], "start_ts": int(time.time())}
+
+
+def response(question, answer):
+    """پاسخ تصحیح‌شده (grading.Answer) به شکل قابل ذخیره در session"""
+    score = answer.gained / answer.weight if answer.weight else float(answer.is_correct)
+    return {
+        "id": question.id,
+        "b": round(item_difficulty(question), 3),
+        "score": min(max(score, 0.0), 1.0),
+        "correct": answer.is_correct,
+        "gained": answer.gained,
+        "weight": answer.weight,
+    }
+
+
+def asked_ids(state):
+    return [r["id"] for r in state.get("responses", [])]
+
+
+def estimate_state(state):
+    return estimate((r["b"], r["score"]) for r in state.get("responses", []))
+
+
+# --- کالیبراسیون ---
+
+
+def _newton_step(value, responses, sign, prior, precision):
+    """
+    یک گام نیوتن برای برآورد MAP یک پارامتر (توانایی با sign=1، دشواری با sign=-1)
+
+    responses: [(پارامتر طرف مقابل، نمره)]؛ پیشین نرمال با میانگین prior و دقت precision
+    مانع بی‌نهایت شدن برآورد برای پاسخ‌های همه درست یا همه غلط می‌شود.
+    """
+    gradient = -precision * (value - prior)
+    curvature = precision
+    for other, score in responses:
+        p = probability(value, other) if sign > 0 else probability(other, value)
+        gradient += sign * (score - p)
+        curvature += p * (1.0 - p)
+    step = gradient / curvature
+    # گام‌های بزرگ در دورهای اول محدود می‌شوند
+    return value + min(max(step, -1.0), 1.0)
+
+
+def calibrate(min_responses=5, chunk_size=500, iterations=CALIBRATION_ITERATIONS):
+    """
+    برآورد دشواری سوال‌ها از SubmissionItem ها؛ تعداد سوال‌های به‌روزشده
+
+    توانایی هر ارسال و دشواری سوال‌ها به صورت همزمان (JMLE) برآورد می‌شوند: در هر دور
+    ابتدا توانایی هر ارسال با دشواری‌های فعلی و سپس دشواری هر سوال با توانایی‌های
+    فعلی با یک گام نیوتن به‌روز می‌شود. پیشین توانایی N(PRIOR_MEAN, PRIOR_SD) و
+    پیشین دشواری مقدار اولیه سوال با وزن PRIOR_WEIGHT پاسخ است. سوال‌های با کمتر از
+    min_responses پاسخ با دشواری فعلی خود ثابت می‌مانند و فقط در برآورد توانایی
+    استفاده می‌شوند.
+    """
+    by_submission = {}
+    by_question = {}
+    for submission_id, question_id, is_correct in (
+        SubmissionItem.objects.values_list("submission_id", "question_id", "is_correct").iterator(chunk_size=chunk_size)
+    ):
+        score = 1.0 if is_correct else 0.0
+        by_submission.setdefault(submission_id, []).append((question_id, score))
+        by_question.setdefault(question_id, []).append((submission_id, score))
+
+    questions = {
+        question.id: question
+        for question in Question.objects.filter(id__in=by_question).only(
+            "id", "target_level", "difficulty", "irt_difficulty"
+        )
+    }
+    free = {pk for pk in questions if len(by_question[pk]) >= min_responses}
+    if not free:
+        return 0
+    priors = {pk: prior_difficulty(question) for pk, question in questions.items()}
+    difficulty = {pk: priors[pk] if pk in free else item_difficulty(question) for pk, question in questions.items()}
+    ability = dict.fromkeys(by_submission, PRIOR_MEAN)
+    ability_precision = 1.0 / PRIOR_SD ** 2
+    # اطلاعات فیشر PRIOR_WEIGHT پاسخ در p = 0.5
+    difficulty_precision = PRIOR_WEIGHT * 0.25
+
+    for _ in range(iterations):
+        for submission_id, items in by_submission.items():
+            responses = [(difficulty[pk], score) for pk, score in items if pk in difficulty]
+            ability[submission_id] = _newton_step(ability[submission_id], responses, 1, PRIOR_MEAN, ability_precision)
+        for pk in free:
+            responses = [(ability[submission_id], score) for submission_id, score in by_question[pk]]
+            difficulty[pk] = _newton_step(difficulty[pk], responses, -1, priors[pk], difficulty_precision)
+
+    updated = []
+    for pk in sorted(free):
+        question = questions[pk]
+        question.irt_difficulty = round(difficulty[pk], 3)
+        question.irt_responses = len(by_question[pk])
+        updated.append(question)
+    Question.objects.bulk_update(updated, ["irt_difficulty", "irt_responses"], batch_size=chunk_size)
+    # bulk_update سیگنال ندارد؛ snapshot های بانک سوالات باید دوباره ساخته شوند
+    bump_version()
+    return len(updated)
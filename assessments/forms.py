@@ -1,25 +1,70 @@
 from django import forms
 from .models import Assessment, Question
+from collections import OrderedDict
 import re
+import threading
 
 
 class AssessmentStartForm(forms.Form):
     assessment = forms.ModelChoiceField(queryset=Assessment.objects.filter(is_active=True))
 
 
-def build_assessment_form(assessment: Assessment, questions=None, user=None):
+# کلاس‌های فرم ساخته‌شده: (آزمون، شناسه سوال‌ها، ورود کاربر، نسخه بانک) -> کلاس
+FORM_CACHE_SIZE = 256
+_form_classes = OrderedDict()
+_form_classes_lock = threading.Lock()
+
+
+def identity_initial(user) -> dict:
+    """مقادیر اولیه فیلدهای مخفی نام / ایمیل برای کاربر وارد شده"""
+    if user and getattr(user, "is_authenticated", False):
+        return {"full_name": user.get_full_name() or user.username, "email": user.email}
+    return {}
+
+
+def build_assessment_form(assessment: Assessment, questions=None, user=None, version=None):
+    """
+    کلاس فرم آزمون برای questions
+
+    با version (نسخه بانک سوالات در assessments.bank) کلاس ساخته‌شده برای
+    (آزمون، شناسه سوال‌ها، ورود کاربر، نسخه) نگه داشته می‌شود و نمایش صفحه و
+    اعتبارسنجی POST آن از همان تعریف فیلدها استفاده می‌کنند. کلاس به کاربر خاصی
+    وابسته نیست؛ نام / ایمیل کاربر وارد شده با identity_initial به عنوان initial فرم داده می‌شود.
+    """
+    questions = list(questions if questions is not None else assessment.questions.all())
+    authenticated = bool(user and getattr(user, "is_authenticated", False))
+    if version is None:
+        return _build_form_class(questions, authenticated)
+    key = (assessment.id, tuple(q.id for q in questions), authenticated, version)
+    with _form_classes_lock:
+        form_class = _form_classes.get(key)
+        if form_class is not None:
+            _form_classes.move_to_end(key)
+            return form_class
+    form_class = _build_form_class(questions, authenticated)
+    with _form_classes_lock:
+        _form_classes[key] = form_class
+        while len(_form_classes) > FORM_CACHE_SIZE:
+            _form_classes.popitem(last=False)
+    return form_class
+
+
+def clear_form_cache():
+    with _form_classes_lock:
+        _form_classes.clear()
+
+
+def _build_form_class(questions, authenticated: bool):
     class _AssessmentForm(forms.Form):
-        if user and getattr(user, "is_authenticated", False):
+        if authenticated:
             full_name = forms.CharField(
                 max_length=150,
                 required=False,
-                initial=user.get_full_name() or user.username,
                 widget=forms.HiddenInput,
                 label="نام",
             )
             email = forms.EmailField(
                 required=False,
-                initial=user.email,
                 widget=forms.HiddenInput,
                 label="ایمیل",
             )
@@ -27,8 +72,7 @@ def build_assessment_form(assessment: Assessment, questions=None, user=None):
             full_name = forms.CharField(max_length=150, required=True, label="نام")
             email = forms.EmailField(required=True, label="ایمیل")
 
-    qs = questions if questions is not None else assessment.questions.all()
-    for question in qs:
+    for question in questions:
         field_name = f"q_{question.id}"
         if question.type == Question.QuestionType.MCQ_SINGLE:
             _AssessmentForm.base_fields[field_name] = forms.ChoiceField(
@@ -0,0 +1,250 @@
+"""
+تصحیح کامپایل‌شده پاسخ‌های آزمون
+
+هر Question یک بار به یک grader تغییرناپذیر کامپایل می‌شود: شناسه‌های گزینه
+صحیح به صورت frozenset، الگوهای جای خالی به صورت رشته/regex از پیش کامپایل‌شده،
+ترتیب صحیح به صورت tuple و جفت‌های تطبیق به صورت dict. grader ها در یک LRU
+درون‌پروسسی با کلید (شناسه سوال، نسخه بانک سوالات) نگه داشته می‌شوند؛ هر ویرایش
+سوال نسخه بانک را افزایش می‌دهد (assessments.signals)، پس grader تازه ساخته می‌شود.
+
+compile_question فقط از ()all روابط استفاده می‌کند (سازگار با prefetch_related)؛
+تصحیح یک ارسال کامل (grade_submission) هیچ پرس‌وجویی به پایگاه داده نمی‌زند.
+"""
+import abc
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from .models import AnswerPattern, Question
+
+
+logger = logging.getLogger(__name__)
+
+LRU_SIZE = 4096
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Grader(abc.ABC):
+    """پایه grader ها؛ پس از ساخت قابل تغییر نیست"""
+
+    __slots__ = ("question_id", "weight")
+
+    def __init__(self, question_id, weight, **fields):
+        object.__setattr__(self, "question_id", question_id)
+        object.__setattr__(self, "weight", weight)
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"<{type(self).__name__} q={self.question_id}>"
+
+    def field_name(self):
+        return f"q_{self.question_id}"
+
+    @abc.abstractmethod
+    def grade(self, cleaned_data):
+        """Answer برای پاسخ این سوال در cleaned_data فرم"""
+
+    def _answer(self, is_correct, gained=None, selected_choice_id=None, user_text=""):
+        if gained is None:
+            gained = float(self.weight) if is_correct else 0.0
+        return Answer(self.question_id, self.weight, bool(is_correct), float(gained), selected_choice_id, user_text)
+
+
+class SingleChoiceGrader(Grader):
+    __slots__ = ("correct_ids",)
+
+    def grade(self, cleaned_data):
+        selected_id = _to_int(cleaned_data.get(self.field_name()))
+        return self._answer(selected_id in self.correct_ids, selected_choice_id=selected_id)
+
+
+class MultiChoiceGrader(Grader):
+    __slots__ = ("correct_ids",)
+
+    def grade(self, cleaned_data):
+        selected = {_to_int(x) for x in (cleaned_data.get(self.field_name()) or [])}
+        selected.discard(None)
+        # نمره جزئی به نسبت گزینه‌های صحیح انتخاب‌شده
+        overlap = len(self.correct_ids & selected) / len(self.correct_ids) if self.correct_ids else 0.0
+        return self._answer(selected == self.correct_ids, gained=self.weight * overlap)
+
+
+class TrueFalseGrader(Grader):
+    __slots__ = ("expected",)
+
+    def grade(self, cleaned_data):
+        return self._answer(str(cleaned_data.get(self.field_name())) == self.expected)
+
+
+class FillGrader(Grader):
+    __slots__ = ("exact", "icase", "regexes")
+
+    def grade(self, cleaned_data):
+        text = str(cleaned_data.get(self.field_name()) or "").strip()
+        is_correct = (
+            text in self.exact
+            or text.lower() in self.icase
+            or any(regex.fullmatch(text) for regex in self.regexes)
+        )
+        return self._answer(is_correct, user_text=text)
+
+
+class OrderGrader(Grader):
+    __slots__ = ("correct_order",)
+
+    def grade(self, cleaned_data):
+        order_str = str(cleaned_data.get(self.field_name()) or "").replace(" ", "")
+        try:
+            ids = tuple(int(x) for x in order_str.split(",") if x)
+        except ValueError:
+            ids = ()
+        gained = 0.0
+        if self.correct_order and ids:
+            # نمره جزئی به تعداد موقعیت‌های درست
+            matched = sum(1 for a, b in zip(ids, self.correct_order) if a == b)
+            gained = self.weight * (matched / len(self.correct_order))
+        return self._answer(ids == self.correct_order, gained=gained, user_text=order_str)
+
+
+class MatchGrader(Grader):
+    __slots__ = ("pairs",)
+
+    def grade(self, cleaned_data):
+        base = self.field_name()
+        # ورودی‌های جداگانه جای خالی (q_<id>_blank_<left>) یا textarea به قالب left=right
+        blank_prefix = f"{base}_blank_"
+        given = {}
+        for name, value in cleaned_data.items():
+            if isinstance(name, str) and name.startswith(blank_prefix):
+                given[name[len(blank_prefix):].strip()] = str(value or "").strip()
+        if not given:
+            for line in str(cleaned_data.get(base) or "").splitlines():
+                if "=" in line:
+                    left, right = line.split("=", 1)
+                    given[left.strip()] = right.strip()
+        correct_count = sum(1 for left, right in self.pairs.items() if given.get(left) == right)
+        return self._answer(
+            bool(self.pairs) and correct_count == len(self.pairs),
+            gained=self.weight * (correct_count / max(len(self.pairs), 1)),
+            user_text=";".join(f"{k}={v}" for k, v in given.items()),
+        )
+
+
+class Answer:
+    """نتیجه تصحیح یک سوال (بدون وابستگی به پایگاه داده)"""
+
+    __slots__ = ("question_id", "weight", "is_correct", "gained", "selected_choice_id", "user_text")
+
+    def __init__(self, question_id, weight, is_correct, gained, selected_choice_id=None, user_text=""):
+        self.question_id = question_id
+        self.weight = weight
+        self.is_correct = is_correct
+        self.gained = gained
+        self.selected_choice_id = selected_choice_id
+        self.user_text = user_text
+
+    @property
+    def full_credit(self):
+        return abs(self.gained - self.weight) < 1e-9
+
+
+class GradeResult:
+    def __init__(self, answers):
+        self.answers = answers
+        self.total_weight = float(sum(answer.weight for answer in answers))
+        self.gained = float(sum(answer.gained for answer in answers))
+        self.correct_full = sum(1 for answer in answers if answer.full_credit)
+
+    @property
+    def ratio(self):
+        return self.gained / max(self.total_weight, 1.0)
+
+    def __iter__(self):
+        return iter(self.answers)
+
+    def __len__(self):
+        return len(self.answers)
+
+
+def _compile_regex(question, pattern):
+    try:
+        return re.compile(pattern)
+    except re.error:
+        logger.warning("Invalid answer pattern on question %s: %r", question.id, pattern)
+        return None
+
+
+def compile_question(question):
+    """grader تغییرناپذیر برای یک سوال (روابط از prefetch خوانده می‌شوند)"""
+    kind = question.type
+    base = (question.id, question.weight)
+    if kind == Question.QuestionType.MCQ_SINGLE:
+        return SingleChoiceGrader(*base, correct_ids=frozenset(c.id for c in question.choices.all() if c.is_correct))
+    if kind == Question.QuestionType.MULTI:
+        return MultiChoiceGrader(*base, correct_ids=frozenset(c.id for c in question.choices.all() if c.is_correct))
+    if kind == Question.QuestionType.TF:
+        return TrueFalseGrader(*base, expected="true" if question.correct_boolean else "false")
+    if kind == Question.QuestionType.FILL:
+        patterns = list(question.answer_patterns.all())
+        regexes = (_compile_regex(question, p.pattern) for p in patterns if p.kind == AnswerPattern.PatternType.REGEX)
+        return FillGrader(
+            *base,
+            exact=frozenset(p.pattern for p in patterns if p.kind == AnswerPattern.PatternType.EXACT),
+            icase=frozenset(p.pattern.lower() for p in patterns if p.kind == AnswerPattern.PatternType.ICASE),
+            regexes=tuple(regex for regex in regexes if regex is not None),
+        )
+    if kind == Question.QuestionType.ORDER:
+        items = sorted(question.ordering_items.all(), key=lambda it: (it.correct_position, it.id))
+        return OrderGrader(*base, correct_order=tuple(it.id for it in items))
+    if kind == Question.QuestionType.MATCH:
+        return MatchGrader(*base, pairs={p.left_text: p.right_text for p in question.match_pairs.all()})
+    raise ValueError(f"Unknown question type: {kind}")
+
+
+class GraderCache:
+    def __init__(self, lru_size=LRU_SIZE):
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question, version):
+        """grader سوال برای نسخه version بانک سوالات (assessments.bank.current_version)"""
+        key = (question.id, version)
+        with self._lock:
+            grader = self._lru.get(key)
+            if grader is not None:
+                self._lru.move_to_end(key)
+                return grader
+        grader = compile_question(question)
+        with self._lock:
+            self._lru[key] = grader
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return grader
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+
+graders = GraderCache()
+
+
+def grade_submission(questions, cleaned_data, version):
+    """
+    تصحیح همه سوال‌ها در یک گذر؛ GradeResult با یک Answer برای هر سوال به همان ترتیب
+
+    version نسخه بانک سوالاتی است که questions از آن خوانده شده‌اند (QuestionBank.version).
+    """
+    return GradeResult([graders.get(question, version).grade(cleaned_data) for question in questions])
@@ -0,0 +1,26 @@
+"""
+کالیبراسیون دشواری سوال‌های آزمون (مدل Rasch) از پاسخ‌های ثبت‌شده SubmissionItem
+"""
+from django.core.management.base import BaseCommand
+
+from assessments.cat import calibrate
+
+
+class Command(BaseCommand):
+    help = (
+        "Estimate the IRT (Rasch) difficulty of every question from recorded "
+        "submission items and store it on the question. The adaptive placement "
+        "test uses these values to pick the most informative next questions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-responses',
+            type=int,
+            default=5,
+            help='Skip questions with fewer recorded answers (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        count = calibrate(min_responses=max(options['min_responses'], 1))
+        self.stdout.write(self.style.SUCCESS(f'✓ Calibrated {count} questions'))
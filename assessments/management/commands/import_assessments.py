@@ -286,16 +286,16 @@ class Command(BaseCommand):
                 # Import Submissions if available and not skipped
                 if 'submissions' in data and not skip_submissions:
                     from assessments.models import Submission, SubmissionItem
-                    
-                    submission_map = {}
-                    submission_count = 0
-                    
+                    from assessments.submissions import save_submissions
+
+                    # Build everything in memory, then insert with bulk_create
+                    entries = {}  # export_id -> (submission, items)
                     for submission_data in data.get('submissions', []):
                         assessment_id = assessment_map.get(submission_data['assessment_export_id'])
                         if not assessment_id:
                             continue
 
-                        submission = Submission.objects.create(
+                        submission = Submission(
                             assessment_id=assessment_id,
                             user_identifier=submission_data['user_identifier'],
                             full_name=submission_data.get('full_name', ''),
@@ -306,32 +306,30 @@ class Command(BaseCommand):
                             duration_seconds=submission_data.get('duration_seconds', 0),
                             recommended_level=submission_data['recommended_level'],
                         )
-                        submission_map[submission_data['export_id']] = submission.id
-                        submission_count += 1
-
-                    self.stdout.write(self.style.SUCCESS(
-                        f'✓ Imported {submission_count} submissions'
-                    ))
+                        entries[submission_data['export_id']] = (submission, [])
 
-                    # Import SubmissionItems
                     item_count = 0
                     for item_data in data.get('submission_items', []):
-                        submission_id = submission_map.get(item_data['submission_export_id'])
+                        entry = entries.get(item_data['submission_export_id'])
                         question_id = question_map.get(item_data['question_export_id'])
-                        
-                        if not submission_id or not question_id:
+
+                        if not entry or not question_id:
                             continue
 
-                        SubmissionItem.objects.create(
-                            submission_id=submission_id,
+                        entry[1].append(SubmissionItem(
                             question_id=question_id,
                             selected_choice_id=item_data.get('selected_choice_id'),
                             user_text=item_data.get('user_text', ''),
                             is_correct=item_data.get('is_correct', False),
                             gained_score=item_data.get('gained_score', 0),
-                        )
+                        ))
                         item_count += 1
 
+                    save_submissions(entries.values())
+
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✓ Imported {len(entries)} submissions'
+                    ))
                     self.stdout.write(self.style.SUCCESS(
                         f'✓ Imported {item_count} submission items'
                     ))
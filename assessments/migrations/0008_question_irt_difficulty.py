@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0007_questionmedia_and_hints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="irt_difficulty",
+            field=models.FloatField(blank=True, null=True, verbose_name="دشواری IRT"),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="irt_responses",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="تعداد پاسخ\u200cهای کالیبراسیون"
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0008_question_irt_difficulty"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionBankVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
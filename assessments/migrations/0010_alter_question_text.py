@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0009_questionbankversion"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="question",
+            name="text",
+            field=models.CharField(max_length=700, verbose_name="سوال"),
+        ),
+    ]
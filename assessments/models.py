@@ -49,6 +49,9 @@ class Question(models.Model):
     correct_boolean = models.BooleanField(null=True, blank=True, verbose_name=_("پاسخ صحیح (برای درست/نادرست)"))
     hint_text = models.TextField(blank=True, verbose_name=_("نکته/توضیح پس از پاسخ نادرست"))
     hint_links = models.JSONField(default=list, blank=True, verbose_name=_("لینک‌های پیشنهادی پس از پاسخ نادرست"))
+    # پارامتر دشواری مدل Rasch (logit)؛ با "python manage.py calibrate_assessments" از پاسخ‌های ثبت‌شده برآورد می‌شود
+    irt_difficulty = models.FloatField(null=True, blank=True, verbose_name=_("دشواری IRT"))
+    irt_responses = models.PositiveIntegerField(default=0, verbose_name=_("تعداد پاسخ‌های کالیبراسیون"))
 
     def __str__(self) -> str:
         return self.text[:50]
@@ -121,6 +124,15 @@ class QuestionMedia(models.Model):
         return f"{self.question_id}-{self.media_type}"
 
 
+class QuestionBankVersion(models.Model):
+    """شمارنده تک‌ردیفی نسخه بانک سوالات (assessments.bank)، مشترک بین همه پروسس‌ها"""
+
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"v{self.version}"
+
+
 class HintResource(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="hint_resources")
     title = models.CharField(max_length=200, blank=True)
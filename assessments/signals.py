@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .bank import bump_version
+from .models import AnswerPattern, Assessment, Choice, MatchPair, OrderingItem, Question, QuestionMedia
+
+
+# مدل‌هایی که در snapshot بانک سوالات (assessments.bank) ذخیره می‌شوند
+BANK_MODELS = (Assessment, Question, Choice, AnswerPattern, OrderingItem, MatchPair, QuestionMedia)
+
+
+def invalidate_question_bank(sender, **kwargs):
+    bump_version()
+    # snapshot ساخته‌شده در فاصله ذخیره تا commit (از داده قبلی) هم کنار گذاشته شود
+    transaction.on_commit(bump_version)
+
+
+for model in BANK_MODELS:
+    post_save.connect(invalidate_question_bank, sender=model, dispatch_uid=f"bank_save_{model.__name__}")
+    post_delete.connect(invalidate_question_bank, sender=model, dispatch_uid=f"bank_delete_{model.__name__}")
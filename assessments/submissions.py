@@ -0,0 +1,61 @@
+"""
+ذخیره ارسال‌های آزمون
+
+Submission (با نمره نهایی) و SubmissionItem ها در حافظه ساخته و در یک تراکنش
+ذخیره می‌شوند: یک INSERT برای Submission و یک bulk_create برای همه آیتم‌ها،
+به جای یک INSERT برای هر سوال و دو UPDATE برای نمره.
+حالت کلاسیک آزمون و دستور import_assessments هر دو از همین مسیر استفاده می‌کنند.
+"""
+from django.db import connections, router, transaction
+
+from .models import Submission, SubmissionItem
+
+
+BATCH_SIZE = 500
+
+
+def build_items(result):
+    """SubmissionItem های ذخیره‌نشده از GradeResult (grading.grade_submission)"""
+    return [
+        SubmissionItem(
+            question_id=answer.question_id,
+            selected_choice_id=answer.selected_choice_id,
+            user_text=answer.user_text[:300],
+            is_correct=answer.is_correct,
+            gained_score=answer.gained,
+        )
+        for answer in result
+    ]
+
+
+def save_submissions(entries, batch_size=BATCH_SIZE):
+    """
+    ذخیره [(Submission, [SubmissionItem])] ها در یک تراکنش
+
+    اگر پایگاه داده شناسه‌های bulk_create را برگرداند (PostgreSQL، SQLite >= 3.35)
+    همه Submission ها هم با bulk_create درج می‌شوند؛ در غیر این صورت یکی‌یکی.
+    """
+    entries = list(entries)
+    if not entries:
+        return []
+    db = router.db_for_write(Submission)
+    with transaction.atomic(using=db):
+        submissions = [submission for submission, _ in entries]
+        if len(submissions) > 1 and connections[db].features.can_return_rows_from_bulk_insert:
+            Submission.objects.using(db).bulk_create(submissions, batch_size=batch_size)
+        else:
+            for submission in submissions:
+                submission.save(using=db)
+        items = []
+        for submission, submission_items in entries:
+            for item in submission_items:
+                item.submission = submission
+            items.extend(submission_items)
+        SubmissionItem.objects.using(db).bulk_create(items, batch_size=batch_size)
+    return submissions
+
+
+def save_submission(submission, items):
+    """ذخیره یک Submission با همه آیتم‌هایش (دو پرس‌وجوی نوشتن)"""
+    save_submissions([(submission, items)])
+    return submission
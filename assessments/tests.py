@@ -1,9 +1,25 @@
 import time
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
-from assessments.models import Submission
+from assessments import bank as bank_module, cat
+from assessments.bank import banks, current_version
+from assessments.forms import build_assessment_form, clear_form_cache
+from assessments.grading import Grader, grade_submission, graders
+from assessments.models import (
+    AnswerPattern,
+    Assessment,
+    Choice,
+    MatchPair,
+    OrderingItem,
+    Question,
+    QuestionBankVersion,
+    Submission,
+    SubmissionItem,
+)
+from assessments.submissions import build_items, save_submission, save_submissions
 from tests.factories import create_assessment_with_question, create_user
 
 
@@ -99,3 +115,347 @@ class AssessmentFlowTests(TestCase):
         resp = self.client.get(reverse("assessments:result"))
         self.assertContains(resp, "نکات آموزشی")
         self.assertContains(resp, "review verb conjugation")
+
+
+class GradingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.assessment, cls.mcq, cls.mcq_correct = create_assessment_with_question()
+        q = cls.assessment.questions
+        cls.multi = q.create(text="Multi", type=Question.QuestionType.MULTI, weight=2)
+        cls.multi_ok = [Choice.objects.create(question=cls.multi, text=t, is_correct=True) for t in ("a", "b")]
+        Choice.objects.create(question=cls.multi, text="c", is_correct=False)
+        cls.tf = q.create(text="TF", type=Question.QuestionType.TF, correct_boolean=False)
+        cls.fill = q.create(text="Fill", type=Question.QuestionType.FILL)
+        AnswerPattern.objects.create(question=cls.fill, pattern="Haus", kind=AnswerPattern.PatternType.ICASE)
+        AnswerPattern.objects.create(question=cls.fill, pattern=r"d(as|er) Haus", kind=AnswerPattern.PatternType.REGEX)
+        AnswerPattern.objects.create(question=cls.fill, pattern="(", kind=AnswerPattern.PatternType.REGEX)
+        cls.order = q.create(text="Order", type=Question.QuestionType.ORDER, weight=3)
+        cls.order_items = [
+            OrderingItem.objects.create(question=cls.order, text=t, correct_position=pos)
+            for t, pos in (("c", 3), ("a", 1), ("b", 2))
+        ]
+        cls.match = q.create(text="Match", type=Question.QuestionType.MATCH, weight=2)
+        MatchPair.objects.create(question=cls.match, left_text="Haus", right_text="House")
+        MatchPair.objects.create(question=cls.match, left_text="Buch", right_text="Book")
+
+    def setUp(self):
+        graders.clear()
+
+    def questions(self):
+        return list(
+            Question.objects.filter(assessment=self.assessment)
+            .order_by("id")
+            .prefetch_related("choices", "answer_patterns", "ordering_items", "match_pairs")
+        )
+
+    def test_grades_every_type_in_one_pass_without_queries(self):
+        questions = self.questions()
+        third, first, second = self.order_items
+        cleaned = {
+            f"q_{self.mcq.id}": str(self.mcq_correct.id),
+            f"q_{self.multi.id}": [str(self.multi_ok[0].id)],
+            f"q_{self.tf.id}": "false",
+            f"q_{self.fill.id}": " das Haus ",
+            f"q_{self.order.id}": f"{first.id}, {third.id}, {second.id}",
+            f"q_{self.match.id}": "Haus=House\nBuch=Buch",
+        }
+        with self.assertNumQueries(0):
+            result = grade_submission(questions, cleaned, current_version())
+        answers = {answer.question_id: answer for answer in result}
+        self.assertTrue(answers[self.mcq.id].is_correct)
+        self.assertEqual(answers[self.mcq.id].selected_choice_id, self.mcq_correct.id)
+        self.assertFalse(answers[self.multi.id].is_correct)
+        self.assertEqual(answers[self.multi.id].gained, 1.0)
+        self.assertTrue(answers[self.tf.id].is_correct)
+        self.assertTrue(answers[self.fill.id].is_correct)
+        self.assertEqual(answers[self.fill.id].user_text, "das Haus")
+        self.assertFalse(answers[self.order.id].is_correct)
+        self.assertEqual(answers[self.order.id].gained, 1.0)
+        self.assertEqual(answers[self.match.id].gained, 1.0)
+        self.assertEqual(result.total_weight, 2 + 2 + 1 + 1 + 3 + 2)
+        self.assertEqual(result.gained, 2 + 1 + 1 + 1 + 1 + 1)
+        self.assertEqual(result.correct_full, 3)
+
+    def test_match_blanks_and_order_full_credit(self):
+        questions = self.questions()
+        cleaned = {
+            f"q_{self.order.id}": ",".join(str(it.id) for it in sorted(self.order_items, key=lambda it: it.correct_position)),
+            f"q_{self.match.id}_blank_Haus": "House",
+            f"q_{self.match.id}_blank_Buch": "Book",
+        }
+        answers = {answer.question_id: answer for answer in grade_submission(questions, cleaned, current_version())}
+        self.assertTrue(answers[self.order.id].is_correct)
+        self.assertEqual(answers[self.order.id].gained, 3.0)
+        self.assertTrue(answers[self.match.id].is_correct)
+        self.assertFalse(answers[self.mcq.id].is_correct)
+
+    def test_graders_are_cached_immutable_and_recompiled_on_change(self):
+        grader = graders.get(self.questions()[0], current_version())
+        self.assertIsInstance(grader, Grader)
+        with self.assertRaises(TypeError):
+            Grader(self.mcq.id, 1)
+        self.assertIs(graders.get(self.questions()[0], current_version()), grader)
+        with self.assertRaises(AttributeError):
+            grader.weight = 10
+        self.mcq_correct.is_correct = False
+        self.mcq_correct.save()
+        fresh = graders.get(self.questions()[0], current_version())
+        self.assertIsNot(fresh, grader)
+        self.assertFalse(fresh.grade({f"q_{self.mcq.id}": str(self.mcq_correct.id)}).is_correct)
+
+
+class SubmissionPersistenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.assessment, cls.question, cls.correct_choice = create_assessment_with_question()
+        cls.second = Question.objects.create(
+            assessment=cls.assessment, text="TF", type=Question.QuestionType.TF, correct_boolean=True
+        )
+
+    def submission(self, **kwargs):
+        defaults = {
+            "assessment": self.assessment,
+            "user_identifier": "anon-test",
+            "recommended_level": "A1",
+        }
+        defaults.update(kwargs)
+        return Submission(**defaults)
+
+    def test_save_submission_uses_one_insert_per_table(self):
+        questions = list(self.assessment.questions.order_by("id").prefetch_related("choices"))
+        result = grade_submission(
+            questions,
+            {f"q_{self.question.id}": str(self.correct_choice.id), f"q_{self.second.id}": "false"},
+            current_version(),
+        )
+        submission = self.submission(score=result.gained, total_weight=result.total_weight, ratio=result.ratio)
+        # SAVEPOINT / RELEASE + INSERT submission + bulk INSERT items
+        with self.assertNumQueries(4):
+            save_submission(submission, build_items(result))
+        items = {item.question_id: item for item in submission.items.all()}
+        self.assertEqual(len(items), 2)
+        self.assertTrue(items[self.question.id].is_correct)
+        self.assertEqual(items[self.question.id].selected_choice_id, self.correct_choice.id)
+        self.assertFalse(items[self.second.id].is_correct)
+        self.assertEqual(Submission.objects.get(pk=submission.pk).score, 2.0)
+
+    def test_save_submissions_bulk_loads_many(self):
+        entries = [
+            (self.submission(user_identifier=f"anon-{i}"), [SubmissionItem(question=self.question, is_correct=True)])
+            for i in range(3)
+        ]
+        save_submissions(entries)
+        self.assertEqual(Submission.objects.count(), 3)
+        self.assertEqual(
+            sorted(SubmissionItem.objects.values_list("submission__user_identifier", flat=True)),
+            ["anon-0", "anon-1", "anon-2"],
+        )
+
+    def test_classic_mode_post_persists_graded_submission(self):
+        session = self.client.session
+        session["assessment_start"] = int(time.time()) - 30
+        session.save()
+        url = reverse("assessments:take") + f"?mode=classic&assessment_id={self.assessment.id}"
+        payload = {
+            "full_name": "Guest",
+            "email": "guest@example.com",
+            f"q_{self.question.id}": str(self.correct_choice.id),
+            f"q_{self.second.id}": "true",
+        }
+        response = self.client.post(url, payload)
+        self.assertRedirects(response, reverse("assessments:result"), fetch_redirect_response=False)
+        submission = Submission.objects.get()
+        self.assertEqual(submission.full_name, "Guest")
+        self.assertEqual((submission.score, submission.total_weight, submission.ratio), (3.0, 3.0, 1.0))
+        self.assertEqual(submission.recommended_level, "B2")
+        self.assertGreaterEqual(submission.duration_seconds, 30)
+        self.assertEqual(submission.items.filter(is_correct=True).count(), 2)
+
+
+class QuestionBankTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.assessment, cls.question, cls.correct_choice = create_assessment_with_question()
+        cls.extra = [
+            Question.objects.create(assessment=cls.assessment, text=f"Q{i}", type=Question.QuestionType.TF)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        banks.clear()
+        # نسخه به‌خاطرسپرده‌شده از تست‌های قبلی (rollback شده) دوباره از پایگاه داده خوانده شود
+        bank_module._local_expires = 0.0
+
+    def test_snapshot_is_built_once_and_served_from_memory(self):
+        bank = banks.for_assessment(self.assessment.id)
+        self.assertEqual([q.id for q in bank.questions], [self.question.id] + [q.id for q in self.extra])
+        with self.assertNumQueries(0):
+            again = banks.for_assessment(self.assessment.id)
+            batch = again.select_batch(2, exclude=[self.question.id])
+            choices = list(again.by_id[self.question.id].choices.all())
+        self.assertIs(again, bank)
+        self.assertEqual(batch, self.extra[:2])
+        self.assertIn(self.correct_choice, choices)
+        # every question asked: start again from the beginning of the bank
+        self.assertEqual(bank.select_batch(2, exclude=bank.by_id), list(bank.questions[:2]))
+
+    def test_snapshot_survives_process_lru_through_shared_cache(self):
+        banks.for_assessment(self.assessment.id)
+        banks.clear()
+        with self.assertNumQueries(0):
+            bank = banks.for_assessment(self.assessment.id)
+            self.assertEqual(len(bank.by_id[self.question.id].choices.all()), 2)
+        self.assertEqual(banks.for_level("A1").assessment.id, self.assessment.id)
+        self.assertIsNone(banks.for_level("C1"))
+        self.assertIsNone(banks.for_assessment("not-a-number"))
+
+    def test_admin_edits_bump_version_and_invalidate_snapshot(self):
+        bank = banks.for_assessment(self.assessment.id)
+        version = current_version()
+        new_question = Question.objects.create(assessment=self.assessment, text="New", type=Question.QuestionType.FILL)
+        self.assertGreater(current_version(), version)
+        fresh = banks.for_assessment(self.assessment.id)
+        self.assertIsNot(fresh, bank)
+        self.assertIn(new_question.id, fresh.by_id)
+        self.assessment.is_active = False
+        self.assessment.save()
+        self.assertIsNone(banks.for_assessment(self.assessment.id))
+        self.assertIsNone(banks.for_level("A1"))
+
+
+    def test_version_bumped_by_another_process_is_seen_after_ttl(self):
+        version = current_version()
+        # پروسس دیگری نسخه را در پایگاه داده افزایش داده است
+        QuestionBankVersion.objects.filter(pk=1).update(version=version + 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(current_version(), version)
+        bank_module._local_expires = 0.0
+        self.assertEqual(current_version(), version + 10)
+        self.assertEqual(banks.for_assessment(self.assessment.id).version, version + 10)
+
+class AssessmentFormCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.assessment, cls.question, cls.correct_choice = create_assessment_with_question()
+        cls.user, cls.password = create_user()
+
+    def setUp(self):
+        cache.clear()
+        banks.clear()
+        clear_form_cache()
+
+    def test_form_classes_are_memoized_per_key(self):
+        bank = banks.for_assessment(self.assessment.id)
+        questions = list(bank.questions)
+        form_class = build_assessment_form(self.assessment, questions, user=self.user, version=bank.version)
+        with self.assertNumQueries(0):
+            again = build_assessment_form(self.assessment, questions, user=self.user, version=bank.version)
+        self.assertIs(again, form_class)
+        self.assertIsNot(build_assessment_form(self.assessment, questions, version=bank.version), form_class)
+        self.assertIsNot(build_assessment_form(self.assessment, questions, user=self.user, version=bank.version + 1), form_class)
+        self.assertIsNot(build_assessment_form(self.assessment, questions, user=self.user), form_class)
+        # the cached class holds no per-user values
+        self.assertIsNone(form_class.base_fields["full_name"].initial)
+
+    def test_take_view_fills_identity_initial_for_authenticated_user(self):
+        self.client.login(username=self.user.username, password=self.password)
+        url = reverse("assessments:take") + f"?mode=classic&assessment_id={self.assessment.id}"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        form = response.context["form"]
+        self.assertEqual(form.initial["email"], self.user.email)
+        self.assertContains(response, f'value="{self.user.email}"')
+
+
+class AdaptivePlacementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.correct = {}
+        cls.wrong = {}
+        for level in cat.LEVEL_ORDER:
+            assessment = Assessment.objects.create(title=f"Placement {level}", level=level)
+            for i in range(6):
+                question = Question.objects.create(
+                    assessment=assessment,
+                    text=f"{level} question {i}",
+                    target_level=level,
+                    difficulty=[Question.Difficulty.EASY, Question.Difficulty.MEDIUM, Question.Difficulty.HARD][i % 3],
+                )
+                cls.correct[question.id] = Choice.objects.create(question=question, text="right", is_correct=True).id
+                cls.wrong[question.id] = Choice.objects.create(question=question, text="wrong", is_correct=False).id
+
+    def setUp(self):
+        cache.clear()
+        banks.clear()
+
+    def test_estimate_moves_with_answers_and_se_shrinks(self):
+        theta0, se0 = cat.estimate([])
+        self.assertAlmostEqual(theta0, 0.0, places=3)
+        high, se_high = cat.estimate([(1.0, 1.0), (2.0, 1.0), (3.0, 1.0)])
+        low, _ = cat.estimate([(-1.0, 0.0), (-2.0, 0.0), (-3.0, 0.0)])
+        self.assertGreater(high, 1.0)
+        self.assertLess(low, -1.0)
+        self.assertLess(se_high, se0)
+        self.assertEqual([cat.level_for_theta(t) for t in (-2.5, -0.5, 0.5, 2.5)], list(cat.LEVEL_ORDER))
+
+    def test_selects_most_informative_unasked_items(self):
+        pool = cat.item_pool(cat.level_banks())
+        picked = cat.select_items(pool, 3.0, count=2)
+        self.assertTrue(all(q.target_level == "B2" for q in picked))
+        again = cat.select_items(pool, 3.0, exclude=[q.id for q in picked], count=1)
+        self.assertNotIn(again[0], picked)
+
+    def run_test(self, answers):
+        asked = 0
+        for _ in range(40):
+            response = self.client.get(reverse("assessments:take"))
+            self.assertEqual(response.status_code, 200)
+            questions = response.context["view"].questions
+            payload = {"full_name": "Guest", "email": "guest@example.com"}
+            payload.update({f"q_{q.id}": str(answers[q.id]) for q in questions})
+            asked += len(questions)
+            response = self.client.post(reverse("assessments:take"), payload)
+            if response["Location"] == reverse("assessments:result"):
+                return asked
+        self.fail("adaptive test did not finish")
+
+    def test_all_correct_places_b2_in_few_questions(self):
+        asked = self.run_test(self.correct)
+        self.assertLessEqual(asked, cat.max_items())
+        submission = Submission.objects.get()
+        self.assertEqual(submission.recommended_level, "B2")
+        self.assertEqual(submission.items.count(), asked)
+        self.assertEqual(self.client.session["recommended_level"], "B2")
+
+    def test_all_wrong_places_a1(self):
+        asked = self.run_test(self.wrong)
+        self.assertLessEqual(asked, cat.max_items())
+        self.assertEqual(Submission.objects.get().recommended_level, "A1")
+
+    def test_calibrate_estimates_difficulty_from_submission_items(self):
+        hard, easy = Question.objects.filter(target_level="A2")[:2]
+        assessment = hard.assessment
+        for i in range(20):
+            submission = Submission.objects.create(
+                assessment=assessment, user_identifier=f"anon-{i}", recommended_level="A2"
+            )
+            SubmissionItem.objects.create(submission=submission, question=hard, is_correct=i < 2)
+            SubmissionItem.objects.create(submission=submission, question=easy, is_correct=i < 18)
+        version = current_version()
+        self.assertEqual(cat.calibrate(min_responses=5), 2)
+        self.assertGreater(current_version(), version)
+        hard.refresh_from_db()
+        easy.refresh_from_db()
+        self.assertEqual(hard.irt_responses, 20)
+        self.assertGreater(hard.irt_difficulty, cat.prior_difficulty(hard))
+        self.assertLess(easy.irt_difficulty, cat.prior_difficulty(easy))
+        bank = banks.for_assessment(assessment.id)
+        self.assertEqual(cat.item_difficulty(bank.by_id[hard.id]), hard.irt_difficulty)
+
+        # توانایی از خود پاسخ‌ها برآورد می‌شود، نه از سطح پیشنهادی ارسال
+        Submission.objects.update(recommended_level="B2")
+        cat.calibrate(min_responses=5)
+        self.assertEqual(Question.objects.get(pk=hard.pk).irt_difficulty, hard.irt_difficulty)
+        self.assertEqual(Question.objects.get(pk=easy.pk).irt_difficulty, easy.irt_difficulty)
@@ -1,12 +1,15 @@
 from django.contrib import messages
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import redirect
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import TemplateView, FormView
-from django.db.models import Prefetch
-import re
+from django.http import Http404
 import time
-from .models import Assessment, Question, Choice, Submission, SubmissionItem
-from .forms import build_assessment_form
+from .models import Assessment, Question, Submission, SubmissionItem
+from .forms import build_assessment_form, identity_initial
+from . import cat
+from .bank import banks
+from .grading import grade_submission
+from .submissions import build_items, save_submission
 
 
 def user_identifier_for_request(request) -> str:
@@ -105,19 +108,15 @@ class AssessmentTakeView(FormView):
             if not assessment_id:
                 messages.error(request, _("هیچ آزمون فعالی یافت نشد."))
                 return redirect("assessments:intro")
-            self.assessment = get_object_or_404(Assessment, id=assessment_id, is_active=True)
+            self.bank = banks.for_assessment(assessment_id)
+            if self.bank is None:
+                raise Http404("No active assessment matches the given query.")
+            self.assessment = self.bank.assessment
             request.session["assessment_id"] = self.assessment.id
-            media_qs = self.assessment.questions.model.media_items.rel.related_model.objects.order_by("order", "id")
-            self.questions = list(
-                self.assessment.questions.order_by("id").prefetch_related(
-                    "choices",
-                    "answer_patterns",
-                    "ordering_items",
-                    "match_pairs",
-                    Prefetch("media_items", queryset=media_qs),
-                )
+            self.questions = list(self.bank.questions)
+            self.form_class = build_assessment_form(
+                self.assessment, questions=self.questions, user=request.user, version=self.bank.version
             )
-            self.form_class = build_assessment_form(self.assessment, questions=self.questions, user=request.user)
             if self._attempts_exceeded():
                 messages.warning(self.request, _("به حداکثر دفعات مجاز برای این آزمون رسیده‌اید."))
                 return redirect("assessments:result")
@@ -136,48 +135,30 @@ class AssessmentTakeView(FormView):
             request.session.setdefault("assessment_start", int(time.time()))
             return super().dispatch(request, *args, **kwargs)
 
-        # Adaptive mode (default)
-        level_order = ["A1", "A2", "B1", "B2"]
-        level_batch_sizes = {"A1": 5, "A2": 7, "B1": 9, "B2": 12}
-
+        # Adaptive mode (default): computerized adaptive test over the A1-B2 banks (assessments.cat)
         request.session["adaptive"] = True
         # Clear any previous classic assessment selection to avoid sticking to a fixed test
         request.session.pop("assessment_id", None)
         if "adaptive_state" not in request.session:
-            request.session["adaptive_state"] = {
-                "current_level": "A1",
-                "asked_by_level": {lvl: [] for lvl in level_order},
-                "start_ts": int(time.time()),
-            }
+            request.session["adaptive_state"] = cat.new_state()
             request.session["adaptive_history"] = []
         state = request.session["adaptive_state"]
-        current_level = state.get("current_level", "A1")
-
-        self.assessment = get_object_or_404(Assessment, level=current_level, is_active=True)
-
-        asked_ids = set(state.get("asked_by_level", {}).get(current_level, []))
-        qs = (
-            self.assessment.questions.order_by("id")
-            .prefetch_related(
-                "choices",
-                "answer_patterns",
-                "ordering_items",
-                "match_pairs",
-                Prefetch("media_items", queryset=self.assessment.questions.model.media_items.rel.related_model.objects.order_by("order", "id")),
-            )
-        )
-        batch = []
-        batch_size = level_batch_sizes.get(current_level, 5)
-        for q in qs:
-            if q.id not in asked_ids:
-                batch.append(q)
-            if len(batch) >= batch_size:
-                break
+
+        self.level_banks = cat.level_banks()
+        if not self.level_banks:
+            raise Http404("No active assessment matches the given query.")
+        theta, _se = cat.estimate_state(state)
+        # the assessment closest to the current ability estimate drives limits and reporting
+        self.bank = self.level_banks.get(cat.level_for_theta(theta)) or next(iter(self.level_banks.values()))
+        self.assessment = self.bank.assessment
+
+        pool = cat.item_pool(self.level_banks)
+        batch = cat.select_items(pool, theta, exclude=cat.asked_ids(state), count=cat.batch_size())
         if not batch:
-            batch = list(qs[:batch_size])
+            batch = cat.select_items(pool, theta, count=cat.batch_size())
 
         self.questions = batch
-        self.form_class = build_assessment_form(self.assessment, questions=batch, user=request.user)
+        self.form_class = build_assessment_form(self.assessment, questions=batch, user=request.user, version=self.bank.version)
         if self._attempts_exceeded():
             messages.warning(self.request, _("به حداکثر دفعات مجاز برای این آزمون رسیده‌اید."))
             return redirect("assessments:result")
@@ -196,6 +177,11 @@ class AssessmentTakeView(FormView):
         request.session.setdefault("assessment_start", state.get("start_ts", int(time.time())))
         return super().dispatch(request, *args, **kwargs)
 
+    def get_initial(self):
+        initial = super().get_initial()
+        initial.update(identity_initial(self.request.user))
+        return initial
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         form = context.get("form")
@@ -243,123 +229,12 @@ class AssessmentTakeView(FormView):
             return self.form_invalid(form)
         # Classic single-assessment mode
         if not self.request.session.get("adaptive"):
-            total_weight = 0
-            gained_total = 0.0
             elapsed = getattr(self, "_elapsed_seconds_cache", None)
             if elapsed is None:
                 elapsed = self._cache_elapsed()
-            submission = Submission.objects.create(
-                assessment=self.assessment,
-                user_identifier=self._get_user_identifier(),
-                full_name=self.request.user.get_full_name() or form.cleaned_data.get("full_name", ""),
-                email=self.request.user.email if self.request.user.is_authenticated else form.cleaned_data.get("email", ""),
-            )
-            for question in self.questions:
-                field = form.cleaned_data.get(f"q_{question.id}")
-                is_correct = False
-                gained = 0.0
-                if question.type == Question.QuestionType.MCQ_SINGLE:
-                    selected_id = int(field)
-                    is_correct = any(c.id == selected_id and c.is_correct for c in question.choices.all())
-                    gained = question.weight if is_correct else 0.0
-                    SubmissionItem.objects.create(
-                        submission=submission,
-                        question=question,
-                        selected_choice_id=selected_id,
-                        is_correct=is_correct,
-                        gained_score=gained,
-                    )
-                elif question.type == Question.QuestionType.MULTI:
-                    selected_ids = [int(x) for x in (field or [])]
-                    correct_ids = set(question.choices.filter(is_correct=True).values_list("id", flat=True))
-                    is_correct = set(selected_ids) == correct_ids
-                    # partial credit
-                    if correct_ids:
-                        overlap = len(correct_ids.intersection(selected_ids)) / len(correct_ids)
-                    else:
-                        overlap = 0.0
-                    gained = question.weight * overlap
-                    SubmissionItem.objects.create(
-                        submission=submission,
-                        question=question,
-                        is_correct=is_correct,
-                        gained_score=gained,
-                    )
-                elif question.type == Question.QuestionType.TF:
-                    val = str(field)
-                    expected = "true" if question.correct_boolean else "false"
-                    is_correct = val == expected
-                    gained = question.weight if is_correct else 0.0
-                    SubmissionItem.objects.create(
-                        submission=submission,
-                        question=question,
-                        is_correct=is_correct,
-                        gained_score=gained,
-                    )
-                elif question.type == Question.QuestionType.FILL:
-                    text = str(field or "").strip()
-                    # Evaluate against patterns
-                    for p in question.answer_patterns.all():
-                        if p.kind == p.PatternType.EXACT and text == p.pattern:
-                            is_correct = True
-                            break
-                        if p.kind == p.PatternType.ICASE and text.lower() == p.pattern.lower():
-                            is_correct = True
-                            break
-                        if p.kind == p.PatternType.REGEX and re.fullmatch(p.pattern, text):
-                            is_correct = True
-                            break
-                    gained = question.weight if is_correct else 0.0
-                    SubmissionItem.objects.create(
-                        submission=submission,
-                        question=question,
-                        user_text=text,
-                        is_correct=is_correct,
-                        gained_score=gained,
-                    )
-                elif question.type == Question.QuestionType.ORDER:
-                    order_str = str(field or "").replace(" ", "")
-                    try:
-                        ids = [int(x) for x in order_str.split(",") if x]
-                    except ValueError:
-                        ids = []
-                    correct_order = list(question.ordering_items.order_by("correct_position").values_list("id", flat=True))
-                    is_correct = ids == correct_order
-                    # Kendall tau-like partial credit
-                    gained = 0.0
-                    if correct_order and ids:
-                        matched = sum(1 for a, b in zip(ids, correct_order) if a == b)
-                        gained = question.weight * (matched / len(correct_order))
-                    SubmissionItem.objects.create(
-                        submission=submission,
-                        question=question,
-                        user_text=order_str,
-                        is_correct=is_correct,
-                        gained_score=gained,
-                    )
-                elif question.type == Question.QuestionType.MATCH:
-                    lines = str(field or "").splitlines()
-                    pairs = {}
-                    for ln in lines:
-                        if "=" in ln:
-                            l, r = ln.split("=", 1)
-                            pairs[l.strip()] = r.strip()
-                    correct_pairs = {p.left_text: p.right_text for p in question.match_pairs.all()}
-                    correct_count = sum(1 for k, v in correct_pairs.items() if pairs.get(k) == v)
-                    gained = question.weight * (correct_count / max(len(correct_pairs), 1))
-                    is_correct = correct_count == len(correct_pairs) and len(correct_pairs) > 0
-                    SubmissionItem.objects.create(
-                        submission=submission,
-                        question=question,
-                        user_text=";".join(f"{k}={v}" for k, v in pairs.items()),
-                        is_correct=is_correct,
-                        gained_score=gained,
-                    )
-                total_weight += question.weight
-                gained_total += gained
-
-            duration = elapsed
-            ratio = gained_total / max(total_weight, 1)
+            # grade and build the submission in memory, then persist it in one transaction
+            result = grade_submission(self.questions, form.cleaned_data, version=self.bank.version)
+            ratio = result.ratio
             thresholds = [
                 (0.75, "B2"),
                 (0.55, "B1"),
@@ -367,14 +242,19 @@ class AssessmentTakeView(FormView):
                 (0.0, "A1"),
             ]
             recommended = next(level for th, level in thresholds if ratio >= th)
-            submission.score = float(gained_total)
-            submission.total_weight = float(total_weight)
-            submission.ratio = float(ratio)
-            submission.duration_seconds = duration
-            submission.recommended_level = recommended
-            submission.save(update_fields=["score", "recommended_level"])
-            # persist enhanced fields
-            submission.save(update_fields=["total_weight", "ratio", "duration_seconds"]) 
+            user = self.request.user
+            submission = Submission(
+                assessment=self.assessment,
+                user_identifier=self._get_user_identifier(),
+                full_name=(user.get_full_name() if user.is_authenticated else "") or form.cleaned_data.get("full_name", ""),
+                email=user.email if user.is_authenticated else form.cleaned_data.get("email", ""),
+                score=result.gained,
+                total_weight=result.total_weight,
+                ratio=float(ratio),
+                duration_seconds=elapsed,
+                recommended_level=recommended,
+            )
+            save_submission(submission, build_items(result))
             # increment attempts
             attempts = self.request.session.get("attempts", {})
             attempts[str(self.assessment.id)] = attempts.get(str(self.assessment.id), 0) + 1
@@ -382,87 +262,9 @@ class AssessmentTakeView(FormView):
             self.request.session["recommended_level"] = recommended
             return redirect("assessments:result")
 
-        # Adaptive mode: grade current batch, choose next level or finalize
-        state = self.request.session.get("adaptive_state", {})
-        current_level = state.get("current_level", "A1")
-        level_order = ["A1", "A2", "B1", "B2"]
-
-        # Score this batch only
-        batch_total = 0.0
-        batch_gained = 0.0
-        correct_full = 0
-        for question in self.questions:
-            field = form.cleaned_data.get(f"q_{question.id}")
-            is_correct = False
-            gained = 0.0
-            if question.type == Question.QuestionType.MCQ_SINGLE:
-                selected_id = int(field)
-                is_correct = any(c.id == selected_id and c.is_correct for c in question.choices.all())
-                gained = question.weight if is_correct else 0.0
-            elif question.type == Question.QuestionType.MULTI:
-                selected_ids = [int(x) for x in (field or [])]
-                correct_ids = set(question.choices.filter(is_correct=True).values_list("id", flat=True))
-                is_correct = set(selected_ids) == correct_ids
-                # partial credit
-                if correct_ids:
-                    overlap = len(correct_ids.intersection(selected_ids)) / len(correct_ids)
-                else:
-                    overlap = 0.0
-                gained = question.weight * overlap
-            elif question.type == Question.QuestionType.TF:
-                val = str(field)
-                expected = "true" if question.correct_boolean else "false"
-                is_correct = val == expected
-                gained = question.weight if is_correct else 0.0
-            elif question.type == Question.QuestionType.FILL:
-                text = str(field or "").strip()
-                # Evaluate against patterns
-                for p in question.answer_patterns.all():
-                    if p.kind == p.PatternType.EXACT and text == p.pattern:
-                        is_correct = True
-                        break
-                    if p.kind == p.PatternType.ICASE and text.lower() == p.pattern.lower():
-                        is_correct = True
-                        break
-                    if p.kind == p.PatternType.REGEX and re.fullmatch(p.pattern, text):
-                        is_correct = True
-                        break
-                gained = question.weight if is_correct else 0.0
-            elif question.type == Question.QuestionType.ORDER:
-                order_str = str(field or "").replace(" ", "")
-                try:
-                    ids = [int(x) for x in order_str.split(",") if x]
-                except ValueError:
-                    ids = []
-                correct_order = list(question.ordering_items.order_by("correct_position").values_list("id", flat=True))
-                is_correct = ids == correct_order
-                # Kendall tau-like partial credit
-                gained = 0.0
-                if correct_order and ids:
-                    matched = sum(1 for a, b in zip(ids, correct_order) if a == b)
-                    gained = question.weight * (matched / len(correct_order))
-            elif question.type == Question.QuestionType.MATCH:
-                # If multi-blank inputs exist, reconstruct pairs from them; else parse textarea
-                pairs = {}
-                # Collect per-blank inputs
-                for name, val in form.cleaned_data.items():
-                    if isinstance(name, str) and name.startswith(f"q_{question.id}_blank_"):
-                        left = name.split(f"q_{question.id}_blank_")[1]
-                        pairs[left.strip()] = str(val or "").strip()
-                if not pairs:
-                    lines = str(field or "").splitlines()
-                    for ln in lines:
-                        if "=" in ln:
-                            l, r = ln.split("=", 1)
-                            pairs[l.strip()] = r.strip()
-                correct_pairs = {p.left_text: p.right_text for p in question.match_pairs.all()}
-                correct_count = sum(1 for k, v in correct_pairs.items() if pairs.get(k) == v)
-                gained = question.weight * (correct_count / max(len(correct_pairs), 1))
-                is_correct = correct_count == len(correct_pairs) and len(correct_pairs) > 0
-            batch_total += question.weight
-            batch_gained += gained
-            if abs(gained - question.weight) < 1e-9:
-                correct_full += 1
+        # Adaptive mode: grade current batch, update the ability estimate, continue or finalize
+        state = self.request.session.get("adaptive_state") or cat.new_state()
+        result = grade_submission(self.questions, form.cleaned_data, version=self.bank.version)
 
         # Persist identity from first batch
         if self.request.session.get("adaptive") and not self.request.session.get("identity"):
@@ -471,146 +273,65 @@ class AssessmentTakeView(FormView):
             if full_name and email:
                 self.request.session["identity"] = {"full_name": full_name, "email": email}
 
-        # Update asked list
-        asked_by_level = state.get("asked_by_level", {})
-        already = set(asked_by_level.get(current_level, []))
-        already.update(q.id for q in self.questions)
-        asked_by_level[current_level] = list(already)
-        state["asked_by_level"] = asked_by_level
+        responses = state.setdefault("responses", [])
+        responses.extend(cat.response(question, answer) for question, answer in zip(self.questions, result))
+        theta, se = cat.estimate_state(state)
+        recommended = cat.level_for_theta(theta)
 
-        # Decide next level based on ratio thresholds
-        ratio = batch_gained / max(batch_total, 1.0)
         # Build per-question detail for later reporting
-        detail = []
-        for question in self.questions:
-            # Re-evaluate quickly to capture boolean per question
-            field = form.cleaned_data.get(f"q_{question.id}")
-            q_correct = False
-            if question.type == Question.QuestionType.MCQ_SINGLE:
-                try:
-                    selected_id = int(field)
-                except (TypeError, ValueError):
-                    selected_id = -1
-                q_correct = any(c.id == selected_id and c.is_correct for c in question.choices.all())
-            elif question.type == Question.QuestionType.MULTI:
-                selected_ids = set(int(x) for x in (field or []))
-                correct_ids = set(question.choices.filter(is_correct=True).values_list("id", flat=True))
-                q_correct = selected_ids == correct_ids
-            elif question.type == Question.QuestionType.TF:
-                val = str(field)
-                expected = "true" if question.correct_boolean else "false"
-                q_correct = (val == expected)
-            elif question.type == Question.QuestionType.FILL:
-                text = str(field or "").strip()
-                for p in question.answer_patterns.all():
-                    if p.kind == p.PatternType.EXACT and text == p.pattern:
-                        q_correct = True
-                        break
-                    if p.kind == p.PatternType.ICASE and text.lower() == p.pattern.lower():
-                        q_correct = True
-                        break
-                    if p.kind == p.PatternType.REGEX and re.fullmatch(p.pattern, text):
-                        q_correct = True
-                        break
-            elif question.type == Question.QuestionType.ORDER:
-                order_str = str(field or "").replace(" ", "")
-                try:
-                    ids = [int(x) for x in order_str.split(",") if x]
-                except ValueError:
-                    ids = []
-                correct_order = list(question.ordering_items.order_by("correct_position").values_list("id", flat=True))
-                q_correct = ids == correct_order
-            elif question.type == Question.QuestionType.MATCH:
-                pairs = {}
-                for name, val in form.cleaned_data.items():
-                    if isinstance(name, str) and name.startswith(f"q_{question.id}_blank_"):
-                        left = name.split(f"q_{question.id}_blank_")[1]
-                        pairs[left.strip()] = str(val or "").strip()
-                if not pairs:
-                    lines = str(field or "").splitlines()
-                    for ln in lines:
-                        if "=" in ln:
-                            l, r = ln.split("=", 1)
-                            pairs[l.strip()] = r.strip()
-                correct_pairs = {p.left_text: p.right_text for p in question.match_pairs.all()}
-                correct_count = sum(1 for k, v in correct_pairs.items() if pairs.get(k) == v)
-                q_correct = (correct_count == len(correct_pairs) and len(correct_pairs) > 0)
-            detail.append(
-                {
-                    "id": question.id,
-                    "text": question.text,
-                    "type_label": question.get_type_display(),
-                    "correct": bool(q_correct),
-                }
-            )
-
+        detail = [
+            {
+                "id": question.id,
+                "text": question.text,
+                "type_label": question.get_type_display(),
+                "correct": answer.is_correct,
+            }
+            for question, answer in zip(self.questions, result)
+        ]
         history = self.request.session.get("adaptive_history", [])
         history.append(
             {
-                "level": current_level,
-                "correct": int(correct_full),
+                "level": self.assessment.level,
+                "correct": int(result.correct_full),
                 "total": len(self.questions),
-                "ratio_percent": int(round(ratio * 100)),
+                "ratio_percent": int(round(result.ratio * 100)),
                 "questions": detail,
             }
         )
         self.request.session["adaptive_history"] = history
-        # thresholds: <30% down, 30-60 stay, >60 up
-        def level_index(lvl: str) -> int:
-            try:
-                return level_order.index(lvl)
-            except ValueError:
-                return 0
-
-        idx = level_index(current_level)
-        if ratio < 0.3 and idx > 0:
-            next_level = level_order[idx - 1]
-        elif 0.3 <= ratio <= 0.6:
-            # finalize here
-            next_level = current_level
-            finalize = True
-        else:
-            # ratio > 0.6
-            next_level = level_order[min(idx + 1, len(level_order) - 1)]
 
-        finalize = locals().get("finalize", False)
-
-        # Finalization conditions:
-        # - If we stayed (30-60), finalize
-        # - If we are at edges (A1 with <30 -> A1) or (B2 with >60 -> B2), finalize
-        at_edge_and_finalize = (
-            (current_level == "A1" and ratio < 0.3)
-            or (current_level == "B2" and ratio > 0.6)
-        )
-        if at_edge_and_finalize:
-            next_level = current_level
-            finalize = True
-
-        if finalize:
-            # Create a single submission representing the recommended level
+        remaining = cat.select_items(cat.item_pool(self.level_banks), theta, exclude=cat.asked_ids(state))
+        if cat.should_stop(theta, se, len(responses)) or not remaining:
             elapsed = getattr(self, "_elapsed_seconds_cache", None)
             if elapsed is None:
                 elapsed = self._cache_elapsed()
-            submission = Submission.objects.create(
-                assessment=self.assessment,  # store last used assessment
+            identity = self.request.session.get("identity", {})
+            total_weight = float(sum(r["weight"] for r in responses))
+            gained_total = float(sum(r["gained"] for r in responses))
+            submission = Submission(
+                assessment=self.level_banks.get(recommended, self.bank).assessment,
                 user_identifier=self._get_user_identifier(),
-                full_name=form.cleaned_data.get("full_name", ""),
-                email=form.cleaned_data.get("email", ""),
-                score=float(batch_gained),
-                total_weight=float(batch_total),
-                ratio=float(ratio),
+                full_name=form.cleaned_data.get("full_name", "") or identity.get("full_name", ""),
+                email=form.cleaned_data.get("email", "") or identity.get("email", ""),
+                score=gained_total,
+                total_weight=total_weight,
+                ratio=gained_total / max(total_weight, 1.0),
                 duration_seconds=elapsed,
-                recommended_level=next_level,
+                recommended_level=recommended,
             )
-            # Minimal per-question items are not persisted in adaptive mode to keep DB lean
-            self.request.session["recommended_level"] = next_level
+            # per-question items feed the item calibration (python manage.py calibrate_assessments)
+            items = [
+                SubmissionItem(question_id=r["id"], is_correct=r["correct"], gained_score=r["gained"])
+                for r in responses
+            ]
+            save_submission(submission, items)
+            self.request.session["recommended_level"] = recommended
             # Clear adaptive state
             self.request.session.pop("adaptive_state", None)
             self.request.session["adaptive"] = False
             return redirect("assessments:result")
 
         # Continue adaptive loop
-        state["current_level"] = next_level
         self.request.session["adaptive_state"] = state
         return redirect("assessments:take")
 
@@ -683,7 +404,6 @@ class AssessmentResultView(TemplateView):
                     
                     if incorrect_question_ids:
                         # Fetch questions with their hints
-                        from .models import Question
                         incorrect_questions = Question.objects.filter(
                             id__in=incorrect_question_ids
                         ).prefetch_related("hint_resources")
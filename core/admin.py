@@ -1,6 +1,64 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.core.exceptions import PermissionDenied
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .export import iter_csv, iter_rows
+from .models import ContactMessage, SiteVisit, YouTubeClick, AnonymousVisitor, DailyAnalyticsSummary
+
+
+class CSVExportMixin:
+    """
+    دکمه «خروجی CSV» در لیست ادمین برای بازه ?from=YYYY-MM-DD&to=YYYY-MM-DD (پیش‌فرض: ۷ روز اخیر)
+
+    پاسخ با StreamingHttpResponse و iterator پایگاه داده ساخته می‌شود، پس حجم
+    خروجی محدودیتی برای حافظه ندارد.
+    """
+    change_list_template = "admin/core/export_change_list.html"
+
+    def get_urls(self):
+        opts = self.model._meta
+        custom_urls = [
+            path(
+                "export/",
+                self.admin_site.admin_view(self.export_csv_view),
+                name=f"{opts.app_label}_{opts.model_name}_export",
+            ),
+        ]
+        return custom_urls + super().get_urls()
 
-from .models import ContactMessage, SiteVisit, YouTubeClick, AnonymousVisitor
+    def changelist_view(self, request, extra_context=None):
+        opts = self.model._meta
+        today = timezone.localdate()
+        extra_context = extra_context or {}
+        extra_context["export_url"] = reverse(f"admin:{opts.app_label}_{opts.model_name}_export")
+        extra_context["export_from"] = today - timedelta(days=6)
+        extra_context["export_to"] = today
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def export_csv_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        today = timezone.localdate()
+        try:
+            date_from = parse_date(request.GET["from"]) if request.GET.get("from") else today - timedelta(days=6)
+            date_to = parse_date(request.GET["to"]) if request.GET.get("to") else today
+        except ValueError:
+            date_from = date_to = None
+        if date_from is None or date_to is None or date_from > date_to:
+            return HttpResponseBadRequest("Invalid date range")
+
+        name = self.model._meta.model_name
+        response = StreamingHttpResponse(
+            iter_csv(self.model, iter_rows(self.model, date_from, date_to)),
+            content_type="text/csv; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{name}-{date_from}-{date_to}.csv"'
+        return response
 
 
 @admin.register(ContactMessage)
@@ -15,7 +73,7 @@ class ContactMessageAdmin(admin.ModelAdmin):
 class AnonymousVisitorAdmin(admin.ModelAdmin):
     list_display = ("session_key", "first_ip", "last_ip", "first_country", "last_country", "first_seen", "last_seen", "total_visits_display", "total_youtube_clicks_display")
     list_filter = ("first_seen", "last_seen", "first_country", "last_country")
-    search_fields = ("session_key", "first_ip", "last_ip", "first_country", "last_country", "first_user_agent", "last_user_agent")
+    search_fields = ("session_key", "first_ip", "last_ip", "first_country", "last_country", "first_user_agent__value", "last_user_agent__value")
     readonly_fields = (
         "session_key",
         "first_seen",
@@ -38,10 +96,10 @@ class AnonymousVisitorAdmin(admin.ModelAdmin):
 
 
 @admin.register(SiteVisit)
-class SiteVisitAdmin(admin.ModelAdmin):
+class SiteVisitAdmin(CSVExportMixin, admin.ModelAdmin):
     list_display = ("path", "created_at", "status_code", "user", "anonymous_visitor", "ip_address", "country")
     list_filter = ("status_code", "created_at", "country")
-    search_fields = ("path", "ip_address", "user_agent", "referrer", "country")
+    search_fields = ("path", "ip_address", "user_agent__value", "referrer__value", "country")
     readonly_fields = (
         "user",
         "anonymous_visitor",
@@ -57,7 +115,7 @@ class SiteVisitAdmin(admin.ModelAdmin):
 
 
 @admin.register(YouTubeClick)
-class YouTubeClickAdmin(admin.ModelAdmin):
+class YouTubeClickAdmin(CSVExportMixin, admin.ModelAdmin):
     list_display = ("youtube_id", "source_type", "source_title", "user", "anonymous_visitor", "ip_address", "country", "created_at")
     list_filter = ("source_type", "created_at", "country")
     search_fields = ("youtube_url", "youtube_id", "source_title", "ip_address", "country")
@@ -76,3 +134,18 @@ class YouTubeClickAdmin(admin.ModelAdmin):
         "created_at",
     )
 
+
+@admin.register(DailyAnalyticsSummary)
+class DailyAnalyticsSummaryAdmin(admin.ModelAdmin):
+    list_display = ("day", "visits", "logged_in_visits", "unique_ips", "youtube_clicks", "unique_clickers", "updated_at")
+    date_hierarchy = "day"
+    readonly_fields = (
+        "day",
+        "visits",
+        "logged_in_visits",
+        "unique_ips",
+        "youtube_clicks",
+        "logged_in_youtube_clicks",
+        "unique_clickers",
+        "updated_at",
+    )
@@ -0,0 +1,505 @@
+"""
+صف بافرشده برای ثبت آمار بازدید خارج از مسیر پاسخ‌دهی درخواست
+
+Middleware فقط یک رکورد سبک (dict) در صف قرار می‌دهد و یک thread پس‌زمینه
+رکوردها را هر N مورد یا هر T میلی‌ثانیه با bulk_create در پایگاه داده می‌نویسد.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import topk
+
+logger = logging.getLogger(__name__)
+
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_SYNC = "sync"
+
+
+def country_for_new_row(ip_address):
+    """
+    کشور برای ردیف جدید آمار
+
+    با ANALYTICS_DEFER_COUNTRY کشور خالی می‌ماند و بعداً با دستور
+    enrich_countries به‌صورت دسته‌ای پر می‌شود.
+    """
+    from .utils import get_country_from_ip
+
+    if not ip_address or getattr(settings, "ANALYTICS_DEFER_COUNTRY", False):
+        return ""
+    return get_country_from_ip(ip_address) or ""
+
+
+VISITOR_STATE_TIMEOUT = 86400
+
+
+def _visitor_state_key(session_key):
+    return f"anon_visitor_{session_key}"
+
+
+def forget_visitor(session_key):
+    """حذف وضعیت cache شده یک بازدیدکننده (مثلاً پس از حذف ردیف آن)"""
+    cache.delete(_visitor_state_key(session_key))
+
+
+def resolve_visitors(first, last):
+    """
+    شناسه بازدیدکنندگان ناشناس با حداقل نوشتن در پایگاه داده
+
+    first / last: {session_key: {"ip", "country", "user_agent_id", "seen"}} برای
+    اولین و آخرین بازدید هر نشست. وضعیت آخرین بازدید هر بازدیدکننده در cache
+    نگه داشته می‌شود و ردیف فقط وقتی به‌روز می‌شود که آی‌پی / کشور / مرورگر
+    تغییر کرده باشد یا از آخرین نوشتن بیش از ANALYTICS_VISITOR_UPDATE_INTERVAL
+    ثانیه گذشته باشد. همه به‌روزرسانی‌ها با یک bulk_update انجام می‌شوند.
+
+    باید داخل transaction.atomic صدا زده شود؛ cache پس از commit به‌روز می‌شود.
+    """
+    from .models import AnonymousVisitor
+
+    if not first:
+        return {}
+
+    interval = timedelta(seconds=getattr(settings, "ANALYTICS_VISITOR_UPDATE_INTERVAL", 300))
+    cached = cache.get_many([_visitor_state_key(key) for key in first])
+    states = {}
+    for key in first:
+        state = cached.get(_visitor_state_key(key))
+        if state is not None:
+            states[key] = state
+
+    unknown = [key for key in first if key not in states]
+    created = set()
+    if unknown:
+        visitors = AnonymousVisitor.objects.in_bulk(unknown, field_name="session_key")
+        missing = [key for key in unknown if key not in visitors]
+        if missing:
+            AnonymousVisitor.objects.bulk_create(
+                [
+                    AnonymousVisitor(
+                        session_key=key,
+                        first_ip=first[key]["ip"],
+                        first_country=first[key]["country"],
+                        first_user_agent_id=first[key]["user_agent_id"],
+                        last_ip=first[key]["ip"],
+                        last_country=first[key]["country"],
+                        last_user_agent_id=first[key]["user_agent_id"],
+                    )
+                    for key in missing
+                ],
+                ignore_conflicts=True,
+            )
+            new_visitors = AnonymousVisitor.objects.in_bulk(missing, field_name="session_key")
+            created = set(new_visitors)
+            visitors.update(new_visitors)
+        for key, visitor in visitors.items():
+            states[key] = {
+                "id": visitor.pk,
+                "ip": visitor.last_ip,
+                "country": visitor.last_country,
+                "user_agent_id": visitor.last_user_agent_id,
+                "seen": visitor.last_seen,
+            }
+
+    to_update = []
+    for key, state in states.items():
+        current = last[key]
+        if key in created and current is first[key]:
+            continue
+        changed = (current["ip"], current["country"], current["user_agent_id"]) != (
+            state["ip"],
+            state["country"],
+            state["user_agent_id"],
+        )
+        stale = state["seen"] is None or current["seen"] - state["seen"] >= interval
+        if changed or stale:
+            to_update.append(
+                AnonymousVisitor(
+                    pk=state["id"],
+                    last_ip=current["ip"],
+                    last_country=current["country"],
+                    last_user_agent_id=current["user_agent_id"],
+                    last_seen=current["seen"],
+                )
+            )
+            state.update(
+                ip=current["ip"],
+                country=current["country"],
+                user_agent_id=current["user_agent_id"],
+                seen=current["seen"],
+            )
+    if to_update:
+        AnonymousVisitor.objects.bulk_update(
+            to_update, ["last_ip", "last_country", "last_user_agent", "last_seen"]
+        )
+
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {_visitor_state_key(key): state for key, state in states.items()}, VISITOR_STATE_TIMEOUT
+        )
+    )
+    return {key: state["id"] for key, state in states.items()}
+
+
+def count_bot_hits(records):
+    """
+    جمع زدن درخواست‌های ربات‌ها در DailyBotCounter
+
+    records: رکوردهای {"bot", "created_at"}؛ برای هر (روز، ربات) یک UPDATE
+    با F و در صورت نبودن ردیف یک INSERT انجام می‌شود.
+    """
+    from .models import DailyBotCounter
+
+    counts = {}
+    for record in records:
+        key = (timezone.localdate(record["created_at"]), record["bot"])
+        counts[key] = counts.get(key, 0) + 1
+
+    for (day, bot), hits in counts.items():
+        # داخل تراکنش بیرونی (write_visits) savepoint جداگانه ساخته نمی‌شود
+        with transaction.atomic(savepoint=False):
+            updated = DailyBotCounter.objects.filter(day=day, bot=bot).update(hits=F("hits") + hits)
+            if not updated:
+                _, created = DailyBotCounter.objects.get_or_create(day=day, bot=bot, defaults={"hits": hits})
+                if not created:
+                    DailyBotCounter.objects.filter(day=day, bot=bot).update(hits=F("hits") + hits)
+    return len(records)
+
+
+def _resolve_request_fields(records):
+    """
+    کشور، شناسه رشته‌های مرورگر / ارجاع‌دهنده و وضعیت بازدیدکنندگان ناشناس یک دسته
+
+    خروجی: (countries, user_agent_ids, referrer_ids, first, last) که first / last
+    ورودی resolve_visitors برای اولین و آخرین رکورد هر نشست است.
+    """
+    from .interning import referrers, user_agents
+
+    countries = {}
+    for record in records:
+        ip_address = record.get("ip_address") or ""
+        if ip_address not in countries:
+            countries[ip_address] = country_for_new_row(ip_address)
+
+    # شناسه رشته‌های مرورگر / ارجاع‌دهنده (خارج از تراکنش، تا شناسه‌های cache شده با rollback از بین نروند)
+    user_agent_ids = user_agents.resolve_many(record.get("user_agent") for record in records)
+    referrer_ids = referrers.resolve_many(record.get("referrer") for record in records)
+
+    # اولین و آخرین بازدید هر نشست در این دسته
+    first = {}
+    last = {}
+    for record in records:
+        session_key = record.get("session_key")
+        if record.get("user_id") or not session_key:
+            continue
+        ip_address = record.get("ip_address") or ""
+        state = {
+            "ip": ip_address,
+            "country": countries.get(ip_address, ""),
+            "user_agent_id": user_agent_ids.get(record.get("user_agent")),
+            "seen": record["created_at"],
+        }
+        first.setdefault(session_key, state)
+        last[session_key] = state
+
+    return countries, user_agent_ids, referrer_ids, first, last
+
+
+def _build_clicks(records, fields, visitor_ids):
+    from .models import YouTubeClick
+
+    countries, user_agent_ids, referrer_ids = fields[:3]
+    clicks = []
+    for record in records:
+        ip_address = record.get("ip_address") or ""
+        visitor_id = None
+        if not record.get("user_id") and record.get("session_key"):
+            visitor_id = visitor_ids.get(record["session_key"])
+        clicks.append(
+            YouTubeClick(
+                user_id=record.get("user_id"),
+                anonymous_visitor_id=visitor_id,
+                youtube_url=record["youtube_url"],
+                youtube_id=record.get("youtube_id") or "",
+                source_type=record.get("source_type", "other"),
+                source_id=record.get("source_id"),
+                source_title=record.get("source_title", ""),
+                ip_address=ip_address,
+                country=countries.get(ip_address, ""),
+                user_agent_id=user_agent_ids.get(record.get("user_agent")),
+                referrer_id=referrer_ids.get(record.get("referrer")),
+                created_at=record["created_at"],
+                sample_weight=record.get("sample_weight", 1),
+            )
+        )
+    return clicks
+
+
+def _build_visits(records, fields, visitor_ids):
+    from .models import SiteVisit
+    from .utils import detect_device_type
+
+    countries, user_agent_ids, referrer_ids = fields[:3]
+    visits = []
+    for record in records:
+        ip_address = record.get("ip_address") or ""
+        user_agent = record.get("user_agent", "")
+        visitor_id = None
+        if not record.get("user_id") and record.get("session_key"):
+            visitor_id = visitor_ids.get(record["session_key"])
+        visits.append(
+            SiteVisit(
+                user_id=record.get("user_id"),
+                anonymous_visitor_id=visitor_id,
+                path=record["path"],
+                method=record.get("method", "GET"),
+                status_code=record.get("status_code", 200),
+                ip_address=ip_address,
+                country=countries.get(ip_address, ""),
+                device_type=detect_device_type(user_agent) if user_agent else "",
+                user_agent_id=user_agent_ids.get(user_agent),
+                referrer_id=referrer_ids.get(record.get("referrer")),
+                created_at=record["created_at"],
+                sample_weight=record.get("sample_weight", 1),
+            )
+        )
+    return visits
+
+
+def write_visits(records):
+    """
+    نوشتن دسته‌ای رکوردهای بازدید و کلیک در یک تراکنش
+
+    رکوردهای ربات‌ها (دارای کلید "bot") فقط در DailyBotCounter شمرده می‌شوند و
+    کلیک‌های یوتیوب (دارای کلید "youtube_url") در YouTubeClick ثبت می‌شوند.
+    بازدیدکنندگان ناشناس با resolve_visitors (cache + bulk_create / bulk_update)
+    ساخته یا به‌روز می‌شوند، سپس کلیک‌ها و بازدیدها هر کدام با یک bulk_create ثبت
+    و خلاصه‌های Top-K روز به‌روز می‌شوند. همه این نوشتن‌ها در یک تراکنش انجام
+    می‌شوند تا خطا در میانه دسته (مثلاً هنگام ingest از spool) هیچ ردیفی باقی
+    نگذارد و تکرار همان دسته ردیف تکراری نسازد.
+    """
+    from .models import SiteVisit, YouTubeClick
+
+    if not records:
+        return 0
+    bots = [record for record in records if record.get("bot")]
+    clicks = [record for record in records if not record.get("bot") and record.get("youtube_url")]
+    visits = [record for record in records if not record.get("bot") and not record.get("youtube_url")]
+
+    requests = clicks + visits
+    fields = _resolve_request_fields(requests) if requests else ({}, {}, {}, {}, {})
+
+    with transaction.atomic():
+        count_bot_hits(bots)
+        visitor_ids = resolve_visitors(*fields[3:])
+        if clicks:
+            click_rows = _build_clicks(clicks, fields, visitor_ids)
+            YouTubeClick.objects.bulk_create(click_rows)
+            topk.record_counts(topk.click_counts(click_rows))
+        if visits:
+            visit_rows = _build_visits(visits, fields, visitor_ids)
+            SiteVisit.objects.bulk_create(visit_rows)
+            topk.record_counts(topk.visit_counts(visit_rows))
+
+    return len(records)
+
+
+class AnalyticsBuffer:
+    """
+    صف محدود در حافظه همراه با یک thread نویسنده
+
+    - هر batch_size رکورد یا هر flush_interval_ms میلی‌ثانیه یک bulk_create انجام می‌شود
+    - اگر صف پر باشد، بر اساس overflow_policy رکورد دور ریخته می‌شود (drop)
+      یا به‌صورت همزمان در همان درخواست نوشته می‌شود (sync)
+    """
+
+    def __init__(
+        self,
+        writer=write_visits,
+        batch_size=200,
+        flush_interval_ms=2000,
+        max_queue=10000,
+        overflow_policy=OVERFLOW_DROP,
+        autostart=True,
+    ):
+        self.writer = writer
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = max(int(flush_interval_ms), 1) / 1000.0
+        self.max_queue = max(int(max_queue), 1)
+        self.overflow_policy = overflow_policy
+        self.autostart = autostart
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def enqueue(self, record):
+        """افزودن یک رکورد به صف؛ در صورت دور ریختن رکورد False برمی‌گرداند"""
+        if self.autostart:
+            self._ensure_worker()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow_policy == OVERFLOW_SYNC:
+            self._write([record])
+            return True
+
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            logger.warning(f"صف آمار پر است؛ {self.dropped} رکورد تاکنون دور ریخته شده است")
+        return False
+
+    def flush(self):
+        """نوشتن همزمان تمام رکوردهای موجود در صف"""
+        written = 0
+        while True:
+            batch = self._drain_nowait()
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def stop(self, flush=True):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval * 2)
+        if flush:
+            self.flush()
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == pid:
+            return
+        with self._lock:
+            thread = self._thread
+            if thread is not None and thread.is_alive() and self._pid == pid:
+                return
+            if self._pid != pid:
+                # پس از fork (مثلاً gunicorn) صف و قفل‌های والد قابل اعتماد نیستند
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._flush_lock = threading.Lock()
+                self._pid = pid
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="analytics-buffer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain_nowait(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        in_worker = threading.current_thread() is self._thread
+        with self._flush_lock:
+            if in_worker:
+                close_old_connections()
+            try:
+                self.writer(batch)
+            except Exception as e:
+                # آمار نباید باعث خطا در سایت شود
+                logger.warning(f"خطا در نوشتن {len(batch)} رکورد آمار: {e}")
+            finally:
+                if in_worker:
+                    close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """بافر سراسری (یکی برای هر پروسس) بر اساس تنظیمات ANALYTICS_*"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AnalyticsBuffer(
+                    batch_size=getattr(settings, "ANALYTICS_BATCH_SIZE", 200),
+                    flush_interval_ms=getattr(settings, "ANALYTICS_FLUSH_INTERVAL_MS", 2000),
+                    max_queue=getattr(settings, "ANALYTICS_MAX_QUEUE", 10000),
+                    overflow_policy=getattr(settings, "ANALYTICS_OVERFLOW_POLICY", OVERFLOW_DROP),
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def _spool(records):
+    """
+    نوشتن رکوردها در spool (اگر ANALYTICS_SPOOL_DIR تنظیم شده باشد)؛ رکوردهای نوشته‌نشده
+
+    اگر spool غیرفعال باشد همه رکوردها و اگر نوشتن در دیسک در میانه خطا بدهد فقط
+    رکوردهایی که کامل نوشته نشدند برگردانده می‌شوند تا از مسیر معمولی (صف یا
+    پایگاه داده) ثبت شوند؛ رکوردی که در spool نشسته دوباره نوشته نمی‌شود.
+    """
+    from .spool import get_writer
+
+    writer = get_writer()
+    if writer is None:
+        return records
+    return records[writer.append_many(records):]
+
+
+def record_visit(record):
+    """ثبت یک بازدید؛ در spool، در حالت async در صف و در غیر این صورت مستقیماً در پایگاه داده"""
+    if not _spool([record]):
+        return True
+    if getattr(settings, "ANALYTICS_ASYNC_WRITES", False):
+        return get_buffer().enqueue(record)
+    write_visits([record])
+    return True
+
+
+def record_clicks(records):
+    """ثبت دسته‌ای کلیک‌های یوتیوب؛ در spool، در حالت async در صف و در غیر این صورت با یک bulk_create"""
+    remaining = _spool(records)
+    spooled = len(records) - len(remaining)
+    if not remaining:
+        return spooled
+    if getattr(settings, "ANALYTICS_ASYNC_WRITES", False):
+        buffer = get_buffer()
+        return spooled + sum(1 for record in remaining if buffer.enqueue(record))
+    return spooled + write_visits(remaining)
@@ -0,0 +1,86 @@
+"""
+تشخیص ربات‌ها و crawler ها پیش از ثبت آمار
+
+درخواست ربات‌ها به جای ردیف کامل SiteVisit فقط در شمارنده روزانه
+DailyBotCounter جمع زده می‌شوند (بدون جستجوی کشور، شناسه بازدیدکننده و درج).
+تشخیص بر اساس یک regex کامپایل‌شده روی User Agent و تعداد درخواست هر آی‌پی
+در دقیقه است.
+"""
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# نام‌های شناخته‌شده؛ گزینه‌های خاص قبل از الگوهای عمومی می‌آیند تا نام دقیق‌تری ثبت شود.
+# ربات‌های Yandex با نام کامل آمده‌اند چون "YandexSearch/..." در رشته مرورگر YaBrowser هم هست
+_KNOWN_BOTS = [
+    "googlebot", "google-inspectiontool", "adsbot-google", "mediapartners-google", "bingbot",
+    "yandexbot", "yandeximages", "yandexmetrika", "yandexdirect", "yandexmedia", "yandexvideo",
+    "yandexwebmaster", "yandexfavicons", "yandexmobilebot", "yandexaccessibilitybot",
+    "baiduspider", "duckduckbot", "slurp", "applebot", "petalbot",
+    "ahrefsbot", "semrushbot", "mj12bot", "dotbot", "bytespider", "gptbot", "chatgpt-user",
+    "claudebot", "ccbot", "perplexitybot", "facebookexternalhit", "facebookcatalog",
+    "twitterbot", "linkedinbot", "telegrambot", "whatsapp", "discordbot", "slackbot",
+    "pingdom", "uptimerobot", "statuscake", "site24x7", "betteruptime", "uptime-kuma",
+    "headlesschrome", "phantomjs", "lighthouse", "curl", "wget", "python-requests",
+    "python-urllib", "aiohttp", "httpx", "go-http-client", "okhttp", "libwww-perl",
+    "axios", "node-fetch", "postmanruntime", "scrapy",
+]
+# نام‌هایی که داخل رشته مرورگرها هم می‌آیند ("javascript") فقط به شکل نام محصول
+# با نسخه ("Java/17.0.2") پذیرفته می‌شوند
+_PRODUCT_BOTS = ["java"]
+# نام‌های عمومی فقط با نحو ربات پذیرفته می‌شوند: نام محصول پیش از "/" یا ";"
+# (مثل "SomeCrawler/1.0") یا پس از "compatible;"؛ تا نام دستگاه‌هایی مثل
+# "CUBOT X30" ربات حساب نشوند
+_GENERIC = ["bot", "crawler", "spider", "scraper", "fetcher"]
+_GENERIC_NAME = r"[a-z0-9_-]*(?:" + "|".join(_GENERIC) + ")"
+
+_BOT_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(name) for name in _KNOWN_BOTS) + ")"
+    + r"|\b(?:" + "|".join(re.escape(name) for name in _PRODUCT_BOTS) + ")(?=/)"
+    + r"|\b" + _GENERIC_NAME + r"(?=[/;])"
+    + r"|(?<=compatible; )" + _GENERIC_NAME + r"\b"
+    + r"|(?<=compatible;)" + _GENERIC_NAME + r"\b",
+)
+
+RATE_LIMITED = "rate-limited"
+EMPTY_USER_AGENT = "empty-user-agent"
+
+
+def bot_label(user_agent):
+    """نام ربات بر اساس User Agent یا رشته خالی برای مرورگرهای معمولی"""
+    if not user_agent:
+        return EMPTY_USER_AGENT
+    match = _BOT_RE.search(user_agent.lower())
+    return match.group(0)[:50] if match else ""
+
+
+def exceeds_rate_limit(ip_address):
+    """
+    آیا این آی‌پی در دقیقه جاری بیش از ANALYTICS_BOT_MAX_REQUESTS_PER_MINUTE درخواست داشته است
+
+    شمارنده در cache نگه داشته می‌شود (با cache مشترک بین پروسس‌ها دقیق‌تر است).
+    """
+    limit = getattr(settings, "ANALYTICS_BOT_MAX_REQUESTS_PER_MINUTE", 0)
+    if not limit or not ip_address:
+        return False
+    key = f"bot_rate_{ip_address}_{int(time.time() // 60)}"
+    cache.add(key, 0, 120)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # کلید بین add و incr منقضی شده است
+        return False
+    return count > limit
+
+
+def classify_bot(user_agent, ip_address):
+    """نام ربات یا رشته خالی؛ ابتدا User Agent و سپس تعداد درخواست آی‌پی بررسی می‌شود"""
+    label = bot_label(user_agent)
+    if label:
+        return label
+    if exceeds_rate_limit(ip_address):
+        return RATE_LIMITED
+    return ""
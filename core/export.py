@@ -0,0 +1,145 @@
+"""
+خروجی جریانی (streaming) داده خام آمار برای یک بازه تاریخ
+
+ردیف‌ها با values_list(...).iterator(chunk_size) خوانده می‌شوند (در PostgreSQL
+با server-side cursor) و بلافاصله به CSV یا Parquet تبدیل می‌شوند؛ پس حافظه
+مصرفی مستقل از تعداد ردیف‌ها و حداکثر به اندازه یک chunk است.
+
+- پنل ادمین SiteVisit / YouTubeClick: دکمه «خروجی CSV» (StreamingHttpResponse)
+- "python manage.py export_analytics": فایل CSV (یا .csv.gz) یا Parquet
+
+ستون‌های user_agent و referrer با متن اصلی (نه شناسه جدول‌های interning) نوشته می‌شوند.
+Parquet به pyarrow نیاز دارد که وابستگی اختیاری است.
+"""
+import csv
+import gzip
+from datetime import timedelta
+
+from .models import Referrer, SiteVisit, UserAgent, YouTubeClick
+from .rollups import day_start
+
+
+EXPORT_MODELS = {
+    "sitevisit": SiteVisit,
+    "youtubeclick": YouTubeClick,
+}
+FORMATS = ("csv", "parquet")
+DEFAULT_CHUNK_SIZE = 2000
+# تعداد خطوط CSV که با هم به پاسخ HTTP فرستاده می‌شوند
+_LINES_PER_WRITE = 500
+
+
+def export_columns(model):
+    """[(نام ستون، مسیر values_list)] برای همه فیلدهای ذخیره‌شده مدل"""
+    columns = []
+    for field in model._meta.concrete_fields:
+        if field.related_model in (UserAgent, Referrer):
+            columns.append((field.name, f"{field.name}__value"))
+        else:
+            columns.append((field.attname, field.attname))
+    return columns
+
+
+def export_queryset(model, date_from=None, date_to=None):
+    """ردیف‌های بازه date_from تا date_to (هر دو شامل، تاریخ محلی)"""
+    queryset = model.objects.all()
+    if date_from:
+        queryset = queryset.filter(created_at__gte=day_start(date_from))
+    if date_to:
+        queryset = queryset.filter(created_at__lt=day_start(date_to + timedelta(days=1)))
+    return queryset.order_by("created_at", "id")
+
+
+def iter_rows(model, date_from=None, date_to=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """تاپل‌های ردیف به ترتیب export_columns، chunk به chunk از پایگاه داده"""
+    paths = [path for _, path in export_columns(model)]
+    return export_queryset(model, date_from, date_to).values_list(*paths).iterator(chunk_size=chunk_size)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """فایل ساختگی برای csv.writer که خط نوشته‌شده را برمی‌گرداند"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(model, rows):
+    """خطوط CSV (با سطر عنوان) به صورت رشته‌های چندخطی برای StreamingHttpResponse"""
+    writer = csv.writer(_Echo())
+    lines = [writer.writerow([name for name, _ in export_columns(model)])]
+    for row in rows:
+        lines.append(writer.writerow([_csv_value(value) for value in row]))
+        if len(lines) >= _LINES_PER_WRITE:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def write_csv(path, model, rows):
+    """نوشتن CSV در فایل (با پسوند .gz فشرده می‌شود)؛ تعداد ردیف‌ها برگردانده می‌شود"""
+    count = 0
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in export_columns(model)])
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+            count += 1
+    return count
+
+
+def _arrow_type(pa, field):
+    internal_type = field.get_internal_type()
+    if field.related_model in (UserAgent, Referrer):
+        return pa.string()
+    if internal_type == "DateTimeField":
+        return pa.timestamp("us", tz="UTC")
+    if internal_type in ("AutoField", "BigAutoField", "ForeignKey") or internal_type.endswith("IntegerField"):
+        return pa.int64()
+    if internal_type == "BooleanField":
+        return pa.bool_()
+    return pa.string()
+
+
+def write_parquet(path, model, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    نوشتن فایل Parquet با یک row group برای هر chunk
+
+    ImportError اگر pyarrow نصب نباشد.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fields = model._meta.concrete_fields
+    schema = pa.schema(
+        [(name, _arrow_type(pa, field)) for (name, _), field in zip(export_columns(model), fields)]
+    )
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                writer.write_table(_arrow_table(pa, schema, batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(_arrow_table(pa, schema, batch))
+            count += len(batch)
+    return count
+
+
+def _arrow_table(pa, schema, batch):
+    columns = list(zip(*batch))
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+    )
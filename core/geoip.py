@@ -0,0 +1,441 @@
+"""
+تشخیص کشور از روی IP با پایگاه داده محلی بازه‌های IP
+
+فایل پایگاه داده یک جدول مرتب از بازه‌های IPv4 است که با mmap باز می‌شود و
+جستجو در آن با binary search انجام می‌شود؛ بنابراین هیچ درخواست شبکه‌ای
+در مسیر درخواست کاربر انجام نمی‌شود.
+
+قالب فایل:
+    هدر:   b"SGEO" + نسخه (uint32) + تعداد رکوردها (uint32)
+    رکورد: شروع بازه (uint32) + پایان بازه (uint32) + کد کشور (2 بایت ASCII)
+"""
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"SGEO"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+RECORD = struct.Struct("<II2s")
+
+
+def _ip_to_int(value):
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    return int(ipaddress.IPv4Address(value))
+
+
+def build_database(rows, path):
+    """
+    ساخت فایل پایگاه داده از ردیف‌های (شروع، پایان، کد کشور)
+
+    شروع و پایان می‌توانند رشته IP یا عدد صحیح باشند. ردیف‌های IPv6 یا
+    نامعتبر نادیده گرفته می‌شوند. تعداد رکوردهای نوشته‌شده برگردانده می‌شود.
+    """
+    ranges = []
+    for start, end, country in rows:
+        country = (country or "").strip().upper()
+        if len(country) != 2 or not country.isalpha():
+            continue
+        try:
+            start_int = _ip_to_int(start)
+            end_int = _ip_to_int(end)
+        except (ValueError, ipaddress.AddressValueError):
+            continue
+        if not (0 <= start_int <= end_int <= 0xFFFFFFFF):
+            continue
+        ranges.append((start_int, end_int, country))
+
+    ranges.sort()
+
+    # ادغام بازه‌های پیوسته با کشور یکسان و حذف همپوشانی‌ها
+    merged = []
+    for start, end, country in ranges:
+        if merged:
+            prev_start, prev_end, prev_country = merged[-1]
+            if start <= prev_end:
+                start = prev_end + 1
+                if start > end:
+                    continue
+            if prev_country == country and start == prev_end + 1:
+                merged[-1] = (prev_start, end, country)
+                continue
+        merged.append((start, end, country))
+
+    tmp_path = f"{path}.tmp"
+    directory = os.path.dirname(os.fspath(path))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(merged)))
+        for start, end, country in merged:
+            f.write(RECORD.pack(start, end, country.encode("ascii")))
+    # جایگزینی اتمیک تا worker هایی که فایل قبلی را باز کرده‌اند آسیب نبینند
+    os.replace(tmp_path, path)
+    return len(merged)
+
+
+class IPRangeDatabase:
+    """جدول بازه‌های IP که با mmap فقط‌خواندنی باز شده است"""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"Invalid GeoIP database: {self.path}")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"Unsupported GeoIP database format: {self.path}")
+        if HEADER.size + count * RECORD.size > size:
+            self._map.close()
+            raise ValueError(f"Truncated GeoIP database: {self.path}")
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, ip):
+        """کد کشور دو حرفی یا رشته خالی"""
+        try:
+            target = _ip_to_int(ip)
+        except (ValueError, ipaddress.AddressValueError):
+            return ""
+
+        lo, hi = 0, self.count - 1
+        unpack_from = RECORD.unpack_from
+        data = self._map
+        base = HEADER.size
+        size = RECORD.size
+        while lo <= hi:
+            mid = (lo + hi) >> 1
+            start, end, country = unpack_from(data, base + mid * size)
+            if target < start:
+                hi = mid - 1
+            elif target > end:
+                lo = mid + 1
+            else:
+                return country.decode("ascii")
+        return ""
+
+    def close(self):
+        self._map.close()
+
+
+class LocalDatabaseResolver:
+    """
+    Resolver پیش‌فرض: جستجوی درون‌پروسسی در فایل GEOIP_DATABASE_PATH
+
+    حداکثر هر recheck_interval ثانیه mtime فایل بررسی می‌شود: فایل تازه (مثلاً
+    پس از build_geoip_db) بدون راه‌اندازی مجدد worker بارگذاری می‌شود و اگر فایل
+    در دسترس نباشد پس از همین فاصله دوباره تلاش می‌شود.
+    """
+
+    def __init__(self, path, recheck_interval=60):
+        self.path = path
+        self.recheck_interval = recheck_interval
+        self._db = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        if time.monotonic() < self._next_check:
+            return self._db
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_check:
+                return self._db
+            self._next_check = now + self.recheck_interval
+            mtime = self._file_mtime()
+            if self._db is not None and mtime == self._mtime:
+                return self._db
+            try:
+                db = IPRangeDatabase(self.path)
+            except (OSError, ValueError) as e:
+                # تا بارگذاری موفق بعدی فقط یک بار در هر worker گزارش بده؛ فایل قبلی (اگر بود) استفاده می‌شود
+                if not self._warned:
+                    self._warned = True
+                    logger.warning(f"پایگاه داده GeoIP در دسترس نیست ({self.path}): {e}")
+                return self._db
+            # mmap قبلی بسته نمی‌شود چون ممکن است thread دیگری هنوز در آن جستجو کند
+            self._db, self._mtime, self._warned = db, mtime, False
+            return db
+
+    def resolve(self, ip):
+        db = self._load()
+        return db.lookup(ip) if db is not None else ""
+
+
+class HTTPResolver:
+    """Resolver قدیمی مبتنی بر ipapi.co / ip-api.com (فقط برای کارهای آفلاین توصیه می‌شود)"""
+
+    def resolve(self, ip):
+        from .utils import lookup_country_http
+
+        return lookup_country_http(ip)
+
+
+class CachingResolver:
+    """
+    لایه cache برای resolver های کند (مثل HTTP)
+
+    - LRU درون‌پروسسی جلوی cache جنگو
+    - نتایج منفی (پاسخ نامعتبر) با TTL کوتاه‌تر ذخیره می‌شوند؛ خطای upstream هم
+      با همین TTL علامت‌گذاری می‌شود ولی نتیجه آن None («نامعلوم») است
+    - درخواست‌های همزمان برای یک IP در هر پروسس به یک فراخوانی upstream تبدیل
+      می‌شوند و بین پروسس‌ها با یک قفل کوتاه در cache (cache.add) هماهنگ می‌شوند؛
+      پروسس‌های دیگر تا wait_timeout منتظر نتیجه پروسس صاحب قفل می‌مانند
+
+    None یعنی کشور فعلاً معلوم نیست و نباید به جای «بدون کشور» ذخیره شود.
+    """
+
+    CACHE_PREFIX = "country_ip_"
+    LOCK_PREFIX = "country_ip_lock_"
+    # علامت خطای upstream در cache (کد کشور معتبر نیست)
+    ERROR = "?"
+
+    def __init__(self, inner, ttl=86400, negative_ttl=3600, lru_size=4096, wait_timeout=5, poll_interval=0.05):
+        self.inner = inner
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lru_size = max(int(lru_size), 1)
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._lru = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _lru_get(self, ip):
+        with self._lock:
+            entry = self._lru.get(ip)
+            if entry is None:
+                return None
+            country, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._lru[ip]
+                return None
+            self._lru.move_to_end(ip)
+            return country
+
+    def _lru_set(self, ip, country, ttl):
+        with self._lock:
+            self._lru[ip] = (country, time.monotonic() + ttl)
+            self._lru.move_to_end(ip)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _result(self, value):
+        return None if value == self.ERROR else value
+
+    def _from_cache(self, ip):
+        cached = cache.get(f"{self.CACHE_PREFIX}{ip}")
+        if cached is not None:
+            self._lru_set(ip, cached, self.ttl if cached and cached != self.ERROR else self.negative_ttl)
+        return cached
+
+    def resolve(self, ip):
+        country = self._lru_get(ip)
+        if country is not None:
+            return self._result(country)
+
+        cached = self._from_cache(ip)
+        if cached is not None:
+            return self._result(cached)
+
+        # فقط یک thread در این پروسس درخواست upstream را ارسال می‌کند
+        with self._lock:
+            event = self._inflight.get(ip)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[ip] = event
+
+        if not leader:
+            event.wait(self.wait_timeout)
+            return self._result(self._lru_get(ip))
+
+        try:
+            return self._resolve_upstream(ip)
+        finally:
+            with self._lock:
+                self._inflight.pop(ip, None)
+            event.set()
+
+    def _resolve_upstream(self, ip):
+        lock_key = f"{self.LOCK_PREFIX}{ip}"
+        if not cache.add(lock_key, 1, self.wait_timeout):
+            # پروسس دیگری در حال resolve همین IP است؛ منتظر نتیجه آن در cache بمان
+            deadline = time.monotonic() + self.wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                cached = self._from_cache(ip)
+                if cached is not None:
+                    return self._result(cached)
+            return None
+        try:
+            try:
+                country = (self.inner.resolve(ip) or "").strip().upper()
+            except Exception as e:
+                logger.warning(f"خطا در تشخیص کشور برای IP {ip}: {e}")
+                country = self.ERROR
+            if country != self.ERROR and (len(country) != 2 or not country.isalpha()):
+                country = ""
+            ttl = self.ttl if country and country != self.ERROR else self.negative_ttl
+            cache.set(f"{self.CACHE_PREFIX}{ip}", country, ttl)
+            self._lru_set(ip, country, ttl)
+            return self._result(country)
+        finally:
+            cache.delete(lock_key)
+
+
+def caching_resolver(inner):
+    """پوشاندن resolver با CachingResolver بر اساس تنظیمات GEOIP_*"""
+    return CachingResolver(
+        inner,
+        ttl=getattr(settings, "GEOIP_CACHE_TTL", 86400),
+        negative_ttl=getattr(settings, "GEOIP_NEGATIVE_CACHE_TTL", 3600),
+        lru_size=getattr(settings, "GEOIP_LRU_SIZE", 4096),
+    )
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver():
+    """Resolver فعال بر اساس تنظیم GEOIP_BACKEND؛ یک بار در هر worker ساخته می‌شود"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                backend = getattr(settings, "GEOIP_BACKEND", "local")
+                if backend == "http":
+                    _resolver = caching_resolver(HTTPResolver())
+                else:
+                    _resolver = LocalDatabaseResolver(
+                        getattr(settings, "GEOIP_DATABASE_PATH", ""),
+                        recheck_interval=getattr(settings, "GEOIP_DATABASE_RECHECK_INTERVAL", 60),
+                    )
+    return _resolver
+
+
+def reset_resolver():
+    """پاک کردن resolver ساخته‌شده (مثلاً پس از ساخت مجدد فایل پایگاه داده)"""
+    global _resolver
+    with _resolver_lock:
+        _resolver = None
+
+
+def enrich_countries(resolve=None, batch_size=500, only_missing=True):
+    """
+    پر کردن کشور ردیف‌های SiteVisit و YouTubeClick (و AnonymousVisitor) به‌صورت دسته‌ای
+
+    آی‌پی‌های یکتا به‌صورت دسته‌ای خوانده می‌شوند، هر آی‌پی فقط یک بار resolve
+    می‌شود و نتیجه با یک UPDATE ... WHERE ip_address IN (...) برای هر کشور
+    اعمال می‌شود. با only_missing=False همه ردیف‌ها دوباره resolve می‌شوند
+    (مثلاً پس از تعویض ارائه‌دهنده). فقط نتایج غیرخالی نوشته می‌شوند تا خطای
+    موقت resolver (None) یا نتیجه خالی کشورِ از قبل معلوم را پاک نکند.
+
+    کشور بازدیدها در خلاصه‌های روزانه هم هست؛ روزهایی که بازدیدشان تغییر کرده
+    با rollups.refresh_countries به‌روز می‌شوند (بازسازی روزهای rollup شده و
+    افزایش Top-K کشورهای امروز).
+
+    Returns:
+        dict با تعداد آی‌پی‌های resolve شده، ردیف‌های به‌روزشده برای هر مدل و
+        روزهای rollup بازسازی‌شده (rebuilt_days)
+    """
+    from .models import AnonymousVisitor, SiteVisit, YouTubeClick
+    from .rollups import refresh_countries
+    from .utils import get_country_from_ip
+
+    resolve = resolve or get_country_from_ip
+    batch_size = max(int(batch_size), 1)
+    resolved = {}
+    stats = {"resolved_ips": 0}
+    # {روز: Counter({کشور: تغییر وزن})} برای بازدیدهایی که کشورشان پر شده یا عوض شده است
+    visit_days = {}
+
+    targets = [
+        (SiteVisit, "ip_address", "country"),
+        (YouTubeClick, "ip_address", "country"),
+        (AnonymousVisitor, "first_ip", "first_country"),
+        (AnonymousVisitor, "last_ip", "last_country"),
+    ]
+    for model, ip_field, country_field in targets:
+        base_qs = model.objects.exclude(**{ip_field: ""})
+        if only_missing:
+            base_qs = base_qs.filter(**{country_field: ""})
+
+        updated = 0
+        last_ip = None
+        while True:
+            qs = base_qs
+            if last_ip is not None:
+                qs = qs.filter(**{f"{ip_field}__gt": last_ip})
+            ips = list(
+                qs.order_by(ip_field).values_list(ip_field, flat=True).distinct()[:batch_size]
+            )
+            if not ips:
+                break
+            last_ip = ips[-1]
+
+            by_country = {}
+            for ip in ips:
+                if ip not in resolved:
+                    resolved[ip] = resolve(ip) or ""
+                country = resolved[ip]
+                if country:
+                    by_country.setdefault(country, []).append(ip)
+
+            for country, country_ips in by_country.items():
+                update_qs = model.objects.filter(**{f"{ip_field}__in": country_ips})
+                if only_missing:
+                    update_qs = update_qs.filter(**{country_field: ""})
+                else:
+                    update_qs = update_qs.exclude(**{country_field: country})
+                if model is SiteVisit:
+                    # وزن ردیف‌هایی که کشور قبلی داشتند (only_missing=False) از آن کشور کم می‌شود
+                    for row in (
+                        update_qs.annotate(day=TruncDate("created_at"))
+                        .values("day", "country")
+                        .annotate(visits=Coalesce(Sum("sample_weight"), 0))
+                        .order_by()
+                    ):
+                        counts = visit_days.setdefault(row["day"], Counter())
+                        counts[country] += row["visits"]
+                        if row["country"]:
+                            counts[row["country"]] -= row["visits"]
+                updated += update_qs.update(**{country_field: country})
+
+        key = f"{model._meta.model_name}.{country_field}"
+        stats[key] = updated
+
+    stats["resolved_ips"] = len(resolved)
+    stats["rebuilt_days"] = refresh_countries(visit_days) if visit_days else []
+    return stats
@@ -0,0 +1,88 @@
+"""
+HyperLogLog برای شمارش تقریبی مقادیر یکتا (آی‌پی‌ها، بازدیدکنندگان، کلیک‌کنندگان)
+
+هر روز یک sketch کوچک در DailySketch ذخیره می‌شود و sketch های چند روز با
+گرفتن بیشینه ثبات‌ها (register) ادغام می‌شوند؛ پس تعداد یکتای هر بازه دلخواه
+بدون DISTINCT روی جدول خام به دست می‌آید. با precision = 14 خطای استاندارد
+حدود 0.8٪ است.
+"""
+import math
+import zlib
+from hashlib import blake2b
+
+
+DEFAULT_PRECISION = 14
+_HASH_BITS = 64
+
+
+class HyperLogLog:
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError("register count does not match precision")
+
+    @property
+    def standard_error(self):
+        """خطای نسبی استاندارد تخمین (1.04 / sqrt(m))"""
+        return 1.04 / math.sqrt(self.size)
+
+    def add(self, value):
+        digest = blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (_HASH_BITS - self.precision)
+        remainder = hashed & ((1 << (_HASH_BITS - self.precision)) - 1)
+        rank = _HASH_BITS - self.precision - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        """اجتماع با sketch دیگر (در همین شیء)"""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """تخمین تعداد مقادیر یکتا"""
+        m = self.size
+        total = math.fsum(2.0 ** -register for register in self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / total
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # تصحیح بازه کوچک (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        """نمایش فشرده برای ذخیره در BinaryField (بایت اول precision است)"""
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(precision=data[0], registers=zlib.decompress(data[1:]))
+
+    @classmethod
+    def union(cls, sketches, precision=DEFAULT_PRECISION):
+        """اجتماع چند sketch در یک گذر (سریع‌تر از merge های پشت سر هم)"""
+        sketches = list(sketches)
+        registers = [sketch.registers for sketch in sketches]
+        if any(sketch.precision != precision for sketch in sketches):
+            raise ValueError("cannot merge sketches with different precision")
+        if not registers:
+            return cls(precision)
+        if len(registers) == 1:
+            return cls(precision, registers[0])
+        return cls(precision, map(max, *registers))
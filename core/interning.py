@@ -0,0 +1,86 @@
+"""
+تبدیل رشته‌های مرورگر / ارجاع‌دهنده به شناسه عددی جداول UserAgent و Referrer
+
+resolve-or-insert: ابتدا LRU درون‌پروسسی، سپس جستجو با هش و در نهایت درج
+دسته‌ای (ignore_conflicts) برای رشته‌های جدید. چون تعداد رشته‌های متمایز کم است،
+تقریباً همه درخواست‌ها از LRU پاسخ می‌گیرند.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .models import Referrer, UserAgent
+
+
+MAX_LENGTH = 500
+
+
+def value_hash(value):
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+class InternTable:
+    def __init__(self, model, lru_size=4096):
+        self.model = model
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve_many(self, values):
+        """دیکشنری رشته -> شناسه؛ رشته خالی نادیده گرفته می‌شود و رشته‌های بلند بریده می‌شوند"""
+        result = {}
+        missing = {}
+        with self._lock:
+            for value in values:
+                if not value or value in result or value in missing:
+                    continue
+                key = value[:MAX_LENGTH]
+                pk = self._lru.get(key)
+                if pk is None:
+                    missing[value] = key
+                else:
+                    self._lru.move_to_end(key)
+                    result[value] = pk
+        if not missing:
+            return result
+
+        hashes = {value_hash(key): key for key in missing.values()}
+        found = dict(self.model.objects.filter(value_hash__in=hashes).values_list("value_hash", "id"))
+        new = [h for h in hashes if h not in found]
+        if new:
+            self.model.objects.bulk_create(
+                [self.model(value_hash=h, value=hashes[h]) for h in new],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts شناسه برنمی‌گرداند (و ممکن است پروسس دیگری زودتر درج کرده باشد)
+            found.update(self.model.objects.filter(value_hash__in=new).values_list("value_hash", "id"))
+        ids = {hashes[h]: pk for h, pk in found.items()}
+
+        with self._lock:
+            for value, key in missing.items():
+                result[value] = ids[key]
+                self._lru[key] = ids[key]
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return result
+
+    def resolve(self, value):
+        """شناسه یک رشته یا None برای رشته خالی"""
+        if not value:
+            return None
+        return self.resolve_many([value]).get(value)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+
+user_agents = InternTable(UserAgent)
+referrers = InternTable(Referrer)
+
+
+def reset_intern_caches():
+    """پاک کردن LRU ها (مثلاً در تست‌ها که ردیف‌ها با rollback حذف می‌شوند)"""
+    user_agents.clear()
+    referrers.clear()
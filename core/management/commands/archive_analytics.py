@@ -0,0 +1,117 @@
+"""
+بایگانی و حذف داده خام قدیمی آمار (مناسب برای اجرا در cron پس از rollup_analytics)
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import SiteVisit, YouTubeClick
+from core.retention import (
+    archive_rows,
+    convert_to_partitioned,
+    drop_partitions_before,
+    ensure_partitions,
+    ensure_rollups_before,
+    is_partitioned,
+    is_postgresql,
+    retention_cutoff,
+)
+
+
+MODELS = {
+    'sitevisit': SiteVisit,
+    'youtubeclick': YouTubeClick,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Move raw analytics rows older than the retention window into daily "
+        "gzip JSONL archives and delete them in bounded batches. Missing daily "
+        "rollups are built first so dashboards keep their history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Retention window in days (default: settings.ANALYTICS_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            type=str,
+            default=None,
+            help='Archive directory (default: settings.ANALYTICS_ARCHIVE_DIR)'
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Delete old rows without writing archive files'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows archived and deleted per batch (default: 5000)'
+        )
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=sorted(MODELS),
+            default=sorted(MODELS),
+            help='Tables to archive (default: all)'
+        )
+        parser.add_argument(
+            '--partition',
+            action='store_true',
+            help='PostgreSQL only: convert the site visit table to monthly range partitions (one-time)'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='PostgreSQL only: number of future monthly partitions to keep created (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.ANALYTICS_RETENTION_DAYS
+        archive_dir = None if options['no_archive'] else (options['archive_dir'] or settings.ANALYTICS_ARCHIVE_DIR)
+        batch_size = options['batch_size']
+
+        if options['partition']:
+            if not is_postgresql():
+                raise CommandError('Table partitioning is only supported on PostgreSQL')
+            if is_partitioned():
+                self.stdout.write(self.style.SUCCESS('✓ Site visit table is already partitioned'))
+            else:
+                self.stdout.write(self.style.WARNING('Converting site visit table to monthly partitions...'))
+                convert_to_partitioned(months_ahead=options['months_ahead'])
+                self.stdout.write(self.style.SUCCESS('✓ Site visit table partitioned'))
+
+        partitioned = is_partitioned()
+        if partitioned:
+            ensure_partitions(months_ahead=options['months_ahead'])
+
+        if days <= 0:
+            self.stdout.write(self.style.SUCCESS('✓ Retention is disabled (ANALYTICS_RETENTION_DAYS=0)'))
+            return
+
+        cutoff = retention_cutoff(days)
+        self.stdout.write(self.style.WARNING(f'Archiving rows older than {cutoff:%Y-%m-%d}...'))
+
+        built = ensure_rollups_before(cutoff)
+        if built:
+            self.stdout.write(f'  ✓ Built rollups for {len(built)} day(s)')
+
+        for name in options['models']:
+            model = MODELS[name]
+            count = 0
+            if model is SiteVisit and partitioned:
+                count += drop_partitions_before(cutoff, archive_dir=archive_dir, batch_size=batch_size)
+            count += archive_rows(model, cutoff, archive_dir=archive_dir, batch_size=batch_size)
+            self.stdout.write(f'  ✓ {name}: {count} rows')
+
+        if archive_dir:
+            self.stdout.write(self.style.SUCCESS(f'✓ Archive completed ({archive_dir})'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Old rows deleted'))
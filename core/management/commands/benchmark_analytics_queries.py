@@ -0,0 +1,230 @@
+"""
+بنچمارک پرس‌وجوهای داشبورد آمار با و بدون ایندکس‌های ترکیبی SiteVisit
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import AnonymousVisitor, SiteVisit
+from core.rollups import weighted_count
+
+
+BENCH_PATH_PREFIX = "/bench/"
+BENCH_VISITOR_PREFIX = "bench-"
+BENCH_USER_PREFIX = "bench_user_"
+# ایندکس‌هایی که با --compare-indexes موقتاً حذف و دوباره ساخته می‌شوند
+QUERY_INDEXES = ("core_sitevisit_created_path", "core_sitevisit_user_created", "core_sitevisit_anon_created")
+BRIN_INDEX = "core_sitevisit_created_brin"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic page visits and time the analytics dashboard queries. With "
+        "--compare-indexes the composite SiteVisit indexes are dropped and recreated "
+        "to report timings before and after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Number of synthetic visits to insert before benchmarking (default: 0)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Spread seeded visits over the last N days and query the last N/3 days (default: 90)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows per bulk_create while seeding (default: 10000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per query; the fastest is reported (default: 3)'
+        )
+        parser.add_argument(
+            '--compare-indexes',
+            action='store_true',
+            help='Also time every query with the composite indexes dropped'
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the query plan of every query'
+        )
+        parser.add_argument(
+            '--cleanup',
+            action='store_true',
+            help='Delete the seeded visits, visitors and users and exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+
+        if options['seed']:
+            self.seed(options['seed'], options['days'], options['batch_size'])
+            self.analyze()
+
+        queries = self.queries(timezone.now() - timedelta(days=max(options['days'] // 3, 1)))
+        if options['explain']:
+            for name, queryset in queries:
+                self.stdout.write(self.style.WARNING(name))
+                self.stdout.write(queryset.explain())
+
+        self.stdout.write(self.style.WARNING(
+            f'Timing {len(queries)} queries over {SiteVisit.objects.count()} visits...'
+        ))
+        after = self.measure(queries, options['repeat'])
+        before = None
+        if options['compare_indexes']:
+            removed = self.drop_indexes()
+            try:
+                before = self.measure(queries, options['repeat'])
+            finally:
+                self.restore_indexes(removed)
+
+        for name, _ in queries:
+            line = f'  ✓ {name}: {after[name]:.1f} ms'
+            if before is not None:
+                line = f'  ✓ {name}: {before[name]:.1f} ms -> {after[name]:.1f} ms'
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark completed'))
+
+    def queries(self, date_from):
+        """پرس‌وجوهای اصلی accounts.views برای بازه date_from تا اکنون"""
+        visits_qs = SiteVisit.objects.filter(created_at__gte=date_from)
+        user_id = SiteVisit.objects.exclude(user=None).values_list('user_id', flat=True).first()
+        visitor_id = SiteVisit.objects.exclude(anonymous_visitor=None).values_list(
+            'anonymous_visitor_id', flat=True
+        ).first()
+
+        queries = [
+            ('top pages', visits_qs.order_by().values('path').annotate(count=weighted_count()).order_by('-count')[:20]),
+            ('visits by country', visits_qs.order_by().values('country').annotate(count=weighted_count())),
+            ('visits by status code', visits_qs.order_by().values('status_code').annotate(count=weighted_count())),
+            ('unique ips', visits_qs.order_by().values('ip_address').distinct()),
+            (
+                'visits by day',
+                visits_qs.annotate(day=TruncDate('created_at')).values('day').annotate(count=weighted_count()),
+            ),
+            ('latest visits page', visits_qs.order_by('-created_at')[:25]),
+        ]
+        if user_id:
+            user_qs = SiteVisit.objects.filter(user_id=user_id, created_at__gte=date_from)
+            queries.append(('user visits by path', user_qs.values('path').annotate(count=Count('id'))))
+        if visitor_id:
+            visitor_qs = SiteVisit.objects.filter(anonymous_visitor_id=visitor_id, created_at__gte=date_from)
+            queries.append(('visitor visits by path', visitor_qs.values('path').annotate(count=weighted_count())))
+        return queries
+
+    def measure(self, queries, repeat):
+        timings = {}
+        for name, queryset in queries:
+            best = None
+            for _ in range(max(repeat, 1)):
+                start = time.perf_counter()
+                list(queryset.all())
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+        return timings
+
+    def drop_indexes(self):
+        removed = [index for index in SiteVisit._meta.indexes if index.name in QUERY_INDEXES]
+        with connection.schema_editor() as editor:
+            for index in removed:
+                editor.remove_index(SiteVisit, index)
+            if connection.vendor == 'postgresql':
+                editor.execute(f'DROP INDEX IF EXISTS {BRIN_INDEX}')
+        self.analyze()
+        return removed
+
+    def restore_indexes(self, removed):
+        with connection.schema_editor() as editor:
+            for index in removed:
+                editor.add_index(SiteVisit, index)
+            if connection.vendor == 'postgresql':
+                editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {BRIN_INDEX} ON {SiteVisit._meta.db_table} USING brin (created_at)'
+                )
+        self.analyze()
+
+    def analyze(self):
+        # به‌روزرسانی آمار planner پس از درج انبوه یا تغییر ایندکس‌ها
+        if connection.vendor in ('postgresql', 'sqlite'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def seed(self, total, days, batch_size):
+        rng = random.Random(42)
+        User = get_user_model()
+
+        User.objects.bulk_create(
+            [User(username=f'{BENCH_USER_PREFIX}{i}', password='!') for i in range(50)],
+            ignore_conflicts=True,
+        )
+        user_ids = list(User.objects.filter(username__startswith=BENCH_USER_PREFIX).values_list('id', flat=True))
+
+        visitor_count = min(max(total // 20, 1), 100000)
+        AnonymousVisitor.objects.bulk_create(
+            [AnonymousVisitor(session_key=f'{BENCH_VISITOR_PREFIX}{i}') for i in range(visitor_count)],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        visitor_ids = list(
+            AnonymousVisitor.objects.filter(session_key__startswith=BENCH_VISITOR_PREFIX).values_list('id', flat=True)
+        )
+
+        # توزیع نزدیک به واقعی: چند صفحه پربازدید و تعداد زیادی صفحه کم‌بازدید
+        paths = [f'{BENCH_PATH_PREFIX}page-{i}/' for i in range(500)]
+        path_weights = [1 / (i + 1) for i in range(len(paths))]
+        countries = ['DE', 'IR', 'AT', 'CH', 'US', 'TR', 'GB', 'NL', '']
+        devices = ['desktop', 'mobile', 'mobile', 'tablet']
+        status_codes = [200] * 20 + [301, 404, 500]
+
+        self.stdout.write(self.style.WARNING(f'Seeding {total} visits over {days} days...'))
+        now = timezone.now()
+        span = timedelta(days=days)
+        for offset in range(0, total, batch_size):
+            count = min(batch_size, total - offset)
+            batch_paths = rng.choices(paths, weights=path_weights, k=count)
+            rows = []
+            for i in range(count):
+                logged_in = rng.random() < 0.1
+                rows.append(SiteVisit(
+                    user_id=rng.choice(user_ids) if logged_in else None,
+                    anonymous_visitor_id=None if logged_in else rng.choice(visitor_ids),
+                    path=batch_paths[i],
+                    method='GET',
+                    status_code=rng.choice(status_codes),
+                    ip_address=f'10.{rng.randrange(64)}.{rng.randrange(256)}.{rng.randrange(256)}',
+                    country=rng.choice(countries),
+                    device_type=rng.choice(devices),
+                    # ترتیب درج مثل ترافیک واقعی با زمان همراه است (مهم برای BRIN)
+                    created_at=now - span + span * ((offset + i) / total),
+                ))
+            SiteVisit.objects.bulk_create(rows, batch_size=batch_size)
+            self.stdout.write(f'  ✓ {offset + count}/{total}')
+
+    def cleanup(self):
+        deleted, _ = SiteVisit.objects.filter(path__startswith=BENCH_PATH_PREFIX).delete()
+        AnonymousVisitor.objects.filter(session_key__startswith=BENCH_VISITOR_PREFIX).delete()
+        get_user_model().objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+        self.stdout.write(self.style.SUCCESS(f'✓ Removed {deleted} seeded rows'))
@@ -0,0 +1,115 @@
+"""
+بنچمارک تشخیص دستگاه از User Agent (روش قدیمی جستجوی کلیدواژه در برابر regex کامپایل‌شده)
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.useragents import _classify, parse_user_agent
+
+
+ROUNDS = 5
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'user_agents.txt')
+
+LEGACY_MOBILE_KEYWORDS = [
+    'mobile', 'android', 'iphone', 'ipod', 'blackberry',
+    'windows phone', 'opera mini', 'opera mobi', 'iemobile',
+    'mobile safari', 'webos', 'palm', 'symbian', 'nokia',
+    'fennec', 'maemo', 'mib', 'kindle', 'silk', 'miui',
+    'huawei', 'samsung', 'lg', 'sony', 'motorola', 'xiaomi',
+    'oneplus', 'oppo', 'vivo', 'realme', 'meizu', 'zte'
+]
+LEGACY_TABLET_KEYWORDS = [
+    'tablet', 'ipad', 'playbook', 'kindle fire', 'nexus 7',
+    'nexus 10', 'galaxy tab', 'surface', 'xoom', 'touchpad'
+]
+
+
+def legacy_detect_device_type(user_agent):
+    """پیاده‌سازی قبلی detect_device_type (فقط برای مقایسه)"""
+    if not user_agent:
+        return 'unknown'
+    user_agent_lower = user_agent.lower()
+    for keyword in LEGACY_TABLET_KEYWORDS:
+        if keyword in user_agent_lower:
+            return 'tablet'
+    for keyword in LEGACY_MOBILE_KEYWORDS:
+        if keyword in user_agent_lower:
+            return 'mobile'
+    return 'desktop'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark device detection over a corpus of real user agent strings: "
+        "legacy keyword scan vs compiled classifier (uncached and LRU-cached)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corpus',
+            type=str,
+            default=DEFAULT_CORPUS,
+            help='Text file with one user agent per line (default: core/data/user_agents.txt)'
+        )
+        parser.add_argument(
+            '--from-db',
+            action='store_true',
+            help='Use the distinct user agents stored in the UserAgent table instead of a file'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20000,
+            help='Number of classifications per method (default: 20000)'
+        )
+
+    def handle(self, *args, **options):
+        if options['from_db']:
+            from core.models import UserAgent
+            corpus = list(UserAgent.objects.values_list('value', flat=True))
+        else:
+            if not os.path.exists(options['corpus']):
+                raise CommandError(f"File not found: {options['corpus']}")
+            with open(options['corpus'], encoding='utf-8') as f:
+                corpus = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        if not corpus:
+            raise CommandError('Corpus is empty')
+
+        iterations = options['iterations']
+        workload = [corpus[i % len(corpus)] for i in range(iterations)]
+        self.stdout.write(self.style.WARNING(
+            f'Classifying {iterations} user agents ({len(corpus)} distinct)...'
+        ))
+
+        def measure(func):
+            # بهترین نتیجه از چند دور تا نویز زمان‌بندی سیستم روی مقایسه اثر نگذارد
+            best = None
+            for _ in range(ROUNDS):
+                start = time.perf_counter()
+                for user_agent in workload:
+                    func(user_agent)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            return best / iterations * 1_000_000
+
+        parse_user_agent.cache_clear()
+        results = [
+            ('legacy keyword scan', measure(legacy_detect_device_type)),
+            ('compiled regex (uncached)', measure(_classify)),
+            ('compiled regex + LRU', measure(parse_user_agent)),
+        ]
+        for name, micros in results:
+            self.stdout.write(f'  ✓ {name}: {micros:.2f} µs/UA')
+
+        changed = [
+            (user_agent, legacy_detect_device_type(user_agent), parse_user_agent(user_agent).device_type)
+            for user_agent in corpus
+            if legacy_detect_device_type(user_agent) != parse_user_agent(user_agent).device_type
+        ]
+        self.stdout.write(f'  {len(changed)} of {len(corpus)} user agents classified differently:')
+        for user_agent, old, new in changed:
+            self.stdout.write(f'    {old} -> {new}: {user_agent[:100]}')
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark completed'))
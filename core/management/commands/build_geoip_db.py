@@ -0,0 +1,68 @@
+"""
+ساخت فایل پایگاه داده محلی GeoIP از یک فایل CSV بازه‌های IP
+"""
+import csv
+import gzip
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.geoip import IPRangeDatabase, build_database, reset_resolver
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the local GeoIP range database from a CSV file with rows of "
+        "start_ip,end_ip,country_code (e.g. DB-IP / IP2Location LITE country CSV)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input_file',
+            type=str,
+            help='Input CSV file path (may be gzip-compressed)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Output database path (default: settings.GEOIP_DATABASE_PATH)'
+        )
+        parser.add_argument(
+            '--columns',
+            type=int,
+            nargs=3,
+            default=[0, 1, 2],
+            metavar=('START', 'END', 'COUNTRY'),
+            help='Zero-based column indexes of start ip, end ip and country code (default: 0 1 2)'
+        )
+
+    def handle(self, *args, **options):
+        input_file = options['input_file']
+        output_file = options['output'] or settings.GEOIP_DATABASE_PATH
+        start_col, end_col, country_col = options['columns']
+
+        if not os.path.exists(input_file):
+            raise CommandError(f'File not found: {input_file}')
+
+        self.stdout.write(self.style.WARNING(f'Reading {input_file}...'))
+
+        opener = gzip.open if input_file.endswith('.gz') else open
+        last_col = max(start_col, end_col, country_col)
+
+        def rows():
+            with opener(input_file, 'rt', encoding='utf-8', newline='') as f:
+                for row in csv.reader(f):
+                    if len(row) <= last_col:
+                        continue
+                    yield row[start_col], row[end_col], row[country_col]
+
+        count = build_database(rows(), output_file)
+        reset_resolver()
+
+        # اعتبارسنجی فایل ساخته‌شده
+        db = IPRangeDatabase(output_file)
+        db.close()
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {count} IPv4 ranges to {output_file}'))
@@ -0,0 +1,64 @@
+"""
+پر کردن کشور ردیف‌های آمار (بازدیدها، کلیک‌های یوتیوب و بازدیدکنندگان ناشناس)
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.geoip import (
+    HTTPResolver,
+    LocalDatabaseResolver,
+    caching_resolver,
+    enrich_countries,
+    get_resolver,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the country of analytics rows in batches. Each distinct IP is "
+        "resolved once and applied with one UPDATE per country."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of distinct IPs processed per batch (default: 500)'
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['default', 'local', 'http'],
+            default='default',
+            help='Resolver to use: settings.GEOIP_BACKEND (default), local database or HTTP APIs'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-resolve every row, not only rows with an empty country (e.g. after a provider change); failed or empty lookups never clear a known country'
+        )
+
+    def handle(self, *args, **options):
+        backend = options['backend']
+        if backend == 'http':
+            resolver = caching_resolver(HTTPResolver())
+        elif backend == 'local':
+            resolver = LocalDatabaseResolver(settings.GEOIP_DATABASE_PATH)
+        else:
+            resolver = get_resolver()
+
+        self.stdout.write(self.style.WARNING('Enriching countries...'))
+
+        stats = enrich_countries(
+            resolve=resolver.resolve,
+            batch_size=options['batch_size'],
+            only_missing=not options['all'],
+        )
+
+        self.stdout.write(f"  ✓ Resolved {stats.pop('resolved_ips')} distinct IPs")
+        rebuilt_days = stats.pop('rebuilt_days')
+        for key, count in stats.items():
+            self.stdout.write(f'  ✓ {key}: {count} rows updated')
+        for day in rebuilt_days:
+            self.stdout.write(f'  ✓ Rebuilt rollups for {day:%Y-%m-%d}')
+        self.stdout.write(self.style.SUCCESS('✓ Country enrichment completed'))
@@ -103,6 +103,8 @@ class Command(BaseCommand):
                 'models': [],
                 'conditional_models': {
                     'ContactMessage': True,
+                    'UserAgent': include_stats,
+                    'Referrer': include_stats,
                     'AnonymousVisitor': include_stats,
                     'SiteVisit': include_stats,
                     'YouTubeClick': include_stats,
@@ -74,7 +74,7 @@ class Command(BaseCommand):
             'assessments': ['Assessment', 'Question', 'Choice', 'AnswerPattern', 'OrderingItem', 'MatchPair', 'QuestionMedia', 'Submission', 'SubmissionItem'],
             'shop': ['Product', 'Order', 'OrderItem'],
             'accounts': ['Profile'],
-            'core': ['ContactMessage', 'AnonymousVisitor', 'SiteVisit', 'YouTubeClick'],
+            'core': ['ContactMessage', 'UserAgent', 'Referrer', 'AnonymousVisitor', 'SiteVisit', 'YouTubeClick'],
         }
 
         try:
@@ -246,7 +246,11 @@ class Command(BaseCommand):
             
             # Create object
             try:
-                obj = model.objects.create(**fields)
+                if 'value_hash' in fields:
+                    # UserAgent / Referrer: رشته‌های موجود دوباره ساخته نمی‌شوند
+                    obj, _ = model.objects.get_or_create(value_hash=fields['value_hash'], defaults=fields)
+                else:
+                    obj = model.objects.create(**fields)
                 new_id_map[export_id] = obj.id
                 
                 # Handle ManyToMany
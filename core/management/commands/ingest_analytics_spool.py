@@ -0,0 +1,78 @@
+"""
+انتقال segment های بسته‌شده spool آمار به پایگاه داده (مناسب برای cron یا اجرای دائمی با --follow)
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from core.analytics import write_visits
+from core.spool import closed_segments, ingest_segment
+
+
+class Command(BaseCommand):
+    help = (
+        "Load closed analytics spool segments (ANALYTICS_SPOOL_DIR) into SiteVisit / "
+        "YouTubeClick with bulk_create. Segments are claimed by renaming and resume "
+        "from their last committed batch after a database error; records that cannot "
+        "be written are moved to a .rejected file next to the segment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spool-dir',
+            type=str,
+            help='Spool directory (default: ANALYTICS_SPOOL_DIR)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Records per bulk_create (default: 1000)'
+        )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Keep running and ingest new segments as they close'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=10,
+            help='Seconds between scans with --follow (default: 10)'
+        )
+
+    def handle(self, *args, **options):
+        spool_dir = options.get('spool_dir') or getattr(settings, 'ANALYTICS_SPOOL_DIR', '')
+        if not spool_dir:
+            raise CommandError('No spool directory: set ANALYTICS_SPOOL_DIR or pass --spool-dir')
+
+        while True:
+            self.ingest(spool_dir, options['batch_size'])
+            if not options['follow']:
+                break
+            time.sleep(max(options['interval'], 1))
+
+    def ingest(self, spool_dir, batch_size):
+        segments = closed_segments(spool_dir)
+        if not segments:
+            self.stdout.write(self.style.SUCCESS('✓ No closed segments to ingest'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'Ingesting {len(segments)} segment(s)...'))
+        total = 0
+        for path in segments:
+            try:
+                written, invalid = ingest_segment(path, write_visits, batch_size=batch_size)
+            except DatabaseError as e:
+                # segment در حالت .ingesting می‌ماند و اجرای بعدی از آخرین دسته ادامه می‌دهد
+                self.stderr.write(self.style.ERROR(f'  ✗ {path.name}: {e}'))
+                return
+            total += written
+            message = f'  ✓ {path.name}: {written} records'
+            if invalid:
+                message += f' ({invalid} invalid or rejected lines skipped)'
+            self.stdout.write(message)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Ingested {total} records'))
@@ -0,0 +1,52 @@
+"""
+به‌روزرسانی جداول rollup روزانه آمار (مناسب برای اجرا در cron)
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.rollups import pending_days, rollup_day
+
+
+class Command(BaseCommand):
+    help = (
+        "Build daily analytics rollups for completed days. By default only days "
+        "not yet rolled up (plus the last rolled-up day) are processed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Rebuild a single day (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Rebuild the last N completed days'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+
+        if options.get('date'):
+            try:
+                days = [date.fromisoformat(options['date'])]
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        elif options.get('days'):
+            days = [today - timedelta(days=offset) for offset in range(options['days'], 0, -1)]
+        else:
+            days = pending_days(today)
+
+        if not days:
+            self.stdout.write(self.style.SUCCESS('✓ Rollups are up to date'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'Rolling up {len(days)} day(s)...'))
+        for day in days:
+            visit_rows, click_rows = rollup_day(day)
+            self.stdout.write(f'  ✓ {day:%Y-%m-%d}: {visit_rows} visit rows, {click_rows} click rows')
+
+        self.stdout.write(self.style.SUCCESS('✓ Rollup completed'))
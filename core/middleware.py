@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.utils import timezone
 
-from .models import SiteVisit, AnonymousVisitor
-from .utils import get_country_from_ip, detect_device_type
+from .analytics import record_visit
+from .bots import classify_bot
+from .sampling import sample_weight
+from .visitors import get_visitor_id, set_visitor_cookie
 
 
 class SiteAnalyticsMiddleware:
@@ -44,54 +47,41 @@ class SiteAnalyticsMiddleware:
             return
 
         ip_address = self._get_client_ip(request)
-        user_agent = request.META.get("HTTP_USER_AGENT", "")[:500]
-        referrer = request.META.get("HTTP_REFERER", "")[:500]
-        
-        # تشخیص کشور بر اساس IP
-        country = get_country_from_ip(ip_address) if ip_address else ""
-        
-        # تشخیص نوع دستگاه
-        device_type = detect_device_type(user_agent) if user_agent else ""
-
-        # مدیریت بازدیدکنندگان ناشناس
-        anonymous_visitor = None
         user = request.user if getattr(request, "user", None) and request.user.is_authenticated else None
-        
+
+        # ربات‌ها فقط در شمارنده روزانه شمرده می‌شوند (بدون کوکی بازدیدکننده و ردیف SiteVisit)
+        if not user and getattr(settings, "ANALYTICS_FILTER_BOTS", True):
+            bot = classify_bot(request.META.get("HTTP_USER_AGENT", ""), ip_address)
+            if bot:
+                record_visit({"bot": bot, "created_at": timezone.now()})
+                return
+
+        # نمونه‌برداری از بازدیدهای ناشناس (کاربران لاگین‌شده همیشه کامل ثبت می‌شوند)
+        weight = 1
+        if not user:
+            weight = sample_weight(path)
+            if not weight:
+                return
+
+        # تشخیص کشور، دستگاه و ثبت بازدیدکننده ناشناس در core.analytics و خارج از مسیر درخواست انجام می‌شود
+        session_key = None
         if not user:
-            # اگر کاربر لاگ این نکرده، از session_key برای شناسایی استفاده کن
-            # اطمینان از وجود session
-            if not request.session.session_key:
-                request.session.create()
-            session_key = request.session.session_key
-            if session_key:
-                anonymous_visitor, created = AnonymousVisitor.objects.get_or_create(
-                    session_key=session_key,
-                    defaults={
-                        "first_ip": ip_address or "",
-                        "first_country": country,
-                        "first_user_agent": user_agent,
-                    }
-                )
-                # به‌روزرسانی اطلاعات آخرین بازدید
-                if not created:
-                    anonymous_visitor.last_ip = ip_address or ""
-                    anonymous_visitor.last_country = country
-                    anonymous_visitor.last_user_agent = user_agent
-                    anonymous_visitor.save(update_fields=["last_ip", "last_country", "last_user_agent", "last_seen"])
-
-        SiteVisit.objects.create(
-            user=user,
-            anonymous_visitor=anonymous_visitor,
-            path=path,
-            method=request.method,
-            status_code=getattr(response, "status_code", 200),
-            ip_address=ip_address or "",
-            country=country,
-            device_type=device_type,
-            user_agent=user_agent,
-            referrer=referrer,
-            created_at=timezone.now(),
-        )
+            # اگر کاربر لاگ این نکرده، از کوکی امضاشده شناسه بازدیدکننده استفاده کن (بدون ساختن session)
+            session_key = get_visitor_id(request)
+            set_visitor_cookie(request, response)
+
+        record_visit({
+            "user_id": user.pk if user else None,
+            "session_key": session_key,
+            "path": path,
+            "method": request.method,
+            "status_code": getattr(response, "status_code", 200),
+            "ip_address": ip_address or "",
+            "user_agent": request.META.get("HTTP_USER_AGENT", "")[:500],
+            "referrer": request.META.get("HTTP_REFERER", "")[:500],
+            "created_at": timezone.now(),
+            "sample_weight": weight,
+        })
 
     def _get_client_ip(self, request):
         x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
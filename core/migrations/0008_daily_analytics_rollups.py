@@ -0,0 +1,209 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_sitevisit_created_at_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyAnalyticsSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True, verbose_name="روز")),
+                (
+                    "visits",
+                    models.PositiveIntegerField(default=0, verbose_name="تعداد بازدید"),
+                ),
+                (
+                    "logged_in_visits",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="بازدید کاربران لاگین\u200cشده"
+                    ),
+                ),
+                (
+                    "unique_ips",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="آی\u200cپی\u200cهای یکتا"
+                    ),
+                ),
+                (
+                    "youtube_clicks",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="کلیک\u200cهای یوتیوب"
+                    ),
+                ),
+                (
+                    "logged_in_youtube_clicks",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="کلیک\u200cهای کاربران لاگین\u200cشده"
+                    ),
+                ),
+                (
+                    "unique_clickers",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="کلیک\u200cکنندگان یکتا"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="آخرین به\u200cروزرسانی"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "خلاصه روزانه آمار",
+                "verbose_name_plural": "خلاصه\u200cهای روزانه آمار",
+                "ordering": ["-day"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyReferrerRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="روز")),
+                (
+                    "referrer",
+                    models.CharField(
+                        max_length=500, verbose_name="صفحه ارجاع\u200cدهنده"
+                    ),
+                ),
+                (
+                    "visits",
+                    models.PositiveIntegerField(default=0, verbose_name="تعداد بازدید"),
+                ),
+            ],
+            options={
+                "verbose_name": "آمار روزانه ارجاع\u200cدهنده",
+                "verbose_name_plural": "آمار روزانه ارجاع\u200cدهنده\u200cها",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "referrer"),
+                        name="core_dailyreferrerrollup_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyVisitRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="روز")),
+                ("path", models.CharField(max_length=512, verbose_name="آدرس صفحه")),
+                (
+                    "country",
+                    models.CharField(blank=True, max_length=2, verbose_name="کشور"),
+                ),
+                (
+                    "device_type",
+                    models.CharField(
+                        blank=True, max_length=20, verbose_name="نوع دستگاه"
+                    ),
+                ),
+                (
+                    "status_code",
+                    models.PositiveIntegerField(default=200, verbose_name="کد وضعیت"),
+                ),
+                (
+                    "visits",
+                    models.PositiveIntegerField(default=0, verbose_name="تعداد بازدید"),
+                ),
+                (
+                    "logged_in_visits",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="بازدید کاربران لاگین\u200cشده"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "آمار روزانه بازدید",
+                "verbose_name_plural": "آمار روزانه بازدیدها",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "path", "country", "device_type", "status_code"),
+                        name="core_dailyvisitrollup_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyYouTubeClickRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="روز")),
+                (
+                    "youtube_id",
+                    models.CharField(
+                        blank=True, max_length=20, verbose_name="شناسه ویدیو یوتیوب"
+                    ),
+                ),
+                (
+                    "source_type",
+                    models.CharField(max_length=10, verbose_name="نوع منبع"),
+                ),
+                (
+                    "source_title",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="عنوان منبع"
+                    ),
+                ),
+                (
+                    "clicks",
+                    models.PositiveIntegerField(default=0, verbose_name="تعداد کلیک"),
+                ),
+                (
+                    "logged_in_clicks",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="کلیک کاربران لاگین\u200cشده"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "آمار روزانه کلیک یوتیوب",
+                "verbose_name_plural": "آمار روزانه کلیک\u200cهای یوتیوب",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "youtube_id", "source_type", "source_title"),
+                        name="core_dailyyoutubeclickrollup_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,184 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# (model, old text field, new foreign key, lookup model)
+INTERNED_FIELDS = [
+    ("AnonymousVisitor", "first_user_agent_text", "first_user_agent", "UserAgent"),
+    ("AnonymousVisitor", "last_user_agent_text", "last_user_agent", "UserAgent"),
+    ("SiteVisit", "user_agent_text", "user_agent", "UserAgent"),
+    ("SiteVisit", "referrer_text", "referrer", "Referrer"),
+    ("YouTubeClick", "user_agent_text", "user_agent", "UserAgent"),
+    ("YouTubeClick", "referrer_text", "referrer", "Referrer"),
+    ("DailyReferrerRollup", "referrer_text", "referrer", "Referrer"),
+]
+
+
+def intern_existing_strings(apps, schema_editor):
+    for model_name, text_field, fk_field, lookup_name in INTERNED_FIELDS:
+        model = apps.get_model("core", model_name)
+        lookup = apps.get_model("core", lookup_name)
+        values = list(
+            model.objects.exclude(**{text_field: ""})
+            .order_by()
+            .values_list(text_field, flat=True)
+            .distinct()
+        )
+        for start in range(0, len(values), 500):
+            chunk = values[start : start + 500]
+            keys = {value: value[:500] for value in chunk}
+            hashes = {
+                hashlib.sha1(key.encode("utf-8")).hexdigest(): key
+                for key in keys.values()
+            }
+            lookup.objects.bulk_create(
+                [lookup(value_hash=h, value=key) for h, key in hashes.items()],
+                ignore_conflicts=True,
+            )
+            ids = {
+                hashes[h]: pk
+                for h, pk in lookup.objects.filter(value_hash__in=hashes).values_list(
+                    "value_hash", "id"
+                )
+            }
+            for value, key in keys.items():
+                model.objects.filter(**{text_field: value}).update(
+                    **{f"{fk_field}_id": ids[key]}
+                )
+
+
+def lookup_fk(verbose_name, to, null=True):
+    return models.ForeignKey(
+        blank=null,
+        null=null,
+        on_delete=django.db.models.deletion.PROTECT,
+        related_name="+",
+        to=f"core.{to}",
+        verbose_name=verbose_name,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_daily_analytics_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Referrer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "value_hash",
+                    models.CharField(editable=False, max_length=40, unique=True),
+                ),
+                ("value", models.TextField()),
+            ],
+            options={
+                "verbose_name": "صفحه ارجاع‌دهنده",
+                "verbose_name_plural": "صفحات ارجاع‌دهنده",
+            },
+        ),
+        migrations.CreateModel(
+            name="UserAgent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "value_hash",
+                    models.CharField(editable=False, max_length=40, unique=True),
+                ),
+                ("value", models.TextField()),
+            ],
+            options={
+                "verbose_name": "مرورگر / دستگاه",
+                "verbose_name_plural": "مرورگرها / دستگاه‌ها",
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name="dailyreferrerrollup",
+            name="core_dailyreferrerrollup_unique",
+        ),
+        *[
+            migrations.RenameField(
+                model_name=model_name.lower(),
+                old_name=fk_field,
+                new_name=text_field,
+            )
+            for model_name, text_field, fk_field, _ in INTERNED_FIELDS
+        ],
+        migrations.AddField(
+            model_name="anonymousvisitor",
+            name="first_user_agent",
+            field=lookup_fk("اولین مرورگر / دستگاه", "UserAgent"),
+        ),
+        migrations.AddField(
+            model_name="anonymousvisitor",
+            name="last_user_agent",
+            field=lookup_fk("آخرین مرورگر / دستگاه", "UserAgent"),
+        ),
+        migrations.AddField(
+            model_name="sitevisit",
+            name="user_agent",
+            field=lookup_fk("مرورگر / دستگاه", "UserAgent"),
+        ),
+        migrations.AddField(
+            model_name="sitevisit",
+            name="referrer",
+            field=lookup_fk("صفحه ارجاع‌دهنده", "Referrer"),
+        ),
+        migrations.AddField(
+            model_name="youtubeclick",
+            name="user_agent",
+            field=lookup_fk("مرورگر / دستگاه", "UserAgent"),
+        ),
+        migrations.AddField(
+            model_name="youtubeclick",
+            name="referrer",
+            field=lookup_fk("صفحه ارجاع‌دهنده", "Referrer"),
+        ),
+        migrations.AddField(
+            model_name="dailyreferrerrollup",
+            name="referrer",
+            field=lookup_fk("صفحه ارجاع‌دهنده", "Referrer"),
+        ),
+        migrations.RunPython(intern_existing_strings, migrations.RunPython.noop),
+        *[
+            migrations.RemoveField(
+                model_name=model_name.lower(),
+                name=text_field,
+            )
+            for model_name, text_field, _, _ in INTERNED_FIELDS
+        ],
+        migrations.AlterField(
+            model_name="dailyreferrerrollup",
+            name="referrer",
+            field=lookup_fk("صفحه ارجاع‌دهنده", "Referrer", null=False),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyreferrerrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "referrer"), name="core_dailyreferrerrollup_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_interned_user_agents_and_referrers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyBotCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="روز")),
+                ("bot", models.CharField(max_length=50, verbose_name="ربات")),
+                (
+                    "hits",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="تعداد درخواست"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "آمار روزانه ربات",
+                "verbose_name_plural": "آمار روزانه ربات\u200cها",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "bot"), name="core_dailybotcounter_unique"
+                    )
+                ],
+            },
+        ),
+    ]
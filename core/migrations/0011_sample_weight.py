@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_daily_bot_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sitevisit",
+            name="sample_weight",
+            field=models.PositiveIntegerField(
+                default=1, editable=False, verbose_name="وزن نمونه"
+            ),
+        ),
+        migrations.AddField(
+            model_name="youtubeclick",
+            name="sample_weight",
+            field=models.PositiveIntegerField(
+                default=1, editable=False, verbose_name="وزن نمونه"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_sample_weight"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="youtubeclick",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                editable=False,
+                verbose_name="زمان کلیک",
+            ),
+        ),
+    ]
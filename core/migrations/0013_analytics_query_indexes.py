@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BRIN_INDEXES = {
+    "core_sitevisit": "core_sitevisit_created_brin",
+    "core_youtubeclick": "core_youtubeclick_created_brin",
+}
+
+
+def create_brin_indexes(apps, schema_editor):
+    # ایندکس BRIN برای جداول فقط-افزودنی بزرگ (فقط PostgreSQL)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table, name in BRIN_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING brin (created_at)"
+        )
+
+
+def drop_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in BRIN_INDEXES.values():
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_youtubeclick_created_at_default"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="sitevisit",
+            name="core_sitevi_anonymo_ab6d31_idx",
+        ),
+        migrations.AlterField(
+            model_name="sitevisit",
+            name="anonymous_visitor",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="site_visits",
+                to="core.anonymousvisitor",
+                verbose_name="بازدیدکننده ناشناس",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sitevisit",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="site_visits",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="کاربر",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="youtubeclick",
+            name="anonymous_visitor",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="youtube_clicks",
+                to="core.anonymousvisitor",
+                verbose_name="بازدیدکننده ناشناس",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="youtubeclick",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="youtube_clicks",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="کاربر",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sitevisit",
+            index=models.Index(
+                fields=["created_at", "path"], name="core_sitevisit_created_path"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sitevisit",
+            index=models.Index(
+                fields=["user", "created_at"], name="core_sitevisit_user_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sitevisit",
+            index=models.Index(
+                fields=["anonymous_visitor", "created_at"],
+                name="core_sitevisit_anon_created",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="youtubeclick",
+            index=models.Index(
+                fields=["user", "created_at"], name="core_youtubeclick_user_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="youtubeclick",
+            index=models.Index(
+                fields=["anonymous_visitor", "created_at"],
+                name="core_youtubeclick_anon_created",
+            ),
+        ),
+        migrations.RunPython(create_brin_indexes, drop_brin_indexes),
+    ]
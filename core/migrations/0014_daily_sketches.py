@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_analytics_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="روز")),
+                (
+                    "metric",
+                    models.CharField(
+                        choices=[
+                            ("visit_ips", "آی\u200cپی\u200cهای یکتای بازدید"),
+                            ("visitors", "بازدیدکنندگان یکتا"),
+                            ("click_ips", "آی\u200cپی\u200cهای یکتای کلیک"),
+                        ],
+                        max_length=20,
+                        verbose_name="شاخص",
+                    ),
+                ),
+                ("sketch", models.BinaryField(verbose_name="sketch")),
+            ],
+            options={
+                "verbose_name": "sketch روزانه یکتا",
+                "verbose_name_plural": "sketch های روزانه یکتا",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "metric"), name="core_dailysketch_unique"
+                    )
+                ],
+            },
+        ),
+    ]
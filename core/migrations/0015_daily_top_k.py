@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_daily_sketches"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyTopK",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="روز")),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("path", "صفحه"),
+                            ("country", "کشور"),
+                            ("referrer", "ارجاع\u200cدهنده"),
+                            ("youtube_video", "ویدیو یوتیوب"),
+                        ],
+                        max_length=20,
+                        verbose_name="بُعد",
+                    ),
+                ),
+                ("summary", models.JSONField(default=dict, verbose_name="خلاصه")),
+            ],
+            options={
+                "verbose_name": "خلاصه روزانه پرتکرارها",
+                "verbose_name_plural": "خلاصه\u200cهای روزانه پرتکرارها",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "dimension"), name="core_dailytopk_unique"
+                    )
+                ],
+            },
+        ),
+    ]
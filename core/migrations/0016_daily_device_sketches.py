@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_daily_top_k"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dailysketch",
+            name="metric",
+            field=models.CharField(
+                choices=[
+                    ("visit_ips", "آی\u200cپی\u200cهای یکتای بازدید"),
+                    ("visitors", "بازدیدکنندگان یکتا"),
+                    ("click_ips", "آی\u200cپی\u200cهای یکتای کلیک"),
+                    ("mobile_ips", "آی\u200cپی\u200cهای یکتای موبایل"),
+                    ("tablet_ips", "آی\u200cپی\u200cهای یکتای تبلت"),
+                    ("desktop_ips", "آی\u200cپی\u200cهای یکتای دسکتاپ"),
+                    ("unknown_device_ips", "آی\u200cپی\u200cهای یکتای دستگاه نامشخص"),
+                    ("mobile_anonymous", "بازدیدکنندگان ناشناس موبایل"),
+                    ("tablet_anonymous", "بازدیدکنندگان ناشناس تبلت"),
+                    ("desktop_anonymous", "بازدیدکنندگان ناشناس دسکتاپ"),
+                    ("mobile_users", "کاربران موبایل"),
+                    ("tablet_users", "کاربران تبلت"),
+                    ("desktop_users", "کاربران دسکتاپ"),
+                ],
+                max_length=20,
+                verbose_name="شاخص",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_daily_device_sketches"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dailytopk",
+            name="dimension",
+            field=models.CharField(
+                choices=[
+                    ("path", "صفحه"),
+                    ("country", "کشور"),
+                    ("referrer", "ارجاع\u200cدهنده"),
+                    ("youtube_video", "ویدیو یوتیوب"),
+                    ("youtube_user", "کاربر کلیک\u200cکننده یوتیوب"),
+                    ("youtube_referrer", "ارجاع\u200cدهنده کلیک یوتیوب"),
+                ],
+                max_length=20,
+                verbose_name="بُعد",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DailyKeySketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="روز")),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("path", "صفحه"),
+                            ("country", "کشور"),
+                            ("referrer", "ارجاع\u200cدهنده"),
+                            ("youtube_video", "ویدیو یوتیوب"),
+                            ("youtube_user", "کاربر کلیک\u200cکننده یوتیوب"),
+                            ("youtube_referrer", "ارجاع\u200cدهنده کلیک یوتیوب"),
+                        ],
+                        max_length=20,
+                        verbose_name="بُعد",
+                    ),
+                ),
+                ("key", models.TextField(verbose_name="مقدار")),
+                ("sketch", models.BinaryField(verbose_name="sketch")),
+            ],
+            options={
+                "verbose_name": "sketch روزانه یکتای مقدار",
+                "verbose_name_plural": "sketch های روزانه یکتای مقادیر",
+                "indexes": [
+                    models.Index(
+                        fields=["dimension", "day"], name="core_dailykeysketch_dim_day"
+                    )
+                ],
+            },
+        ),
+    ]
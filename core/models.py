@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 
@@ -21,6 +22,35 @@ class ContactMessage(models.Model):
         return f"{self.name} - {self.email}"
 
 
+class InternedString(models.Model):
+    """
+    جدول جستجوی رشته‌های تکراری (مرورگر / ارجاع‌دهنده)
+
+    هر رشته یک بار ذخیره می‌شود و ردیف‌های آمار فقط شناسه عددی آن را نگه می‌دارند.
+    یکتایی روی هش رشته است تا ایندکس کوچک بماند.
+    """
+    value_hash = models.CharField(max_length=40, unique=True, editable=False)
+    value = models.TextField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self) -> str:
+        return self.value[:80]
+
+
+class UserAgent(InternedString):
+    class Meta:
+        verbose_name = _("مرورگر / دستگاه")
+        verbose_name_plural = _("مرورگرها / دستگاه‌ها")
+
+
+class Referrer(InternedString):
+    class Meta:
+        verbose_name = _("صفحه ارجاع‌دهنده")
+        verbose_name_plural = _("صفحات ارجاع‌دهنده")
+
+
 class AnonymousVisitor(models.Model):
     """
     بازدیدکنندگان ناشناس (کاربرانی که لاگ این نکرده‌اند)
@@ -38,8 +68,22 @@ class AnonymousVisitor(models.Model):
     last_ip = models.CharField(max_length=45, blank=True, verbose_name=_("آخرین آی‌پی"))
     first_country = models.CharField(max_length=2, blank=True, verbose_name=_("اولین کشور"))
     last_country = models.CharField(max_length=2, blank=True, verbose_name=_("آخرین کشور"))
-    first_user_agent = models.TextField(blank=True, verbose_name=_("اولین مرورگر / دستگاه"))
-    last_user_agent = models.TextField(blank=True, verbose_name=_("آخرین مرورگر / دستگاه"))
+    first_user_agent = models.ForeignKey(
+        "UserAgent",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("اولین مرورگر / دستگاه"),
+    )
+    last_user_agent = models.ForeignKey(
+        "UserAgent",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("آخرین مرورگر / دستگاه"),
+    )
     
     class Meta:
         verbose_name = _("بازدیدکننده ناشناس")
@@ -55,13 +99,13 @@ class AnonymousVisitor(models.Model):
     
     @property
     def total_visits(self):
-        """تعداد کل بازدیدهای این بازدیدکننده ناشناس"""
-        return self.site_visits.count()
+        """تعداد کل بازدیدهای این بازدیدکننده ناشناس (با احتساب وزن نمونه‌برداری)"""
+        return self.site_visits.aggregate(total=models.Sum("sample_weight"))["total"] or 0
     
     @property
     def total_youtube_clicks(self):
-        """تعداد کل کلیک‌های یوتیوب این بازدیدکننده ناشناس"""
-        return self.youtube_clicks.count()
+        """تعداد کل کلیک‌های یوتیوب این بازدیدکننده ناشناس (با احتساب وزن نمونه‌برداری)"""
+        return self.youtube_clicks.aggregate(total=models.Sum("sample_weight"))["total"] or 0
 
 
 class SiteVisit(models.Model):
@@ -74,6 +118,8 @@ class SiteVisit(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
+        # ایندکس ترکیبی (..., created_at) در Meta جایگزین ایندکس تک‌ستونی کلید خارجی است
+        db_index=False,
         related_name="site_visits",
         verbose_name=_("کاربر"),
     )
@@ -82,6 +128,8 @@ class SiteVisit(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
+        # ایندکس ترکیبی (..., created_at) در Meta جایگزین ایندکس تک‌ستونی کلید خارجی است
+        db_index=False,
         related_name="site_visits",
         verbose_name=_("بازدیدکننده ناشناس"),
     )
@@ -91,18 +139,39 @@ class SiteVisit(models.Model):
     ip_address = models.CharField(max_length=45, blank=True, verbose_name=_("آی‌پی"))
     country = models.CharField(max_length=2, blank=True, verbose_name=_("کشور"))
     device_type = models.CharField(max_length=20, blank=True, verbose_name=_("نوع دستگاه"))
-    user_agent = models.TextField(blank=True, verbose_name=_("مرورگر / دستگاه"))
-    referrer = models.TextField(blank=True, verbose_name=_("صفحه ارجاع‌دهنده"))
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("زمان بازدید"))
+    user_agent = models.ForeignKey(
+        "UserAgent",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("مرورگر / دستگاه"),
+    )
+    referrer = models.ForeignKey(
+        "Referrer",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("صفحه ارجاع‌دهنده"),
+    )
+    # با نمونه‌برداری، هر ردیف نماینده sample_weight بازدید / کلیک است
+    sample_weight = models.PositiveIntegerField(default=1, editable=False, verbose_name=_("وزن نمونه"))
+    # زمان درخواست (نه زمان نوشتن دسته‌ای) ذخیره می‌شود؛ به همین دلیل auto_now_add نیست
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name=_("زمان بازدید"))
 
     class Meta:
         verbose_name = _("بازدید صفحه")
         verbose_name_plural = _("بازدیدهای سایت")
         ordering = ["-created_at"]
+        # بر اساس الگوی پرس‌وجوهای داشبورد آمار (بازه زمانی و سپس گروه‌بندی، یا فیلتر کاربر / بازدیدکننده و سپس بازه)
+        # در PostgreSQL یک ایندکس BRIN روی created_at هم در مهاجرت 0013 ساخته می‌شود
         indexes = [
             models.Index(fields=["created_at"]),
+            models.Index(fields=["created_at", "path"], name="core_sitevisit_created_path"),
             models.Index(fields=["path"]),
-            models.Index(fields=["anonymous_visitor"]),
+            models.Index(fields=["user", "created_at"], name="core_sitevisit_user_created"),
+            models.Index(fields=["anonymous_visitor", "created_at"], name="core_sitevisit_anon_created"),
             models.Index(fields=["country"]),
         ]
 
@@ -125,6 +194,8 @@ class YouTubeClick(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
+        # ایندکس ترکیبی (..., created_at) در Meta جایگزین ایندکس تک‌ستونی کلید خارجی است
+        db_index=False,
         related_name="youtube_clicks",
         verbose_name=_("کاربر"),
     )
@@ -133,6 +204,8 @@ class YouTubeClick(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
+        # ایندکس ترکیبی (..., created_at) در Meta جایگزین ایندکس تک‌ستونی کلید خارجی است
+        db_index=False,
         related_name="youtube_clicks",
         verbose_name=_("بازدیدکننده ناشناس"),
     )
@@ -148,9 +221,25 @@ class YouTubeClick(models.Model):
     source_title = models.CharField(max_length=255, blank=True, verbose_name=_("عنوان منبع"))
     ip_address = models.CharField(max_length=45, blank=True, verbose_name=_("آی‌پی"))
     country = models.CharField(max_length=2, blank=True, verbose_name=_("کشور"))
-    user_agent = models.TextField(blank=True, verbose_name=_("مرورگر / دستگاه"))
-    referrer = models.TextField(blank=True, verbose_name=_("صفحه ارجاع‌دهنده"))
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("زمان کلیک"))
+    user_agent = models.ForeignKey(
+        "UserAgent",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("مرورگر / دستگاه"),
+    )
+    referrer = models.ForeignKey(
+        "Referrer",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("صفحه ارجاع‌دهنده"),
+    )
+    # با نمونه‌برداری، هر ردیف نماینده sample_weight بازدید / کلیک است
+    sample_weight = models.PositiveIntegerField(default=1, editable=False, verbose_name=_("وزن نمونه"))
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name=_("زمان کلیک"))
     
     class Meta:
         verbose_name = _("کلیک یوتیوب")
@@ -160,9 +249,214 @@ class YouTubeClick(models.Model):
             models.Index(fields=["created_at"]),
             models.Index(fields=["youtube_id"]),
             models.Index(fields=["source_type", "source_id"]),
+            models.Index(fields=["user", "created_at"], name="core_youtubeclick_user_created"),
+            models.Index(fields=["anonymous_visitor", "created_at"], name="core_youtubeclick_anon_created"),
             models.Index(fields=["country"]),
         ]
     
     def __str__(self) -> str:
         return f"{self.youtube_id or 'Unknown'} - {self.created_at:%Y-%m-%d %H:%M}"
 
+
+
+class DailyAnalyticsSummary(models.Model):
+    """
+    خلاصه روزانه آمار؛ وجود ردیف برای یک روز یعنی rollup آن روز ساخته شده است
+    """
+    day = models.DateField(unique=True, verbose_name=_("روز"))
+    visits = models.PositiveIntegerField(default=0, verbose_name=_("تعداد بازدید"))
+    logged_in_visits = models.PositiveIntegerField(default=0, verbose_name=_("بازدید کاربران لاگین‌شده"))
+    unique_ips = models.PositiveIntegerField(default=0, verbose_name=_("آی‌پی‌های یکتا"))
+    youtube_clicks = models.PositiveIntegerField(default=0, verbose_name=_("کلیک‌های یوتیوب"))
+    logged_in_youtube_clicks = models.PositiveIntegerField(default=0, verbose_name=_("کلیک‌های کاربران لاگین‌شده"))
+    unique_clickers = models.PositiveIntegerField(default=0, verbose_name=_("کلیک‌کنندگان یکتا"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("آخرین به‌روزرسانی"))
+
+    class Meta:
+        verbose_name = _("خلاصه روزانه آمار")
+        verbose_name_plural = _("خلاصه‌های روزانه آمار")
+        ordering = ["-day"]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} - {self.visits}"
+
+
+class DailyVisitRollup(models.Model):
+    """
+    تعداد بازدیدهای روزانه به تفکیک صفحه، کشور، دستگاه و کد وضعیت
+    """
+    day = models.DateField(verbose_name=_("روز"))
+    path = models.CharField(max_length=512, verbose_name=_("آدرس صفحه"))
+    country = models.CharField(max_length=2, blank=True, verbose_name=_("کشور"))
+    device_type = models.CharField(max_length=20, blank=True, verbose_name=_("نوع دستگاه"))
+    status_code = models.PositiveIntegerField(default=200, verbose_name=_("کد وضعیت"))
+    visits = models.PositiveIntegerField(default=0, verbose_name=_("تعداد بازدید"))
+    logged_in_visits = models.PositiveIntegerField(default=0, verbose_name=_("بازدید کاربران لاگین‌شده"))
+
+    class Meta:
+        verbose_name = _("آمار روزانه بازدید")
+        verbose_name_plural = _("آمار روزانه بازدیدها")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "path", "country", "device_type", "status_code"],
+                name="core_dailyvisitrollup_unique",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} {self.path} - {self.visits}"
+
+
+class DailyReferrerRollup(models.Model):
+    """
+    تعداد بازدیدهای روزانه به تفکیک صفحه ارجاع‌دهنده
+    """
+    day = models.DateField(verbose_name=_("روز"))
+    referrer = models.ForeignKey(
+        "Referrer",
+        on_delete=models.PROTECT,
+        related_name="+",
+        verbose_name=_("صفحه ارجاع‌دهنده"),
+    )
+    visits = models.PositiveIntegerField(default=0, verbose_name=_("تعداد بازدید"))
+
+    class Meta:
+        verbose_name = _("آمار روزانه ارجاع‌دهنده")
+        verbose_name_plural = _("آمار روزانه ارجاع‌دهنده‌ها")
+        constraints = [
+            models.UniqueConstraint(fields=["day", "referrer"], name="core_dailyreferrerrollup_unique"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} {self.referrer_id} - {self.visits}"
+
+
+class DailyYouTubeClickRollup(models.Model):
+    """
+    تعداد کلیک‌های روزانه یوتیوب به تفکیک ویدیو و منبع
+    """
+    day = models.DateField(verbose_name=_("روز"))
+    youtube_id = models.CharField(max_length=20, blank=True, verbose_name=_("شناسه ویدیو یوتیوب"))
+    source_type = models.CharField(max_length=10, verbose_name=_("نوع منبع"))
+    source_title = models.CharField(max_length=255, blank=True, verbose_name=_("عنوان منبع"))
+    clicks = models.PositiveIntegerField(default=0, verbose_name=_("تعداد کلیک"))
+    logged_in_clicks = models.PositiveIntegerField(default=0, verbose_name=_("کلیک کاربران لاگین‌شده"))
+
+    class Meta:
+        verbose_name = _("آمار روزانه کلیک یوتیوب")
+        verbose_name_plural = _("آمار روزانه کلیک‌های یوتیوب")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "youtube_id", "source_type", "source_title"],
+                name="core_dailyyoutubeclickrollup_unique",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} {self.youtube_id or 'Unknown'} - {self.clicks}"
+
+
+class DailyBotCounter(models.Model):
+    """
+    تعداد درخواست‌های روزانه ربات‌ها و crawler ها (به جای ردیف‌های کامل SiteVisit)
+    """
+    day = models.DateField(verbose_name=_("روز"))
+    bot = models.CharField(max_length=50, verbose_name=_("ربات"))
+    hits = models.PositiveIntegerField(default=0, verbose_name=_("تعداد درخواست"))
+
+    class Meta:
+        verbose_name = _("آمار روزانه ربات")
+        verbose_name_plural = _("آمار روزانه ربات‌ها")
+        constraints = [
+            models.UniqueConstraint(fields=["day", "bot"], name="core_dailybotcounter_unique"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} {self.bot} - {self.hits}"
+
+
+class DailySketch(models.Model):
+    """
+    sketch روزانه HyperLogLog برای شمارش تقریبی مقادیر یکتا (core.hll)
+    """
+
+    class Metric(models.TextChoices):
+        VISIT_IPS = "visit_ips", _("آی‌پی‌های یکتای بازدید")
+        VISITORS = "visitors", _("بازدیدکنندگان یکتا")
+        CLICK_IPS = "click_ips", _("آی‌پی‌های یکتای کلیک")
+        MOBILE_IPS = "mobile_ips", _("آی‌پی‌های یکتای موبایل")
+        TABLET_IPS = "tablet_ips", _("آی‌پی‌های یکتای تبلت")
+        DESKTOP_IPS = "desktop_ips", _("آی‌پی‌های یکتای دسکتاپ")
+        UNKNOWN_DEVICE_IPS = "unknown_device_ips", _("آی‌پی‌های یکتای دستگاه نامشخص")
+        MOBILE_ANONYMOUS = "mobile_anonymous", _("بازدیدکنندگان ناشناس موبایل")
+        TABLET_ANONYMOUS = "tablet_anonymous", _("بازدیدکنندگان ناشناس تبلت")
+        DESKTOP_ANONYMOUS = "desktop_anonymous", _("بازدیدکنندگان ناشناس دسکتاپ")
+        MOBILE_USERS = "mobile_users", _("کاربران موبایل")
+        TABLET_USERS = "tablet_users", _("کاربران تبلت")
+        DESKTOP_USERS = "desktop_users", _("کاربران دسکتاپ")
+
+    day = models.DateField(verbose_name=_("روز"))
+    metric = models.CharField(max_length=20, choices=Metric.choices, verbose_name=_("شاخص"))
+    sketch = models.BinaryField(verbose_name=_("sketch"))
+
+    class Meta:
+        verbose_name = _("sketch روزانه یکتا")
+        verbose_name_plural = _("sketch های روزانه یکتا")
+        constraints = [
+            models.UniqueConstraint(fields=["day", "metric"], name="core_dailysketch_unique"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} {self.metric}"
+
+
+class DailyTopK(models.Model):
+    """
+    خلاصه Space-Saving روزانه پرتکرارترین مقادیر هر بُعد (core.topk)
+    """
+
+    class Dimension(models.TextChoices):
+        PATH = "path", _("صفحه")
+        COUNTRY = "country", _("کشور")
+        REFERRER = "referrer", _("ارجاع‌دهنده")
+        YOUTUBE_VIDEO = "youtube_video", _("ویدیو یوتیوب")
+        YOUTUBE_USER = "youtube_user", _("کاربر کلیک‌کننده یوتیوب")
+        YOUTUBE_REFERRER = "youtube_referrer", _("ارجاع‌دهنده کلیک یوتیوب")
+
+    day = models.DateField(verbose_name=_("روز"))
+    dimension = models.CharField(max_length=20, choices=Dimension.choices, verbose_name=_("بُعد"))
+    summary = models.JSONField(default=dict, verbose_name=_("خلاصه"))
+
+    class Meta:
+        verbose_name = _("خلاصه روزانه پرتکرارها")
+        verbose_name_plural = _("خلاصه‌های روزانه پرتکرارها")
+        constraints = [
+            models.UniqueConstraint(fields=["day", "dimension"], name="core_dailytopk_unique"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} {self.dimension}"
+
+
+class DailyKeySketch(models.Model):
+    """
+    sketch روزانه HyperLogLog آی‌پی‌های یکتای هر مقدار پرتکرار (مثلاً هر صفحه)
+
+    فقط برای مقادیری که در خلاصه DailyTopK همان روز هستند ساخته می‌شود و ستون‌های
+    «یکتا» جداول پرتکرار داشبورد از ادغام آن‌ها خوانده می‌شوند (core.rollups).
+    """
+
+    day = models.DateField(verbose_name=_("روز"))
+    dimension = models.CharField(max_length=20, choices=DailyTopK.Dimension.choices, verbose_name=_("بُعد"))
+    key = models.TextField(verbose_name=_("مقدار"))
+    sketch = models.BinaryField(verbose_name=_("sketch"))
+
+    class Meta:
+        verbose_name = _("sketch روزانه یکتای مقدار")
+        verbose_name_plural = _("sketch های روزانه یکتای مقادیر")
+        indexes = [
+            models.Index(fields=["dimension", "day"], name="core_dailykeysketch_dim_day"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day:%Y-%m-%d} {self.dimension} {self.key}"
@@ -0,0 +1,192 @@
+"""
+صفحه‌بندی keyset (cursor) برای لیست‌های بزرگ پنل مدیریت
+
+به جای OFFSET (که با بزرگ شدن شماره صفحه کند می‌شود) هر صفحه با شرط
+«بعد از آخرین ردیف صفحه قبل» روی کلید مرتب‌سازی (پیش‌فرض created_at, id)
+خوانده می‌شود؛ پس هزینه هر صفحه مستقل از عمق آن است و فقط از ایندکس
+استفاده می‌کند. cursor ها با django.core.signing امضا می‌شوند و برای
+کاربر مبهم‌اند.
+
+تعداد کل اختیاری است (count_mode):
+- "exact": یک COUNT(*) (برای جدول‌های کوچک)
+- "estimate": در PostgreSQL تخمین planner از EXPLAIN و در بقیه پایگاه‌ها
+  شمارش تا سقف ESTIMATE_CAP ردیف
+- None: بدون شمارش
+"""
+import json
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+
+
+SIGNING_SALT = "core.pagination"
+ESTIMATE_CAP = 1000
+DEFAULT_ORDERING = ("-created_at", "-id")
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def estimate_count(queryset, cap=ESTIMATE_CAP):
+    """
+    (تعداد, تقریبی) برای queryset بدون COUNT روی کل جدول
+
+    در PostgreSQL از «Plan Rows» خروجی EXPLAIN خوانده می‌شود؛ در بقیه پایگاه‌ها
+    حداکثر cap + 1 ردیف شمرده می‌شود و اگر بیشتر بود cap به عنوان کران پایین برمی‌گردد.
+    """
+    if connections[queryset.db].vendor == "postgresql":
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"]), True
+    count = queryset.order_by()[: cap + 1].count()
+    if count > cap:
+        return cap, True
+    return count, False
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} items>"
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    صفحه‌بندی queryset بر اساس ordering (کلید یکتا، مثلاً ("-created_at", "-id"))
+
+    استفاده:
+        paginator = KeysetPaginator(qs, 25, count_mode="estimate")
+        try:
+            page = paginator.page(request.GET.get("visits_page"))
+        except InvalidCursor:
+            page = paginator.page()
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING, count_mode="exact", count=None):
+        self.queryset = queryset
+        self.per_page = max(int(per_page), 1)
+        self.ordering = tuple(ordering)
+        self.fields = [(name.lstrip("-"), name.startswith("-")) for name in self.ordering]
+        self.count_mode = count_mode
+        self._count = count
+        self._count_is_estimate = False
+
+    # --- تعداد کل ---
+
+    def _resolve_count(self):
+        if self._count is not None or not self.count_mode:
+            return
+        if self.count_mode == "estimate":
+            self._count, self._count_is_estimate = estimate_count(self.queryset)
+        else:
+            self._count = self.queryset.count()
+
+    @property
+    def count(self):
+        self._resolve_count()
+        return self._count
+
+    @property
+    def count_is_estimate(self):
+        self._resolve_count()
+        return self._count_is_estimate
+
+    # --- cursor ---
+
+    def _key(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name, _ in self.fields]
+        return [getattr(row, name) for name, _ in self.fields]
+
+    def encode_cursor(self, direction, key):
+        values = [value.isoformat() if hasattr(value, "isoformat") else value for value in key]
+        return signing.dumps([direction, values], salt=SIGNING_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = signing.loads(cursor, salt=SIGNING_SALT)
+        except (signing.BadSignature, TypeError, ValueError) as e:
+            raise InvalidCursor(str(e)) from e
+        if direction not in ("next", "prev") or len(values) != len(self.fields):
+            raise InvalidCursor("cursor does not match this ordering")
+        model_fields = self.queryset.model._meta
+        try:
+            key = [model_fields.get_field(name).to_python(value) for (name, _), value in zip(self.fields, values)]
+        except (FieldDoesNotExist, ValidationError) as e:
+            raise InvalidCursor(str(e)) from e
+        return direction, key
+
+    def _seek(self, key, forward):
+        """شرط ردیف‌های بعد (forward) یا قبل از key به ترتیب ordering"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, key):
+            lookup = "lt" if descending == forward else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    # --- صفحه ---
+
+    def page(self, cursor=None):
+        """صفحه بعد / قبل از cursor (یا صفحه اول)؛ cursor نامعتبر InvalidCursor می‌دهد"""
+        if not cursor:
+            return self._forward(None)
+        direction, key = self.decode_cursor(cursor)
+        if direction == "next":
+            return self._forward(key)
+        page = self._backward(key)
+        # اگر ردیف‌های قبلی حذف شده باشند به صفحه اول برمی‌گردیم
+        return page if page.object_list else self._forward(None)
+
+    def _forward(self, key):
+        queryset = self.queryset.order_by(*self.ordering)
+        if key is not None:
+            queryset = queryset.filter(self._seek(key, forward=True))
+        rows = list(queryset[: self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor("next", self._key(rows[-1])) if has_next else None,
+            previous_cursor=self.encode_cursor("prev", self._key(rows[0])) if key is not None and rows else None,
+        )
+
+    def _backward(self, key):
+        reverse = [name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering]
+        queryset = self.queryset.order_by(*reverse).filter(self._seek(key, forward=False))
+        rows = list(queryset[: self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[: self.per_page][::-1]
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor("next", self._key(rows[-1])) if rows else None,
+            previous_cursor=self.encode_cursor("prev", self._key(rows[0])) if has_previous else None,
+        )
@@ -0,0 +1,315 @@
+"""
+نگهداری محدود داده‌های خام آمار و بایگانی ردیف‌های قدیمی
+
+ردیف‌های قدیمی‌تر از بازه نگهداری در فایل‌های gzip JSONL به تفکیک روز
+(archive_dir/<model>/YYYY/MM/<model>-YYYY-MM-DD.jsonl.gz) نوشته شده و سپس
+در دسته‌های محدود حذف می‌شوند. پیش از حذف، rollup روزهای مربوطه ساخته می‌شود
+تا داشبوردها تاریخچه را از دست ندهند.
+
+هر دسته ابتدا در یک فایل موقت (فایل روز + gzip member تازه) نوشته و با rename
+جایگزین می‌شود، پس فایل بایگانی هرگز نیمه‌کاره نمی‌ماند. اگر اجرا بین نوشتن و
+حذف قطع شود، اجرای بعدی ردیف‌هایی را که شناسه‌شان از بزرگ‌ترین شناسه فایل روز
+(high-water mark) کمتر است دوباره نمی‌نویسد و فقط حذف می‌کند.
+
+روی PostgreSQL جدول SiteVisit می‌تواند به‌صورت native بر اساس created_at
+پارتیشن‌بندی ماهانه شود؛ در این حالت پارتیشن‌های کاملاً قدیمی پس از بایگانی
+به جای DELETE با DROP TABLE حذف می‌شوند.
+"""
+import gzip
+import json
+import os
+import re
+import shutil
+from datetime import date, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DailyAnalyticsSummary, Referrer, SiteVisit, UserAgent, YouTubeClick
+from .rollups import day_start, rollup_day
+
+
+def retention_cutoff(retention_days, today=None):
+    """ابتدای اولین روزی که نگه داشته می‌شود (همیشه مرز روز، تا rollup ها دقیق بمانند)"""
+    today = today or timezone.localdate()
+    return day_start(today - timedelta(days=retention_days))
+
+
+def archive_path(archive_dir, model, day):
+    name = model._meta.model_name
+    return os.path.join(
+        archive_dir, name, f"{day:%Y}", f"{day:%m}", f"{name}-{day:%Y-%m-%d}.jsonl.gz"
+    )
+
+
+def _fetch_batch(queryset, model, last_id, batch_size):
+    """
+    دسته بعدی ردیف‌ها برای بایگانی
+
+    شناسه‌های جداول UserAgent / Referrer با متن اصلی جایگزین می‌شوند تا فایل
+    بایگانی مستقل از پایگاه داده قابل استفاده باشد.
+    """
+    fields = []
+    interned = []
+    for field in model._meta.concrete_fields:
+        if field.related_model in (UserAgent, Referrer):
+            interned.append(field.name)
+        else:
+            fields.append(field.attname)
+    expressions = {f"{name}__text": F(f"{name}__value") for name in interned}
+    rows = list(queryset.filter(id__gt=last_id).order_by("id").values(*fields, **expressions)[:batch_size])
+    for row in rows:
+        for name in interned:
+            row[name] = row.pop(f"{name}__text") or ""
+    return rows
+
+
+def archived_max_id(path):
+    """بزرگ‌ترین شناسه ردیف‌های بایگانی‌شده در فایل یک روز (0 اگر فایل وجود ندارد)"""
+    if not os.path.exists(path):
+        return 0
+    max_id = 0
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            max_id = max(max_id, json.loads(line)["id"])
+    return max_id
+
+
+def _write_archive(model, rows, archive_dir, high_water):
+    """
+    افزودن ردیف‌ها (به ترتیب شناسه) به فایل روز هر ردیف
+
+    high_water: {مسیر فایل: بزرگ‌ترین شناسه بایگانی‌شده} که در طول یک اجرا
+    نگه داشته می‌شود؛ ردیف‌هایی که قبلاً بایگانی شده‌اند دوباره نوشته نمی‌شوند.
+    """
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(timezone.localdate(row["created_at"]), []).append(row)
+    for day, day_rows in by_day.items():
+        path = archive_path(archive_dir, model, day)
+        if path not in high_water:
+            high_water[path] = archived_max_id(path)
+        day_rows = [row for row in day_rows if row["id"] > high_water[path]]
+        if not day_rows:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as out:
+            if os.path.exists(path):
+                with open(path, "rb") as existing:
+                    shutil.copyfileobj(existing, out)
+            # هر دسته یک gzip member جدید است که با gzip.open قابل خواندن است
+            with gzip.open(out, "wt", encoding="utf-8") as f:
+                for row in day_rows:
+                    f.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+                    f.write("\n")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+        high_water[path] = day_rows[-1]["id"]
+
+
+def ensure_rollups_before(cutoff):
+    """ساخت rollup برای روزهای قبل از cutoff که هنوز rollup ندارند"""
+    firsts = [
+        SiteVisit.objects.filter(created_at__lt=cutoff).order_by("created_at").values_list("created_at", flat=True).first(),
+        YouTubeClick.objects.filter(created_at__lt=cutoff).order_by("created_at").values_list("created_at", flat=True).first(),
+    ]
+    firsts = [timezone.localdate(value) for value in firsts if value is not None]
+    if not firsts:
+        return []
+    last_day = timezone.localdate(cutoff) - timedelta(days=1)
+    day = min(firsts)
+    existing = set(
+        DailyAnalyticsSummary.objects.filter(day__gte=day, day__lte=last_day).values_list("day", flat=True)
+    )
+    built = []
+    while day <= last_day:
+        if day not in existing:
+            rollup_day(day)
+            built.append(day)
+        day += timedelta(days=1)
+    return built
+
+
+def archive_rows(model, cutoff, archive_dir=None, batch_size=5000, delete=True):
+    """
+    بایگانی و حذف ردیف‌های قدیمی‌تر از cutoff در دسته‌های batch_size تایی
+
+    اگر archive_dir خالی باشد ردیف‌ها فقط حذف می‌شوند.
+    """
+    base_qs = model.objects.filter(created_at__lt=cutoff)
+    high_water = {}
+    total = 0
+    last_id = 0
+    while True:
+        rows = _fetch_batch(base_qs, model, last_id, batch_size)
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        if archive_dir:
+            _write_archive(model, rows, archive_dir, high_water)
+        if delete:
+            # مدل‌های آمار خام رابطه معکوس یا سیگنال حذف ندارند، پس delete یک DELETE ... WHERE id IN است
+            model.objects.filter(id__in=[row["id"] for row in rows]).delete()
+        total += len(rows)
+    return total
+
+
+# --- PostgreSQL native partitioning ---
+
+def _partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + (month.month // 12), month.month % 12 + 1, 1)
+
+
+def is_postgresql():
+    return connection.vendor == "postgresql"
+
+
+def is_partitioned(table=None):
+    """آیا جدول روی PostgreSQL به‌صورت native پارتیشن‌بندی شده است"""
+    if not is_postgresql():
+        return False
+    table = table or SiteVisit._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table=None):
+    """لیست (نام پارتیشن، ماه) برای پارتیشن‌های ماهانه"""
+    table = table or SiteVisit._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND pg_table_is_visible(p.oid)",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})(\d{{2}})$")
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def ensure_partitions(months_ahead=3, start_month=None, table=None):
+    """ساخت پارتیشن‌های ماهانه از start_month تا months_ahead ماه آینده"""
+    table = table or SiteVisit._meta.db_table
+    qn = connection.ops.quote_name
+    month = start_month or _month_start(timezone.localdate())
+    end = _month_start(timezone.localdate())
+    for _ in range(months_ahead + 1):
+        end = _next_month(end)
+    created = []
+    with connection.cursor() as cursor:
+        while month < end:
+            name = _partition_name(table, month)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(table)} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [day_start(month), day_start(_next_month(month))],
+            )
+            created.append(name)
+            month = _next_month(month)
+    return created
+
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    تبدیل یک‌باره جدول SiteVisit به جدول پارتیشن‌بندی‌شده بر اساس created_at
+
+    کلید اصلی به (id, created_at) تغییر می‌کند (شرط PostgreSQL برای پارتیشن‌بندی)،
+    ایندکس‌ها و کلیدهای خارجی با همان نام‌ها دوباره ساخته می‌شوند و داده‌ها کپی می‌شوند.
+    """
+    table = SiteVisit._meta.db_table
+    old = f"{table}_unpartitioned"
+    seq = f"{table}_part_id_seq"
+    qn = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN "
+            "(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+            [table, table],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN(created_at), MAX(id) FROM {qn(table)}")
+        first_created, max_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, created_at)")
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {qn(seq)} OWNED BY {qn(table)}.id")
+        cursor.execute("SELECT setval(%s, %s, false)", [seq, (max_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{seq}')")
+
+        start_month = _month_start(timezone.localdate(first_created)) if first_created else None
+        ensure_partitions(months_ahead=months_ahead, start_month=start_month, table=table)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+        cursor.execute(f"DROP TABLE {qn(old)}")
+
+        # ساخت دوباره ایندکس‌ها و کلیدهای خارجی با نام‌های قبلی (برای سازگاری با migration ها)؛
+        # تعریف‌ها قبل از تغییر نام گرفته شده‌اند و به نام اصلی جدول اشاره می‌کنند
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+def drop_partitions_before(cutoff, archive_dir=None, batch_size=5000):
+    """
+    بایگانی و حذف پارتیشن‌های ماهانه‌ای که کاملاً قبل از cutoff هستند
+
+    تعداد ردیف‌های بایگانی‌شده برگردانده می‌شود.
+    """
+    qn = connection.ops.quote_name
+    total = 0
+    for name, month in list_partitions():
+        if day_start(_next_month(month)) > cutoff:
+            continue
+        if archive_dir:
+            month_cutoff = day_start(_next_month(month))
+            qs = SiteVisit.objects.filter(created_at__gte=day_start(month), created_at__lt=month_cutoff)
+            high_water = {}
+            last_id = 0
+            while True:
+                rows = _fetch_batch(qs, SiteVisit, last_id, batch_size)
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                _write_archive(SiteVisit, rows, archive_dir, high_water)
+                total += len(rows)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {qn(name)}")
+    return total
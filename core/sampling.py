@@ -0,0 +1,74 @@
+"""
+نمونه‌برداری آمار بازدید و کلیک در ترافیک بالا
+
+با ANALYTICS_SAMPLE_RATE = N از هر N بازدید ناشناس یک صفحه (یا کلیک یک ویدیو)
+فقط یکی ثبت می‌شود و ردیف ذخیره‌شده sample_weight = N می‌گیرد تا داشبوردها
+تعداد واقعی را با جمع وزن‌ها تخمین بزنند. شمارنده برای هر مسیر جداگانه است،
+پس اولین بازدید هر مسیر همیشه ثبت می‌شود و صفحات کم‌بازدید هم دیده می‌شوند.
+
+با ANALYTICS_ADAPTIVE_SAMPLING وقتی صف بافر آمار پر می‌شود نرخ به‌صورت خودکار
+کم می‌شود تا نوشتن آمار با رندر صفحات بر سر اتصال پایگاه داده رقابت نکند.
+"""
+import threading
+
+from django.conf import settings
+
+
+# (حداقل پر بودن صف، ضریب نرخ نمونه‌برداری)
+ADAPTIVE_STEPS = ((0.9, 8), (0.75, 4), (0.5, 2))
+MAX_TRACKED_KEYS = 10000
+
+
+def queue_fill():
+    """نسبت پر بودن صف بافر آمار این پروسس (0 تا 1)"""
+    if not getattr(settings, "ANALYTICS_ASYNC_WRITES", False):
+        return 0.0
+    from .analytics import get_buffer
+
+    buffer = get_buffer()
+    return buffer.qsize() / buffer.max_queue
+
+
+def current_rate():
+    """N فعلی (ثبت یک مورد از هر N) با احتساب فشار صف"""
+    rate = max(int(getattr(settings, "ANALYTICS_SAMPLE_RATE", 1)), 1)
+    if getattr(settings, "ANALYTICS_ADAPTIVE_SAMPLING", False):
+        fill = queue_fill()
+        for threshold, factor in ADAPTIVE_STEPS:
+            if fill >= threshold:
+                rate *= factor
+                break
+    return min(rate, max(int(getattr(settings, "ANALYTICS_MAX_SAMPLE_RATE", 100)), 1))
+
+
+class Sampler:
+    """شمارنده‌های یک به N برای هر کلید (مسیر صفحه یا ویدیو)"""
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def weight(self, key, rate=None):
+        """وزن ردیفی که باید ثبت شود، یا 0 اگر این مورد نمونه‌برداری نشده است"""
+        rate = current_rate() if rate is None else rate
+        if rate <= 1:
+            return 1
+        with self._lock:
+            if key not in self._counters and len(self._counters) >= MAX_TRACKED_KEYS:
+                # جلوگیری از رشد بی‌حد با مسیرهای تصادفی
+                self._counters.clear()
+            seen = self._counters.get(key, 0)
+            self._counters[key] = seen + 1
+        return rate if seen % rate == 0 else 0
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+sampler = Sampler()
+
+
+def sample_weight(key):
+    """وزن نمونه برای کلید با sampler سراسری (0 = ثبت نشود)"""
+    return sampler.weight(key)
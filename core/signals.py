@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .analytics import forget_visitor
+from .models import AnonymousVisitor
+
+
+@receiver(post_delete, sender=AnonymousVisitor)
+def forget_deleted_visitor(sender, instance: AnonymousVisitor, **kwargs):
+    # وضعیت cache شده نباید به ردیف حذف‌شده اشاره کند
+    forget_visitor(instance.session_key)
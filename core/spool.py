@@ -0,0 +1,265 @@
+"""
+فایل spool فقط-افزودنی برای رکوردهای آمار
+
+با ANALYTICS_SPOOL_DIR هر رکورد بازدید / کلیک به جای پایگاه داده به‌صورت یک خط
+JSON با یک os.write روی فایلی که با O_APPEND باز شده نوشته می‌شود؛ این کار بین
+پروسس‌های gunicorn امن است چون هر خط کوتاه در یک write اتمیک اضافه می‌شود.
+
+فایل‌ها بر اساس زمان به segment های ANALYTICS_SPOOL_SEGMENT_SECONDS ثانیه‌ای
+تقسیم می‌شوند (events-YYYYMMDDTHHMMSS.jsonl). segment های بسته‌شده با دستور
+"python manage.py ingest_analytics_spool" خوانده و با write_visits دسته‌ای در
+پایگاه داده نوشته می‌شوند، پس قطعی پایگاه داده باعث از دست رفتن رکوردها نمی‌شود.
+"""
+import bisect
+import calendar
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".jsonl"
+CLAIMED_SUFFIX = ".ingesting"
+OFFSET_SUFFIX = ".offset"
+REJECTED_SUFFIX = ".rejected"
+TEMP_SUFFIX = ".tmp"
+# فاصله اطمینان پس از پایان یک segment تا پروسس‌هایی که هنوز آن را باز دارند کارشان تمام شود
+CLOSE_GRACE_SECONDS = 5
+
+
+def segment_name(timestamp, segment_seconds):
+    """نام segment شامل زمان timestamp (ثانیه یونیکس، UTC)"""
+    start = int(timestamp) - int(timestamp) % segment_seconds
+    return f"{SEGMENT_PREFIX}{time.strftime('%Y%m%dT%H%M%S', time.gmtime(start))}{SEGMENT_SUFFIX}"
+
+
+def segment_start(path):
+    """زمان شروع segment از روی نام فایل"""
+    stamp = Path(path).name[len(SEGMENT_PREFIX):].split(".", 1)[0]
+    return calendar.timegm(time.strptime(stamp, "%Y%m%dT%H%M%S"))
+
+
+def encode_record(record):
+    """یک خط JSON فشرده (بایت) برای رکورد؛ زمان‌ها با isoformat ذخیره می‌شوند"""
+    data = {key: value for key, value in record.items() if value not in (None, "")}
+    data["created_at"] = record["created_at"].isoformat()
+    return (json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def decode_record(line):
+    """رکورد از یک خط spool؛ خط ناقص (مثلاً پس از crash) None برمی‌گرداند"""
+    try:
+        record = json.loads(line)
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    return record
+
+
+class SpoolWriter:
+    """نویسنده spool برای یک پروسس (descriptor segment جاری باز نگه داشته می‌شود)"""
+
+    def __init__(self, spool_dir, segment_seconds=60):
+        self.spool_dir = Path(spool_dir)
+        self.segment_seconds = max(int(segment_seconds), 1)
+        self._lock = threading.Lock()
+        self._fd = None
+        self._name = None
+        self._pid = None
+
+    def append(self, record):
+        """افزودن یک رکورد با یک os.write"""
+        line = encode_record(record)
+        name = segment_name(time.time(), self.segment_seconds)
+        with self._lock:
+            if self._fd is None or self._name != name or self._pid != os.getpid():
+                self._open(name)
+            os.write(self._fd, line)
+
+    def append_many(self, records):
+        """
+        افزودن چند رکورد با یک os.write؛ تعداد رکوردهایی که کامل نوشته شدند
+
+        write کوتاه (مثلاً هنگام پر شدن دیسک) با نوشتن باقی‌مانده ادامه پیدا می‌کند.
+        اگر در میانه OSError رخ دهد خط نیمه‌تمام با یک "\n" بسته می‌شود (و هنگام
+        ingest نامعتبر شمرده می‌شود) و فقط تعداد رکوردهای کامل برگردانده می‌شود تا
+        فراخواننده بقیه را از مسیر دیگری ثبت کند و هیچ رکوردی دو بار نوشته نشود.
+        """
+        lines = [encode_record(record) for record in records]
+        ends = list(itertools.accumulate(len(line) for line in lines))
+        data = b"".join(lines)
+        name = segment_name(time.time(), self.segment_seconds)
+        done = 0
+        with self._lock:
+            try:
+                if self._fd is None or self._name != name or self._pid != os.getpid():
+                    self._open(name)
+                while done < len(data):
+                    done += os.write(self._fd, data[done:])
+            except OSError as e:
+                logger.warning(f"خطا در نوشتن spool پس از {done} از {len(data)} بایت: {e}")
+                if done and data[done - 1:done] != b"\n":
+                    try:
+                        os.write(self._fd, b"\n")
+                    except OSError:
+                        pass
+        return bisect.bisect_right(ends, done)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
+            self._name = None
+
+    def _open(self, name):
+        if self._fd is not None and self._pid == os.getpid():
+            os.close(self._fd)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.spool_dir / name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        self._name = name
+        self._pid = os.getpid()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """نویسنده سراسری بر اساس ANALYTICS_SPOOL_DIR یا None اگر spool غیرفعال باشد"""
+    global _writer
+    spool_dir = getattr(settings, "ANALYTICS_SPOOL_DIR", "")
+    if not spool_dir:
+        return None
+    if _writer is None or str(_writer.spool_dir) != str(spool_dir):
+        with _writer_lock:
+            if _writer is None or str(_writer.spool_dir) != str(spool_dir):
+                _writer = SpoolWriter(spool_dir, getattr(settings, "ANALYTICS_SPOOL_SEGMENT_SECONDS", 60))
+    return _writer
+
+
+def closed_segments(spool_dir, now=None):
+    """
+    segment هایی که دیگر در آن‌ها نوشته نمی‌شود (به ترتیب زمان)
+
+    segment های نیمه‌کاره قبلی (.ingesting) هم برگردانده می‌شوند تا ادامه پیدا کنند.
+    """
+    spool_dir = Path(spool_dir)
+    if not spool_dir.is_dir():
+        return []
+    now = time.time() if now is None else now
+    segment_seconds = max(int(getattr(settings, "ANALYTICS_SPOOL_SEGMENT_SECONDS", 60)), 1)
+    segments = []
+    for path in spool_dir.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}*"):
+        if path.name.endswith((OFFSET_SUFFIX, REJECTED_SUFFIX, TEMP_SUFFIX)):
+            continue
+        if path.name.endswith(CLAIMED_SUFFIX) or segment_start(path) + segment_seconds + CLOSE_GRACE_SECONDS <= now:
+            segments.append(path)
+    return sorted(segments, key=lambda path: path.name)
+
+
+def _write_batch(writer, batch, rejected_path):
+    """
+    نوشتن یک دسته [(خط، رکورد)]؛ تعداد رکوردهای نوشته‌شده و رد‌شده
+
+    writer هر دسته را در یک تراکنش می‌نویسد. خطاهای اتصال پایگاه داده
+    (OperationalError / InterfaceError) بالا می‌روند تا segment بعداً ادامه پیدا کند؛
+    هر خطای دیگر یعنی رکورد خراب است: رکوردها یکی‌یکی نوشته می‌شوند و خطوطی که
+    باز هم خطا می‌دهند در فایل .rejected کنار گذاشته می‌شوند.
+    """
+    try:
+        writer([record for _, record in batch])
+        return len(batch), 0
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as e:
+        logger.warning(f"خطا در نوشتن دسته {len(batch)} رکوردی spool، نوشتن تک‌تک: {e}")
+
+    written = 0
+    rejected = []
+    for line, record in batch:
+        try:
+            writer([record])
+            written += 1
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception as e:
+            logger.warning(f"رکورد نامعتبر spool در {rejected_path.name} کنار گذاشته شد: {e}")
+            rejected.append(line)
+    if rejected:
+        with open(rejected_path, "ab") as f:
+            f.writelines(rejected)
+    return written, len(rejected)
+
+
+def _write_offset(offset_path, line_number):
+    """ذخیره اتمیک offset (فایل موقت + os.replace) تا crash فایل نیمه‌نوشته باقی نگذارد"""
+    temp_path = offset_path.with_name(offset_path.name + TEMP_SUFFIX)
+    with open(temp_path, "w") as f:
+        f.write(str(line_number))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, offset_path)
+
+
+def ingest_segment(path, writer, batch_size=1000):
+    """
+    نوشتن یک segment بسته‌شده در پایگاه داده با writer (مثلاً write_visits)
+
+    فایل ابتدا به .ingesting تغییر نام می‌دهد تا دو loader همزمان آن را نخوانند.
+    پس از commit هر دسته تعداد خطوط نوشته‌شده به‌صورت اتمیک در فایل .offset ذخیره
+    می‌شود؛ اگر پایگاه داده در میانه کار قطع شود، اجرای بعدی از همان خط ادامه می‌دهد.
+    تحویل «حداقل یک بار» است: اگر پروسس بین commit یک دسته و ذخیره offset از کار
+    بیفتد، همان دسته (حداکثر batch_size رکورد) در اجرای بعدی دوباره نوشته می‌شود.
+    رکوردهایی که writer نمی‌تواند بنویسد در فایل .rejected کنار segment نگه داشته
+    می‌شوند تا segment گیر نکند.
+    خروجی: (تعداد رکوردهای نوشته‌شده، تعداد خطوط نامعتبر یا رد‌شده)
+    """
+    path = Path(path)
+    if not path.name.endswith(CLAIMED_SUFFIX):
+        claimed = path.with_name(path.name + CLAIMED_SUFFIX)
+        os.rename(path, claimed)
+        path = claimed
+    offset_path = path.with_name(path.name + OFFSET_SUFFIX)
+    rejected_path = path.with_name(path.name[: -len(CLAIMED_SUFFIX)] + REJECTED_SUFFIX)
+    done = int(offset_path.read_text()) if offset_path.exists() else 0
+
+    written = 0
+    invalid = 0
+    batch = []
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line_number <= done:
+                continue
+            record = decode_record(line)
+            if record is None:
+                invalid += 1
+            else:
+                batch.append((line, record))
+            if len(batch) >= batch_size:
+                ok, rejected = _write_batch(writer, batch, rejected_path)
+                written += ok
+                invalid += rejected
+                batch = []
+                _write_offset(offset_path, line_number)
+    if batch:
+        ok, rejected = _write_batch(writer, batch, rejected_path)
+        written += ok
+        invalid += rejected
+
+    os.remove(path)
+    if offset_path.exists():
+        os.remove(offset_path)
+    if invalid:
+        logger.warning(f"{invalid} خط نامعتبر در {path.name} نادیده گرفته شد")
+    return written, invalid
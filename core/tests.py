@@ -1,7 +1,56 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from core.models import ContactMessage
+from core.analytics import AnalyticsBuffer, write_visits
+from core.bots import RATE_LIMITED, bot_label
+from core.geoip import (
+    CachingResolver,
+    IPRangeDatabase,
+    LocalDatabaseResolver,
+    build_database,
+    enrich_countries,
+    reset_resolver,
+)
+from core.hll import HyperLogLog
+from core.interning import referrers, reset_intern_caches, user_agents
+from core.models import (
+    AnonymousVisitor,
+    ContactMessage,
+    DailyAnalyticsSummary,
+    DailyBotCounter,
+    DailySketch,
+    DailyTopK,
+    Referrer,
+    SiteVisit,
+    UserAgent,
+    YouTubeClick,
+)
+from core.pagination import InvalidCursor, KeysetPaginator, estimate_count
+from core.retention import archive_path, archive_rows, ensure_rollups_before, retention_cutoff
+from core.rollups import RollupRange, day_start, pending_days, rollup_day
+from core.sampling import current_rate, sampler
+from core.spool import SpoolWriter, closed_segments, get_writer, ingest_segment
+from core.topk import SpaceSaving, load, record_counts
+from core.useragents import parse_user_agent
+from core.utils import detect_device_type, get_country_from_ip
 from tests.factories import create_post, create_product, create_video
 
 
@@ -38,3 +87,880 @@ class ContactViewTests(TestCase):
         message = ContactMessage.objects.first()
         self.assertEqual(message.name, "Hossein")
         self.assertEqual(message.email, "hossein@example.com")
+
+
+BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+
+
+class SiteAnalyticsTests(TestCase):
+    def setUp(self):
+        reset_intern_caches()
+        cache.clear()
+        sampler.reset()
+        self.client = Client(HTTP_USER_AGENT=BROWSER_USER_AGENT)
+
+    def _record(self, **overrides):
+        record = {
+            "user_id": None,
+            "session_key": "abc123",
+            "path": "/about/",
+            "method": "GET",
+            "status_code": 200,
+            "ip_address": "127.0.0.1",
+            "user_agent": "Mozilla/5.0 (iPhone)",
+            "referrer": "",
+            "created_at": timezone.now(),
+        }
+        record.update(overrides)
+        return record
+
+    def test_page_view_records_anonymous_visit(self):
+        response = self.client.get(reverse("core:about"))
+        self.assertEqual(response.status_code, 200)
+        visit = SiteVisit.objects.get()
+        self.assertEqual(visit.path, reverse("core:about"))
+        self.assertIsNotNone(visit.anonymous_visitor)
+        self.assertEqual(AnonymousVisitor.objects.count(), 1)
+
+    def test_anonymous_visitor_uses_signed_cookie_instead_of_session(self):
+        self.client.get(reverse("core:about"))
+        self.assertIn(settings.ANALYTICS_VISITOR_COOKIE_NAME, self.client.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+
+        response = self.client.get(reverse("core:about"))
+        # کوکی موجود دوباره تنظیم نمی‌شود و همان بازدیدکننده استفاده می‌شود
+        self.assertNotIn(settings.ANALYTICS_VISITOR_COOKIE_NAME, response.cookies)
+        self.assertEqual(AnonymousVisitor.objects.count(), 1)
+        self.assertEqual(AnonymousVisitor.objects.get().site_visits.count(), 2)
+
+        # کوکی دستکاری‌شده پذیرفته نمی‌شود
+        self.client.cookies[settings.ANALYTICS_VISITOR_COOKIE_NAME] = "forged"
+        self.client.get(reverse("core:about"))
+        self.assertEqual(AnonymousVisitor.objects.count(), 2)
+
+    def test_bots_are_counted_without_visit_rows(self):
+        crawler = Client(HTTP_USER_AGENT="Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)")
+        response = crawler.get(reverse("core:about"))
+        crawler.get(reverse("core:about"))
+        Client().get(reverse("core:about"))
+        self.assertNotIn(settings.ANALYTICS_VISITOR_COOKIE_NAME, response.cookies)
+        self.assertEqual(SiteVisit.objects.count(), 0)
+        self.assertEqual(AnonymousVisitor.objects.count(), 0)
+        counters = dict(DailyBotCounter.objects.values_list("bot", "hits"))
+        self.assertEqual(counters, {"googlebot": 2, "empty-user-agent": 1})
+
+        self.assertEqual(bot_label("Mozilla/5.0 (compatible; AhrefsBot/7.0)"), "ahrefsbot")
+        self.assertEqual(bot_label("Mozilla/5.0 (compatible; SomeNewCrawler/1.0)"), "somenewcrawler")
+        self.assertEqual(bot_label(BROWSER_USER_AGENT), "")
+
+    def test_device_names_containing_bot_are_not_bots(self):
+        self.assertEqual(bot_label("Mozilla/5.0 (compatible; ExampleBot; +https://example.com/bot)"), "examplebot")
+        devices = [
+            "Mozilla/5.0 (Linux; Android 10; CUBOT X30) AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/120.0.0.0 Mobile Safari/537.36",
+            "Mozilla/5.0 (Linux; Android 9; CUBOT_NOTE_7 Build/PPR1.180610.011; wv) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Version/4.0 Chrome/83.0.4103.106 Mobile Safari/537.36",
+            "Mozilla/5.0 (Linux; Android 11; CUBOT KINGKONG 5 Pro) AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/112.0.0.0 Mobile Safari/537.36",
+        ]
+        for user_agent in devices:
+            self.assertEqual(bot_label(user_agent), "", user_agent)
+
+    def test_yandex_and_java_names_are_anchored(self):
+        self.assertEqual(bot_label("Mozilla/5.0 (compatible; YandexImages/3.0; +http://yandex.com/bots)"), "yandeximages")
+        self.assertEqual(bot_label("Java/17.0.2"), "java")
+        browsers = [
+            "Mozilla/5.0 (Linux; Android 13; SM-A536B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 "
+            "YaBrowser/24.1.5.62.00 SA/3 Mobile Safari/537.36 YandexSearch/24.10",
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 "
+            "Safari/537.36 javascript-enabled",
+        ]
+        for user_agent in browsers:
+            self.assertEqual(bot_label(user_agent), "", user_agent)
+
+    @override_settings(ANALYTICS_BOT_MAX_REQUESTS_PER_MINUTE=2)
+    def test_high_request_rate_is_treated_as_bot(self):
+        for _ in range(3):
+            self.client.get(reverse("core:about"))
+        self.assertEqual(SiteVisit.objects.count(), 2)
+        self.assertEqual(DailyBotCounter.objects.get().bot, RATE_LIMITED)
+
+        # کاربران لاگین‌شده محدود نمی‌شوند
+        user = get_user_model().objects.create_user(username="reader", password="pass12345")
+        self.client.force_login(user)
+        self.client.get(reverse("core:about"))
+        self.assertEqual(SiteVisit.objects.filter(user=user).count(), 1)
+
+    @override_settings(ANALYTICS_SAMPLE_RATE=3)
+    def test_sampled_visits_carry_weight(self):
+        for _ in range(7):
+            self.client.get(reverse("core:about"))
+        self.client.get(reverse("core:contact"))
+        # از هر مسیر جداگانه نمونه گرفته می‌شود: بازدیدهای 1، 4 و 7 درباره ما و اولین بازدید تماس
+        self.assertEqual(SiteVisit.objects.filter(path=reverse("core:about")).count(), 3)
+        self.assertEqual(SiteVisit.objects.filter(path=reverse("core:contact")).count(), 1)
+        self.assertEqual(set(SiteVisit.objects.values_list("sample_weight", flat=True)), {3})
+        self.assertEqual(RollupRange(timezone.localdate()).visit_totals()["visits"], 12)
+
+    @override_settings(ANALYTICS_ASYNC_WRITES=True, ANALYTICS_SAMPLE_RATE=2, ANALYTICS_MAX_SAMPLE_RATE=10)
+    def test_sample_rate_adapts_to_queue_backlog(self):
+        from core import analytics
+
+        buffer = AnalyticsBuffer(max_queue=10, autostart=False)
+        original, analytics._buffer = analytics._buffer, buffer
+        try:
+            self.assertEqual(current_rate(), 2)
+            for _ in range(8):
+                buffer.enqueue(self._record())
+            self.assertEqual(current_rate(), 8)
+            for _ in range(2):
+                buffer.enqueue(self._record())
+            self.assertEqual(current_rate(), 10)
+        finally:
+            analytics._buffer = original
+
+    def test_youtube_click_batch_is_written_in_bulk(self):
+        events = [
+            {"youtube_url": "https://www.youtube.com/watch?v=abc123", "source_type": "video", "source_id": "5"},
+            {"youtube_url": "https://youtu.be/xyz789", "source_type": "unknown", "source_title": "Intro"},
+            {"youtube_url": "https://example.com/not-youtube"},
+            "garbage",
+        ]
+        crawler = Client(HTTP_USER_AGENT="curl/8.4.0")
+        crawler.post(reverse("core:youtube_click_batch"), json.dumps(events), content_type="text/plain")
+        self.assertEqual(YouTubeClick.objects.count(), 0)
+
+        response = self.client.post(
+            reverse("core:youtube_click_batch"), json.dumps(events), content_type="text/plain"
+        )
+        self.assertEqual(response.status_code, 204)
+        clicks = {click.youtube_id: click for click in YouTubeClick.objects.all()}
+        self.assertEqual(set(clicks), {"abc123", "xyz789"})
+        self.assertEqual(clicks["abc123"].source_id, 5)
+        self.assertEqual(clicks["xyz789"].source_type, "other")
+        self.assertEqual(clicks["abc123"].anonymous_visitor_id, clicks["xyz789"].anonymous_visitor_id)
+        self.assertIsNotNone(clicks["abc123"].anonymous_visitor_id)
+
+        response = self.client.post(reverse("core:youtube_click_batch"), "{not json", content_type="text/plain")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse("core:youtube_click_batch"), "[]", content_type="text/plain", HTTP_ORIGIN="https://evil.example"
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            reverse("core:youtube_click_batch"), "[]", content_type="text/plain", CONTENT_LENGTH=str(128 * 1024)
+        )
+        self.assertEqual(response.status_code, 413)
+
+    def test_single_youtube_click_uses_the_analytics_queue(self):
+        data = {"youtube_url": "https://youtu.be/abc123", "source_type": "video", "source_id": "7"}
+        crawler = Client(HTTP_USER_AGENT="curl/8.4.0")
+        response = crawler.post(reverse("core:youtube_click"), data)
+        self.assertEqual(response.json()["queued"], False)
+        self.assertEqual(YouTubeClick.objects.count(), 0)
+
+        response = self.client.post(reverse("core:youtube_click"), data)
+        self.assertEqual(
+            response.json(), {"success": True, "click_id": None, "youtube_id": "abc123", "queued": True}
+        )
+        click = YouTubeClick.objects.get()
+        self.assertEqual((click.youtube_id, click.source_id), ("abc123", 7))
+        self.assertIsNotNone(click.anonymous_visitor_id)
+
+        self.assertEqual(self.client.post(reverse("core:youtube_click"), {}).status_code, 400)
+        response = self.client.post(reverse("core:youtube_click"), {"youtube_url": "https://example.com/watch"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(YouTubeClick.objects.count(), 1)
+
+    def test_single_youtube_click_reports_write_errors(self):
+        from core import analytics
+
+        def failing_record_clicks(records):
+            raise OperationalError("database is locked")
+
+        original = analytics.record_clicks
+        analytics.record_clicks = failing_record_clicks
+        try:
+            response = self.client.post(reverse("core:youtube_click"), {"youtube_url": "https://youtu.be/abc123"})
+        finally:
+            analytics.record_clicks = original
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {"success": False, "error": "database is locked"})
+
+    def test_buffer_flush_writes_batch(self):
+        buffer = AnalyticsBuffer(autostart=False)
+        buffer.enqueue(self._record(path="/a/"))
+        buffer.enqueue(self._record(path="/b/", user_agent="Desktop"))
+        buffer.enqueue(self._record(session_key="other"))
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(SiteVisit.objects.count(), 3)
+        self.assertEqual(AnonymousVisitor.objects.count(), 2)
+        visitor = AnonymousVisitor.objects.get(session_key="abc123")
+        self.assertEqual(visitor.first_user_agent.value, "Mozilla/5.0 (iPhone)")
+        self.assertEqual(visitor.last_user_agent.value, "Desktop")
+        self.assertEqual(visitor.site_visits.count(), 2)
+        # هر رشته مرورگر فقط یک بار ذخیره می‌شود
+        self.assertEqual(UserAgent.objects.count(), 2)
+
+    def test_interned_strings_are_resolved_once(self):
+        first = user_agents.resolve_many(["UA-1", "UA-2", ""])
+        self.assertEqual(set(first), {"UA-1", "UA-2"})
+        with self.assertNumQueries(0):
+            self.assertEqual(user_agents.resolve("UA-1"), first["UA-1"])
+        reset_intern_caches()
+        # ردیف موجود با هش پیدا می‌شود و دوباره درج نمی‌شود
+        self.assertEqual(user_agents.resolve("UA-2"), first["UA-2"])
+        self.assertEqual(UserAgent.objects.count(), 2)
+        self.assertIsNone(referrers.resolve(""))
+
+    def test_visitor_last_seen_writes_are_coalesced(self):
+        start = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            write_visits([self._record(created_at=start)])
+        visitor = AnonymousVisitor.objects.get()
+        first_seen = visitor.last_seen
+
+        # همان آی‌پی و مرورگر در بازه زمانی: فقط بازدید و خلاصه Top-K مسیر ثبت می‌شود
+        # (بدون SELECT / UPDATE بازدیدکننده)
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(5):
+            write_visits([self._record(created_at=start + timedelta(seconds=30))])
+        visitor.refresh_from_db()
+        self.assertEqual(visitor.last_seen, first_seen)
+
+        # تغییر آی‌پی یا گذشت بازه زمانی باعث نوشتن می‌شود
+        write_visits([self._record(ip_address="10.0.0.1", created_at=start + timedelta(seconds=60))])
+        visitor.refresh_from_db()
+        self.assertEqual(visitor.last_ip, "10.0.0.1")
+        later = start + timedelta(seconds=settings.ANALYTICS_VISITOR_UPDATE_INTERVAL + 61)
+        write_visits([self._record(ip_address="10.0.0.1", created_at=later)])
+        visitor.refresh_from_db()
+        self.assertEqual(visitor.last_seen, later)
+        self.assertEqual(visitor.site_visits.count(), 4)
+
+    def test_buffer_drops_records_when_full(self):
+        buffer = AnalyticsBuffer(max_queue=1, autostart=False)
+        self.assertTrue(buffer.enqueue(self._record()))
+        self.assertFalse(buffer.enqueue(self._record()))
+        self.assertEqual(buffer.dropped, 1)
+        self.assertEqual(buffer.flush(), 1)
+
+
+class SpoolTests(TestCase):
+    def setUp(self):
+        reset_intern_caches()
+        cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_records_are_appended_and_ingested_after_segment_closes(self):
+        record = {
+            "user_id": None,
+            "session_key": "abc123",
+            "path": "/about/",
+            "ip_address": "127.0.0.1",
+            "user_agent": "Mozilla/5.0 (iPhone)",
+            "created_at": timezone.now(),
+        }
+        with override_settings(ANALYTICS_SPOOL_DIR=self.tmpdir.name, ANALYTICS_SPOOL_SEGMENT_SECONDS=86400):
+            self.client.get(reverse("core:about"), HTTP_USER_AGENT="Mozilla/5.0 (X11; Linux x86_64) Firefox/125.0")
+            get_writer().close()
+        self.assertEqual(SiteVisit.objects.count(), 0)
+
+        writer = SpoolWriter(self.tmpdir.name, segment_seconds=86400)
+        writer.append(record)
+        writer.append({**record, "youtube_url": "https://youtu.be/abc", "youtube_id": "abc"})
+        writer.close()
+        segments = os.listdir(self.tmpdir.name)
+        self.assertEqual(len(segments), 1)
+        with open(os.path.join(self.tmpdir.name, segments[0]), "ab") as f:
+            f.write(b'{"path": "/trunc')
+
+        # segment جاری هنوز بسته نشده است
+        with override_settings(ANALYTICS_SPOOL_SEGMENT_SECONDS=86400):
+            self.assertEqual(closed_segments(self.tmpdir.name), [])
+            (segment,) = closed_segments(self.tmpdir.name, now=time.time() + 2 * 86400)
+        self.assertEqual(ingest_segment(segment, write_visits), (3, 1))
+        self.assertEqual(SiteVisit.objects.count(), 2)
+        self.assertEqual(YouTubeClick.objects.count(), 1)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_failed_ingest_resumes_from_last_batch(self):
+        writer = SpoolWriter(self.tmpdir.name)
+        for index in range(5):
+            writer.append({"path": f"/p{index}/", "created_at": timezone.now()})
+        writer.close()
+        (segment,) = closed_segments(self.tmpdir.name, now=time.time() + 3600)
+
+        calls = []
+
+        def flaky_writer(batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise OperationalError("db down")
+            write_visits(batch)
+
+        with self.assertRaises(OperationalError):
+            ingest_segment(segment, flaky_writer, batch_size=2)
+        (claimed,) = closed_segments(self.tmpdir.name)
+        self.assertEqual(ingest_segment(claimed, write_visits, batch_size=2), (3, 0))
+        self.assertEqual(sorted(SiteVisit.objects.values_list("path", flat=True)), [f"/p{i}/" for i in range(5)])
+
+    def test_bad_record_is_quarantined_without_partial_batch(self):
+        writer = SpoolWriter(self.tmpdir.name)
+        now = timezone.now()
+        writer.append({"bot": "googlebot", "created_at": now})
+        writer.append({"youtube_url": "https://youtu.be/abc", "youtube_id": "abc", "created_at": now})
+        writer.append({"method": "GET", "created_at": now})
+        writer.append({"path": "/ok/", "created_at": now})
+        writer.close()
+        (segment,) = closed_segments(self.tmpdir.name, now=time.time() + 3600)
+
+        self.assertEqual(ingest_segment(segment, write_visits), (3, 1))
+        self.assertEqual(DailyBotCounter.objects.get().hits, 1)
+        self.assertEqual(YouTubeClick.objects.count(), 1)
+        self.assertEqual(list(SiteVisit.objects.values_list("path", flat=True)), ["/ok/"])
+        (rejected,) = os.listdir(self.tmpdir.name)
+        self.assertTrue(rejected.endswith(".rejected"))
+        self.assertEqual(closed_segments(self.tmpdir.name, now=time.time() + 3600), [])
+        with open(os.path.join(self.tmpdir.name, rejected)) as f:
+            self.assertEqual(json.loads(f.read())["method"], "GET")
+
+
+    def test_failed_spool_append_falls_back_only_for_unwritten_records(self):
+        from core.analytics import record_clicks
+
+        now = timezone.now()
+        records = [
+            {"youtube_url": f"https://youtu.be/v{index}", "youtube_id": f"v{index}", "created_at": now}
+            for index in range(3)
+        ]
+        real_write = os.write
+        calls = []
+
+        def disk_full_write(fd, data):
+            calls.append(len(data))
+            if len(calls) == 1:
+                # فقط رکورد اول و نیمی از دومی نوشته می‌شود
+                first = data.index(b"\n") + 1
+                return real_write(fd, data[: first + 10])
+            if len(calls) == 2:
+                raise OSError(28, "No space left on device")
+            return real_write(fd, data)
+
+        with override_settings(ANALYTICS_SPOOL_DIR=self.tmpdir.name, ANALYTICS_SPOOL_SEGMENT_SECONDS=86400):
+            os.write = disk_full_write
+            try:
+                with self.assertLogs("core.spool", level="WARNING"):
+                    self.assertEqual(record_clicks(records), 3)
+            finally:
+                os.write = real_write
+            get_writer().close()
+
+        # رکوردهای دوم و سوم مستقیماً نوشته شدند و رکورد اول فقط در spool است
+        self.assertEqual(sorted(YouTubeClick.objects.values_list("youtube_id", flat=True)), ["v1", "v2"])
+        with override_settings(ANALYTICS_SPOOL_SEGMENT_SECONDS=86400):
+            (segment,) = closed_segments(self.tmpdir.name, now=time.time() + 2 * 86400)
+        self.assertEqual(ingest_segment(segment, write_visits), (1, 1))
+        self.assertEqual(sorted(YouTubeClick.objects.values_list("youtube_id", flat=True)), ["v0", "v1", "v2"])
+
+
+class GeoIPDatabaseTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "ip-country.bin")
+        build_database(
+            [
+                ("5.0.0.0", "5.0.255.255", "IR"),
+                ("8.8.8.0", "8.8.8.255", "us"),
+                ("5.1.0.0", "5.1.255.255", "IR"),
+                ("bad", "row", "XX"),
+            ],
+            self.path,
+        )
+        reset_resolver()
+        self.addCleanup(reset_resolver)
+
+    def test_lookup_uses_sorted_ranges(self):
+        db = IPRangeDatabase(self.path)
+        self.addCleanup(db.close)
+        # بازه‌های پیوسته با کشور یکسان ادغام می‌شوند
+        self.assertEqual(len(db), 2)
+        self.assertEqual(db.lookup("5.1.2.3"), "IR")
+        self.assertEqual(db.lookup("8.8.8.8"), "US")
+        self.assertEqual(db.lookup("9.9.9.9"), "")
+
+    def test_get_country_from_ip_uses_local_database(self):
+        with override_settings(GEOIP_BACKEND="local", GEOIP_DATABASE_PATH=self.path):
+            self.assertEqual(get_country_from_ip("8.8.8.8"), "US")
+            self.assertEqual(get_country_from_ip("127.0.0.1"), "")
+
+    def test_missing_database_returns_empty_country(self):
+        with override_settings(GEOIP_BACKEND="local", GEOIP_DATABASE_PATH=self.path + ".missing"):
+            self.assertEqual(get_country_from_ip("8.8.8.8"), "")
+
+    def test_resolver_retries_missing_database_and_reloads_changed_file(self):
+        missing = self.path + ".new"
+        resolver = LocalDatabaseResolver(missing, recheck_interval=0)
+        with self.assertLogs("core.geoip", level="WARNING") as logs:
+            self.assertEqual(resolver.resolve("8.8.8.8"), "")
+            self.assertEqual(resolver.resolve("8.8.8.8"), "")
+        # هشدار فقط یک بار ثبت می‌شود
+        self.assertEqual(len(logs.records), 1)
+
+        build_database([("8.8.8.0", "8.8.8.255", "US")], missing)
+        self.assertEqual(resolver.resolve("8.8.8.8"), "US")
+
+        build_database([("8.8.8.0", "8.8.8.255", "DE")], missing)
+        stat = os.stat(missing)
+        os.utime(missing, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(resolver.resolve("8.8.8.8"), "DE")
+
+    def test_resolver_rechecks_only_after_interval(self):
+        resolver = LocalDatabaseResolver(self.path + ".new", recheck_interval=3600)
+        with self.assertLogs("core.geoip", level="WARNING"):
+            self.assertEqual(resolver.resolve("8.8.8.8"), "")
+        build_database([("8.8.8.0", "8.8.8.255", "US")], self.path + ".new")
+        self.assertEqual(resolver.resolve("8.8.8.8"), "")
+
+
+class CountryEnrichmentTests(TestCase):
+    def test_enrich_resolves_each_ip_once_and_updates_rows(self):
+        for ip in ["8.8.8.8", "8.8.8.8", "5.0.0.1", "9.9.9.9"]:
+            SiteVisit.objects.create(path="/", method="GET", ip_address=ip)
+        YouTubeClick.objects.create(youtube_url="https://youtu.be/abc", ip_address="8.8.8.8")
+        SiteVisit.objects.create(path="/", method="GET", ip_address="5.0.0.2", country="DE")
+
+        calls = []
+
+        def resolve(ip):
+            calls.append(ip)
+            return {"8.8.8.8": "US", "5.0.0.1": "IR"}.get(ip, "")
+
+        stats = enrich_countries(resolve=resolve, batch_size=2)
+        self.assertEqual(sorted(calls), ["5.0.0.1", "8.8.8.8", "9.9.9.9"])
+        self.assertEqual(stats["sitevisit.country"], 3)
+        self.assertEqual(stats["youtubeclick.country"], 1)
+        self.assertEqual(SiteVisit.objects.filter(country="US").count(), 2)
+        self.assertEqual(SiteVisit.objects.get(ip_address="5.0.0.2").country, "DE")
+        self.assertEqual(SiteVisit.objects.get(ip_address="9.9.9.9").country, "")
+
+    def test_enrich_all_keeps_known_countries_on_failed_lookups(self):
+        SiteVisit.objects.create(path="/", method="GET", ip_address="8.8.8.8", country="US")
+        SiteVisit.objects.create(path="/", method="GET", ip_address="5.0.0.1", country="DE")
+        SiteVisit.objects.create(path="/", method="GET", ip_address="9.9.9.9", country="FR")
+
+        def resolve(ip):
+            return {"8.8.8.8": None, "5.0.0.1": "IR"}.get(ip, "")
+
+        today = timezone.localdate()
+        record_counts({(today, DailyTopK.Dimension.COUNTRY): {"US": 1, "DE": 1, "FR": 1}})
+
+        stats = enrich_countries(resolve=resolve, only_missing=False)
+        self.assertEqual(stats["sitevisit.country"], 1)
+        self.assertEqual(
+            dict(SiteVisit.objects.values_list("ip_address", "country")),
+            {"8.8.8.8": "US", "5.0.0.1": "IR", "9.9.9.9": "FR"},
+        )
+        # بازدید DE به IR منتقل شده است، نه اینکه دو بار شمرده شود
+        self.assertEqual(
+            dict(load(DailyTopK.Dimension.COUNTRY, today).top()), {"US": 1, "FR": 1, "IR": 1}
+        )
+
+
+class CachingResolverTests(TestCase):
+    class CountingResolver:
+        def __init__(self, answer, delay=0):
+            self.answer = answer
+            self.delay = delay
+            self.calls = 0
+
+        def resolve(self, ip):
+            self.calls += 1
+            time.sleep(self.delay)
+            return self.answer
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_negative_results_are_cached(self):
+        inner = self.CountingResolver("<html>rate limited</html>")
+        resolver = CachingResolver(inner)
+        self.assertEqual(resolver.resolve("8.8.8.8"), "")
+        self.assertEqual(resolver.resolve("8.8.8.8"), "")
+        self.assertEqual(inner.calls, 1)
+        # یک پروسس دیگر (LRU خالی) هم از cache جنگو استفاده می‌کند
+        self.assertEqual(CachingResolver(inner).resolve("8.8.8.8"), "")
+        self.assertEqual(inner.calls, 1)
+
+    def test_concurrent_lookups_are_coalesced(self):
+        inner = self.CountingResolver("us", delay=0.2)
+        resolver = CachingResolver(inner)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(resolver.resolve("1.1.1.1")))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(inner.calls, 1)
+        self.assertEqual(results, ["US"] * 5)
+
+    def test_lock_held_by_another_process_waits_for_its_result(self):
+        inner = self.CountingResolver("de")
+        resolver = CachingResolver(inner, wait_timeout=2, poll_interval=0.01)
+        cache.add(f"{CachingResolver.LOCK_PREFIX}1.1.1.1", 1, 2)
+        timer = threading.Timer(0.1, lambda: cache.set(f"{CachingResolver.CACHE_PREFIX}1.1.1.1", "US", 60))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(resolver.resolve("1.1.1.1"), "US")
+        self.assertEqual(inner.calls, 0)
+
+    def test_lock_timeout_and_upstream_errors_are_unknown(self):
+        inner = self.CountingResolver("de")
+        resolver = CachingResolver(inner, wait_timeout=0.1, poll_interval=0.01)
+        cache.add(f"{CachingResolver.LOCK_PREFIX}1.1.1.1", 1, 5)
+        self.assertIsNone(resolver.resolve("1.1.1.1"))
+
+        class FailingResolver:
+            calls = 0
+
+            def resolve(self, ip):
+                self.calls += 1
+                raise OSError("timeout")
+
+        failing = FailingResolver()
+        resolver = CachingResolver(failing)
+        self.assertIsNone(resolver.resolve("8.8.8.8"))
+        self.assertIsNone(resolver.resolve("8.8.8.8"))
+        self.assertEqual(failing.calls, 1)
+
+
+class HyperLogLogTests(TestCase):
+    def test_estimate_is_within_error_bound_and_mergeable(self):
+        first = HyperLogLog().update(f"10.0.{i // 256}.{i % 256}" for i in range(20000))
+        second = HyperLogLog().update(f"10.0.{i // 256}.{i % 256}" for i in range(10000, 30000))
+        self.assertEqual(HyperLogLog().update(["a", "b", "a"]).count(), 2)
+        self.assertLess(abs(first.count() - 20000) / 20000, 4 * first.standard_error)
+
+        union = HyperLogLog.union([HyperLogLog.from_bytes(first.to_bytes()), second])
+        self.assertLess(abs(union.count() - 30000) / 30000, 4 * union.standard_error)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for i in range(7):
+            message = ContactMessage.objects.create(name=f"n{i}", email="a@example.com", message="m")
+            # دو پیام با زمان یکسان: ترتیب با id شکسته می‌شود
+            ContactMessage.objects.filter(pk=message.pk).update(created_at=now - timedelta(minutes=min(i, 5)))
+        self.expected = list(ContactMessage.objects.order_by("-created_at", "-id").values_list("name", flat=True))
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        paginator = KeysetPaginator(ContactMessage.objects.all(), 3)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual([m.name for page in (first, second, third) for m in page], self.expected)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+        self.assertEqual([m.name for m in paginator.page(third.previous_cursor)], self.expected[3:6])
+        self.assertEqual(list(paginator.page(second.previous_cursor)), list(first))
+        self.assertFalse(paginator.page(second.previous_cursor).has_previous())
+        self.assertEqual(paginator.count, 7)
+
+        with self.assertRaises(InvalidCursor):
+            paginator.page("2")
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(ContactMessage.objects.all(), 3, ordering=("-created_at",)).page(first.next_cursor)
+
+    def test_estimated_count_is_capped(self):
+        self.assertEqual(estimate_count(ContactMessage.objects.all(), cap=5), (5, True))
+        self.assertEqual(estimate_count(ContactMessage.objects.all(), cap=10), (7, False))
+        self.assertIsNone(KeysetPaginator(ContactMessage.objects.all(), 3, count_mode=None).count)
+
+
+class SpaceSavingTests(TestCase):
+    def test_heavy_hitters_survive_eviction_and_merge(self):
+        summary = SpaceSaving(k=4)
+        for key in ["a"] * 50 + ["b"] * 30 + [f"rare-{i}" for i in range(40)] + ["c"] * 20:
+            summary.add(key)
+        self.assertEqual([key for key, _ in summary.top(2)], ["a", "b"])
+        # تعداد واقعی هر مقدار در بازه [count - error, count] است
+        count, error = summary.counters["a"]
+        self.assertLessEqual(count - error, 50)
+        self.assertGreaterEqual(count, 50)
+
+        exact = SpaceSaving.from_counts({"a": 5, "b": 4, "c": 1}, k=2)
+        self.assertEqual(exact.top(), [("a", 5), ("b", 4)])
+        self.assertEqual(exact.absent_bound(), 1)
+        merged = SpaceSaving.merge([SpaceSaving.from_dict(exact.to_dict()), SpaceSaving.from_counts({"c": 9}, k=2)], k=2)
+        self.assertEqual(merged.top(), [("c", 9), ("a", 5)])
+
+        # وزن منفی فقط از مقدار موجود کم می‌شود و مقدار تازه‌ای نمی‌سازد
+        merged.update({"c": -4, "z": -1})
+        self.assertEqual(merged.top(), [("a", 5), ("c", 5)])
+        self.assertNotIn("z", merged.counters)
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+        yesterday_noon = day_start(self.yesterday) + timedelta(hours=12)
+        referrer = Referrer.objects.create(value_hash="google", value="https://google.com/")
+        for path in ["/a/", "/a/", "/b/"]:
+            SiteVisit.objects.create(
+                path=path, method="GET", ip_address="1.1.1.1", referrer=referrer,
+                device_type="mobile", created_at=yesterday_noon,
+            )
+        SiteVisit.objects.create(path="/b/", method="GET", ip_address="2.2.2.2", created_at=timezone.now())
+        click = YouTubeClick.objects.create(youtube_url="https://youtu.be/abc", youtube_id="abc", ip_address="1.1.1.1")
+        YouTubeClick.objects.filter(pk=click.pk).update(created_at=yesterday_noon)
+
+    def test_pending_days_covers_completed_days_only(self):
+        self.assertEqual(pending_days(self.today), [self.yesterday])
+        rollup_day(self.yesterday)
+        # آخرین روز rollup شده دوباره پردازش می‌شود
+        self.assertEqual(pending_days(self.today), [self.yesterday])
+
+    def test_range_merges_rollups_with_raw_rows(self):
+        rollup_day(self.yesterday)
+        summary = DailyAnalyticsSummary.objects.get(day=self.yesterday)
+        self.assertEqual((summary.visits, summary.unique_ips, summary.youtube_clicks), (3, 1, 1))
+
+        stats_range = RollupRange(self.yesterday, today=self.today)
+        self.assertEqual(stats_range.cutoff_day, self.today)
+        self.assertEqual(stats_range.visit_totals()["visits"], 4)
+        self.assertEqual(
+            stats_range.top_visits("path"), [{"path": "/a/", "count": 2}, {"path": "/b/", "count": 2}]
+        )
+        self.assertEqual(stats_range.top_referrers(), [{"referrer": "https://google.com/", "count": 3}])
+        self.assertEqual(stats_range.click_totals()["clicks"], 1)
+        self.assertEqual([row["count"] for row in stats_range.visits_by_day()], [3, 1])
+
+    def test_unique_counts_merge_daily_sketches_with_raw_rows(self):
+        rollup_day(self.yesterday)
+        self.assertEqual(DailySketch.objects.filter(day=self.yesterday).count(), len(DailySketch.Metric))
+        # 1.1.1.1 دیروز (sketch) و 2.2.2.2 امروز (داده خام)؛ تکراری‌ها فقط یک بار شمرده می‌شوند
+        SiteVisit.objects.create(path="/c/", method="GET", ip_address="1.1.1.1", created_at=timezone.now())
+        stats_range = RollupRange(self.yesterday, today=self.today)
+        self.assertEqual(stats_range.unique(DailySketch.Metric.VISIT_IPS), 2)
+        self.assertEqual(stats_range.unique(DailySketch.Metric.CLICK_IPS), 1)
+
+    def test_device_uniques_merge_daily_sketches_with_raw_rows(self):
+        user = get_user_model().objects.create_user(username="mobile_user", password="pass12345")
+        visitor = AnonymousVisitor.objects.create(session_key="v1", first_ip="1.1.1.1", last_ip="1.1.1.1")
+        SiteVisit.objects.filter(device_type="mobile").update(anonymous_visitor=visitor)
+        rollup_day(self.yesterday)
+        # امروز: همان بازدیدکننده ناشناس و یک کاربر روی موبایل، یک IP تازه روی دسکتاپ
+        now = timezone.now()
+        SiteVisit.objects.create(path="/", method="GET", ip_address="1.1.1.1", device_type="mobile",
+                                 anonymous_visitor=visitor, created_at=now)
+        SiteVisit.objects.create(path="/", method="GET", ip_address="3.3.3.3", device_type="mobile",
+                                 user=user, created_at=now)
+        SiteVisit.objects.create(path="/", method="GET", ip_address="4.4.4.4", device_type="desktop", created_at=now)
+
+        Metric = DailySketch.Metric
+        uniques = RollupRange(self.yesterday, today=self.today).uniques(
+            [Metric.MOBILE_IPS, Metric.DESKTOP_IPS, Metric.UNKNOWN_DEVICE_IPS, Metric.MOBILE_ANONYMOUS,
+             Metric.MOBILE_USERS, Metric.DESKTOP_USERS]
+        )
+        self.assertEqual(
+            uniques,
+            {Metric.MOBILE_IPS: 2, Metric.DESKTOP_IPS: 1, Metric.UNKNOWN_DEVICE_IPS: 1, Metric.MOBILE_ANONYMOUS: 1,
+             Metric.MOBILE_USERS: 1, Metric.DESKTOP_USERS: 0},
+        )
+
+    def test_top_k_merges_rollup_and_ingest_summaries(self):
+        rollup_day(self.yesterday)
+        self.assertEqual(
+            DailyTopK.objects.get(day=self.yesterday, dimension=DailyTopK.Dimension.PATH).summary["items"],
+            [["/a/", 2, 0], ["/b/", 1, 0]],
+        )
+        write_visits([{"path": "/b/", "method": "GET", "ip_address": "2.2.2.2", "created_at": timezone.now()}])
+        stats_range = RollupRange(self.yesterday, today=self.today)
+        self.assertEqual(
+            stats_range.top_k(DailyTopK.Dimension.PATH, ["path"]),
+            [{"path": "/a/", "count": 2}, {"path": "/b/", "count": 2}],
+        )
+        self.assertEqual(
+            stats_range.top_k(DailyTopK.Dimension.REFERRER, ["referrer"]),
+            [{"referrer": "https://google.com/", "count": 3}],
+        )
+        self.assertEqual(
+            stats_range.top_k(DailyTopK.Dimension.YOUTUBE_VIDEO, ["youtube_id", "source_title", "source_type"]),
+            [{"youtube_id": "abc", "source_title": "", "source_type": "other", "count": 1}],
+        )
+
+    def test_top_rows_get_unique_ips_from_daily_key_sketches(self):
+        user = get_user_model().objects.create_user(username="clicker", password="pass12345")
+        YouTubeClick.objects.filter(youtube_id="abc").update(user=user, referrer=Referrer.objects.get())
+        rollup_day(self.yesterday)
+        # ردیف‌های خام دیروز دیگر خوانده نمی‌شوند (مثلاً پس از بایگانی)
+        SiteVisit.objects.filter(created_at__lt=day_start(self.today)).delete()
+        SiteVisit.objects.create(path="/b/", method="GET", ip_address="1.1.1.1", created_at=timezone.now())
+
+        stats_range = RollupRange(self.yesterday, today=self.today)
+        pages = stats_range.annotate_unique(
+            stats_range.top_k(DailyTopK.Dimension.PATH, ["path"]), DailyTopK.Dimension.PATH, "unique_ips"
+        )
+        self.assertEqual({row["path"]: row["unique_ips"] for row in pages}, {"/a/": 1, "/b/": 2})
+        video_fields = ["youtube_id", "source_title", "source_type"]
+        videos = stats_range.annotate_unique(
+            stats_range.top_k(DailyTopK.Dimension.YOUTUBE_VIDEO, video_fields), DailyTopK.Dimension.YOUTUBE_VIDEO, "unique_ips"
+        )
+        self.assertEqual(videos[0]["unique_ips"], 1)
+        self.assertEqual(
+            stats_range.top_k(DailyTopK.Dimension.YOUTUBE_USER, ["user_id"]), [{"user_id": user.id, "count": 1}]
+        )
+        self.assertEqual(
+            stats_range.top_k(DailyTopK.Dimension.YOUTUBE_REFERRER, ["referrer"]),
+            [{"referrer": "https://google.com/", "count": 1}],
+        )
+
+    def test_range_falls_back_to_raw_rows_without_rollups(self):
+        stats_range = RollupRange(self.yesterday, today=self.today)
+        self.assertEqual(stats_range.cutoff_day, self.yesterday)
+        self.assertEqual(stats_range.visit_totals()["visits"], 4)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.old_day = self.today - timedelta(days=40)
+        old_noon = day_start(self.old_day) + timedelta(hours=12)
+        for path in ["/old-1/", "/old-2/", "/old-3/"]:
+            SiteVisit.objects.create(path=path, method="GET", ip_address="1.1.1.1", created_at=old_noon)
+        SiteVisit.objects.create(path="/new/", method="GET", ip_address="2.2.2.2", created_at=timezone.now())
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_archive_writes_daily_files_and_deletes_in_batches(self):
+        cutoff = retention_cutoff(30, today=self.today)
+        built = ensure_rollups_before(cutoff)
+        # روزهای خالی هم summary می‌گیرند تا پوشش rollup پیوسته بماند
+        self.assertEqual((built[0], built[-1]), (self.old_day, self.today - timedelta(days=31)))
+        count = archive_rows(SiteVisit, cutoff, archive_dir=self.tmpdir.name, batch_size=2)
+        self.assertEqual(count, 3)
+        self.assertEqual(list(SiteVisit.objects.values_list("path", flat=True)), ["/new/"])
+
+        with gzip.open(archive_path(self.tmpdir.name, SiteVisit, self.old_day), "rt", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(sorted(row["path"] for row in rows), ["/old-1/", "/old-2/", "/old-3/"])
+        # rollup روز بایگانی‌شده باقی می‌ماند
+        self.assertEqual(DailyAnalyticsSummary.objects.get(day=self.old_day).visits, 3)
+
+    def test_rerun_after_interrupted_delete_does_not_duplicate_archive(self):
+        cutoff = retention_cutoff(30, today=self.today)
+        # اجرای قطع‌شده: فایل بایگانی نوشته شده ولی ردیف‌ها حذف نشده‌اند
+        archive_rows(SiteVisit, cutoff, archive_dir=self.tmpdir.name, batch_size=2, delete=False)
+        SiteVisit.objects.create(path="/old-4/", method="GET", ip_address="1.1.1.1",
+                                 created_at=day_start(self.old_day) + timedelta(hours=13))
+        self.assertEqual(archive_rows(SiteVisit, cutoff, archive_dir=self.tmpdir.name, batch_size=2), 4)
+        self.assertEqual(list(SiteVisit.objects.values_list("path", flat=True)), ["/new/"])
+
+        with gzip.open(archive_path(self.tmpdir.name, SiteVisit, self.old_day), "rt", encoding="utf-8") as f:
+            paths = [json.loads(line)["path"] for line in f]
+        self.assertEqual(paths, ["/old-1/", "/old-2/", "/old-3/", "/old-4/"])
+
+    def test_command_respects_retention_window(self):
+        call_command("archive_analytics", days=60, archive_dir=self.tmpdir.name, stdout=StringIO())
+        self.assertEqual(SiteVisit.objects.count(), 4)
+        call_command("archive_analytics", days=30, no_archive=True, stdout=StringIO())
+        self.assertEqual(SiteVisit.objects.count(), 1)
+
+
+class AnalyticsExportTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        referrer = Referrer.objects.create(value_hash="google", value="https://google.com/")
+        SiteVisit.objects.create(path="/old/", method="GET", created_at=day_start(self.today - timedelta(days=10)))
+        for path in ["/a/", "/b/", "/c/"]:
+            SiteVisit.objects.create(path=path, method="GET", ip_address="1.1.1.1", referrer=referrer)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_command_streams_date_range_to_csv(self):
+        output = os.path.join(self.tmpdir.name, "visits.csv.gz")
+        call_command("export_analytics", "--from", str(self.today), output=output, chunk_size=2, stdout=StringIO())
+        with gzip.open(output, "rt", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row["path"] for row in rows], ["/a/", "/b/", "/c/"])
+        # متن ارجاع‌دهنده به جای شناسه جدول interning
+        self.assertEqual(rows[0]["referrer"], "https://google.com/")
+        self.assertEqual(rows[0]["user_id"], "")
+
+    def test_admin_export_is_streamed(self):
+        user = get_user_model().objects.create_superuser("export_admin", "a@example.com", "pass12345")
+        self.client.force_login(user)
+        self.assertContains(self.client.get(reverse("admin:core_youtubeclick_changelist")), "/export/")
+        response = self.client.get(
+            reverse("admin:core_sitevisit_export"), {"from": str(self.today - timedelta(days=30))}
+        )
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith("id,user_id,anonymous_visitor_id,path"))
+        bad = self.client.get(reverse("admin:core_sitevisit_export"), {"from": "2026-02-30"})
+        self.assertEqual(bad.status_code, 400)
+
+
+class AnalyticsQueryBenchmarkTests(TestCase):
+    def test_seed_benchmark_and_cleanup(self):
+        out = StringIO()
+        call_command("benchmark_analytics_queries", seed=300, batch_size=100, repeat=1, stdout=out)
+        self.assertEqual(SiteVisit.objects.count(), 300)
+        self.assertIn("user visits by path", out.getvalue())
+
+        call_command("benchmark_analytics_queries", cleanup=True, stdout=StringIO())
+        self.assertEqual(SiteVisit.objects.count(), 0)
+        self.assertEqual(AnonymousVisitor.objects.count(), 0)
+
+
+class UserAgentParserTests(TestCase):
+    def test_device_browser_and_os_families(self):
+        cases = {
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0": ("desktop", "Edge", "Windows"),
+            "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+            "CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1": ("mobile", "Chrome", "iOS"),
+            "Mozilla/5.0 (Linux; Android 13; SM-X700) AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/124.0.0.0 Safari/537.36": ("tablet", "Chrome", "Android"),
+            "": ("unknown", "", ""),
+        }
+        for user_agent, expected in cases.items():
+            self.assertEqual(tuple(parse_user_agent(user_agent)), expected)
+
+    def test_windows_phone_wins_over_android_and_ios_tokens(self):
+        cases = {
+            "Mozilla/5.0 (Windows Phone 10.0; Android 6.0.1; Microsoft; Lumia 950) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/52.0.2743.116 Mobile Safari/537.36 Edge/15.15063": ("mobile", "Edge", "Windows Phone"),
+            "Mozilla/5.0 (Mobile; Windows Phone 8.1; Android 4.0; ARM; Trident/7.0; Touch; rv:11.0; IEMobile/11.0; "
+            "NOKIA; Lumia 635) like iPhone OS 7_0_3 Mac OS X AppleWebKit/537 (KHTML, like Gecko) Mobile Safari/537": (
+                "mobile",
+                "Internet Explorer",
+                "Windows Phone",
+            ),
+            # Android همچنان بر Linux اولویت دارد
+            "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/124.0.0.0 Mobile Safari/537.36": ("mobile", "Chrome", "Android"),
+        }
+        for user_agent, expected in cases.items():
+            self.assertEqual(tuple(parse_user_agent(user_agent)), expected)
+
+    def test_brand_names_on_desktop_are_not_mobile(self):
+        self.assertEqual(
+            detect_device_type("Mozilla/5.0 (Windows NT 10.0; Win64; x64; LGE Gram) Chrome/124.0 Safari/537.36"),
+            "desktop",
+        )
+        self.assertEqual(detect_device_type("Mozilla/5.0 (Windows NT 10.0; Sony Corporation) Firefox/125.0"), "desktop")
+        self.assertEqual(detect_device_type("LG-H870 Mozilla/5.0 (Linux; U) Mobile Safari/537.36"), "mobile")
@@ -0,0 +1,209 @@
+"""
+خلاصه Space-Saving برای پرتکرارترین مقادیر (صفحات، ارجاع‌دهنده‌ها، کشورها، ویدیوها و
+کاربران / ارجاع‌دهنده‌های کلیک‌های یوتیوب)
+
+برای هر روز و هر بُعد فقط K شمارنده در DailyTopK نگه داشته می‌شود:
+- هنگام ثبت (write_visits) خلاصه روز جاری به‌صورت افزایشی به‌روز می‌شود
+- rollup_day خلاصه روزهای کامل را از روی داده خام به‌صورت دقیق بازسازی می‌کند
+- پنل‌های داشبورد خلاصه روزهای بازه را ادغام می‌کنند، پس هزینه نمایش O(روزها × K) است
+
+هر شمارنده (count, error) است و تعداد واقعی در بازه [count - error, count] قرار دارد؛
+مقداری که در خلاصه نیست حداکثر floor بار دیده شده است. نتایج بر اساس کران پایین
+(count - error) مرتب و نمایش داده می‌شوند.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+def default_k():
+    return getattr(settings, "ANALYTICS_TOP_K", 200)
+
+
+def _freeze(key):
+    return tuple(key) if isinstance(key, list) else key
+
+
+class SpaceSaving:
+    def __init__(self, k=None, counters=None, floor=0):
+        self.k = max(int(k or default_k()), 1)
+        self.counters = counters if counters is not None else {}
+        self.floor = floor
+
+    def add(self, key, weight=1):
+        if weight <= 0:
+            if weight:
+                self.subtract(key, -weight)
+            return
+        entry = self.counters.get(key)
+        if entry is not None:
+            entry[0] += weight
+            return
+        if len(self.counters) < self.k:
+            # مقدار جدید ممکن است پیش‌تر تا floor بار دیده و حذف شده باشد
+            self.counters[key] = [weight + self.floor, self.floor]
+            return
+        # جایگزینی کم‌تکرارترین شمارنده (الگوریتم Space-Saving)
+        victim = min(self.counters, key=lambda item: self.counters[item][0])
+        minimum = self.counters.pop(victim)[0]
+        self.floor = max(self.floor, minimum)
+        self.counters[key] = [minimum + weight, minimum]
+
+    def subtract(self, key, weight):
+        """
+        کم کردن weight از مقدار key (مثلاً وقتی کشور ردیف‌های خام عوض می‌شود)
+
+        برای مقداری که در خلاصه نیست کاری انجام نمی‌شود: تعداد واقعی آن حداکثر floor
+        است و این کران بالا با کم شدن تعداد هم معتبر می‌ماند.
+        """
+        entry = self.counters.get(key)
+        if entry is None:
+            return
+        entry[0] = max(entry[0] - weight, 0)
+        entry[1] = min(entry[1], entry[0])
+
+    def update(self, counts):
+        """افزودن {key: weight}؛ وزن منفی با subtract کم می‌شود"""
+        for key, weight in counts.items():
+            self.add(key, weight)
+        return self
+
+    def absent_bound(self):
+        """
+        حداکثر تعداد ممکن برای مقداری که در خلاصه نیست
+
+        هر مقدار حذف‌شده هنگام حذف حداکثر floor بار دیده شده بود (floor همان بیشینه
+        شمارنده‌های حذف‌شده است) و این کران از کمینه شمارنده‌های فعلی دقیق‌تر است.
+        """
+        return self.floor
+
+    @classmethod
+    def from_counts(cls, counts, k=None):
+        """خلاصه دقیق از شمارش کامل: K مقدار برتر بدون خطا"""
+        summary = cls(k)
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        summary.counters = {key: [count, 0] for key, count in ranked[: summary.k]}
+        summary.floor = ranked[summary.k][1] if len(ranked) > summary.k else 0
+        return summary
+
+    @classmethod
+    def merge(cls, summaries, k=None):
+        """
+        ادغام خلاصه‌های چند روز
+
+        برای هر مقدار، در روزهایی که در خلاصه نبوده کران بالای آن روز به خطا اضافه می‌شود.
+        """
+        summaries = list(summaries)
+        result = cls(k)
+        if not summaries:
+            return result
+        bounds = [summary.absent_bound() for summary in summaries]
+        keys = set()
+        for summary in summaries:
+            keys.update(summary.counters)
+        merged = {}
+        for key in keys:
+            count = error = 0
+            for summary, bound in zip(summaries, bounds):
+                entry = summary.counters.get(key)
+                if entry is None:
+                    count += bound
+                    error += bound
+                else:
+                    count += entry[0]
+                    error += entry[1]
+            merged[key] = [count, error]
+        ranked = sorted(merged.items(), key=lambda item: (item[1][1] - item[1][0], str(item[0])))
+        result.counters = dict(ranked[: result.k])
+        dropped = max((count for _, (count, _) in ranked[result.k :]), default=0)
+        result.floor = max(sum(bounds), dropped)
+        return result
+
+    def top(self, limit=None):
+        """[(key, count)] بر اساس کران پایین تعداد، نزولی"""
+        # ترتیب ثابت برای مقادیر هم‌تعداد تا صفحه‌بندی بین درخواست‌ها جابه‌جا نشود
+        ranked = sorted(
+            ((key, count - error) for key, (count, error) in self.counters.items()),
+            key=lambda item: (-item[1], str(item[0])),
+        )
+        return [item for item in ranked[:limit] if item[1] > 0]
+
+    def to_dict(self):
+        items = [
+            [list(key) if isinstance(key, tuple) else key, count, error]
+            for key, (count, error) in self.counters.items()
+        ]
+        return {"k": self.k, "floor": self.floor, "items": items}
+
+    @classmethod
+    def from_dict(cls, data):
+        counters = {_freeze(key): [count, error] for key, count, error in data.get("items", [])}
+        return cls(data.get("k"), counters, data.get("floor", 0))
+
+
+def visit_counts(visits):
+    """{(day, dimension): {key: weight}} برای ردیف‌های SiteVisit"""
+    from .models import DailyTopK
+
+    counts = {}
+    for visit in visits:
+        day = timezone.localdate(visit.created_at)
+        keys = [(DailyTopK.Dimension.PATH, visit.path)]
+        if visit.country:
+            keys.append((DailyTopK.Dimension.COUNTRY, visit.country))
+        if visit.referrer_id:
+            keys.append((DailyTopK.Dimension.REFERRER, visit.referrer_id))
+        for dimension, key in keys:
+            bucket = counts.setdefault((day, dimension), Counter())
+            bucket[key] += visit.sample_weight
+    return counts
+
+
+def click_counts(clicks):
+    """{(day, dimension): {key: weight}} برای ردیف‌های YouTubeClick"""
+    from .models import DailyTopK
+
+    counts = {}
+    for click in clicks:
+        day = timezone.localdate(click.created_at)
+        keys = []
+        if click.youtube_id:
+            keys.append((DailyTopK.Dimension.YOUTUBE_VIDEO, (click.youtube_id, click.source_title, click.source_type)))
+        if click.user_id:
+            keys.append((DailyTopK.Dimension.YOUTUBE_USER, click.user_id))
+        if click.referrer_id:
+            keys.append((DailyTopK.Dimension.YOUTUBE_REFERRER, click.referrer_id))
+        for dimension, key in keys:
+            bucket = counts.setdefault((day, dimension), Counter())
+            bucket[key] += click.sample_weight
+    return counts
+
+
+def record_counts(counts):
+    """
+    به‌روزرسانی افزایشی خلاصه‌های DailyTopK با قفل سطری
+
+    ردیف‌ها به ترتیب ثابت قفل می‌شوند تا نویسنده‌های همزمان به بن‌بست نخورند؛
+    داخل تراکنش بیرونی (write_visits) savepoint جداگانه ساخته نمی‌شود.
+    """
+    from .models import DailyTopK
+
+    with transaction.atomic(savepoint=False):
+        for (day, dimension), bucket in sorted(counts.items()):
+            row, _ = DailyTopK.objects.select_for_update().get_or_create(
+                day=day, dimension=dimension, defaults={"summary": {}}
+            )
+            row.summary = SpaceSaving.from_dict(row.summary).update(bucket).to_dict()
+            row.save(update_fields=["summary"])
+
+
+def load(dimension, first_day, last_day=None):
+    """خلاصه ادغام‌شده یک بُعد برای روزهای first_day تا last_day (پیش‌فرض: امروز)"""
+    from .models import DailyTopK
+
+    rows = DailyTopK.objects.filter(dimension=dimension, day__gte=first_day)
+    if last_day is not None:
+        rows = rows.filter(day__lte=last_day)
+    return SpaceSaving.merge(SpaceSaving.from_dict(summary) for summary in rows.values_list("summary", flat=True))
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.views.generic import TemplateView
-from .views import HomeView, AboutView, ContactView, YouTubeClickView
+from .views import HomeView, AboutView, ContactView, YouTubeClickBatchView, YouTubeClickView
 
 app_name = "core"
 
@@ -11,6 +11,7 @@ urlpatterns = [
     path("test-header/", TemplateView.as_view(template_name="test-header.html"), name="test_header"),
     path("robots.txt", TemplateView.as_view(template_name="robots.txt", content_type="text/plain")),
     path("api/youtube-click/", YouTubeClickView.as_view(), name="youtube_click"),
+    path("api/youtube-clicks/", YouTubeClickBatchView.as_view(), name="youtube_click_batch"),
 ]
 
 
@@ -0,0 +1,194 @@
+"""
+تشخیص نوع دستگاه، خانواده مرورگر و سیستم‌عامل از روی User Agent
+
+همه کلیدواژه‌ها در یک regex از پیش کامپایل‌شده (یک alternation پس از پیشوند ثابت
+فاصله) قرار دارند و رشته فقط یک بار پیمایش می‌شود؛ متن هر تطبیق با یک dict به
+bitmask ردیف جدول کلیدواژه‌ها نگاشت می‌شود و نتیجه از OR این ماسک‌ها به دست می‌آید.
+نتیجه برای هر رشته در یک LRU محدود نگه داشته می‌شود، چون تعداد User Agent های
+متمایز کم است؛ بهبود سرعت در ترافیک واقعی از همین LRU است و هزینه تشخیص یک رشته
+جدید تقریباً با روش قبلی (چند جست‌وجوی زیررشته) برابر است.
+
+کلیدواژه‌ها فقط در ابتدای کلمه (ابتدای رشته، پس از فاصله یا " (") تطبیق داده
+می‌شوند تا رشته‌هایی مثل "lg" یا "mib" داخل کلمات دیگر باعث تشخیص اشتباه نشوند.
+نام برندها (samsung، lg، sony، ...) فقط وقتی موبایل حساب می‌شوند که سیستم‌عامل
+دسکتاپ در رشته نباشد.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+UserAgentInfo = namedtuple("UserAgentInfo", ["device_type", "browser", "os"])
+
+DEVICE_TABLET = "tablet"
+DEVICE_MOBILE = "mobile"
+DEVICE_DESKTOP = "desktop"
+DEVICE_UNKNOWN = "unknown"
+
+# نقش‌های دستگاه (به ترتیب اولویت)
+_TABLET, _MOBILE, _BRAND = 0, 1, 2
+
+# (الگوها، نقش دستگاه، مرورگر، سیستم‌عامل، سیستم‌عامل دسکتاپ)
+# الگوها روی رشته کوچک‌شده و در ابتدای کلمه تطبیق داده می‌شوند. ترتیب ردیف‌ها
+# اولویت را مشخص می‌کند؛ الگوهای طولانی‌تر باید قبل از پیشوندهای خود بیایند
+# چون در هر موقعیت اولین گزینه انتخاب می‌شود.
+_TOKENS = [
+    # مرورگرها
+    (("edg/", "edge/", "edga/", "edgios/"), None, "Edge", None, False),
+    (("opera mini", "opera mobi"), _MOBILE, "Opera", None, False),
+    (("opr/", r"opera\b"), None, "Opera", None, False),
+    (("samsungbrowser/",), None, "Samsung Internet", None, False),
+    (("yabrowser/",), None, "Yandex", None, False),
+    (("ucbrowser/",), None, "UC Browser", None, False),
+    (("fxios/", "firefox/"), None, "Firefox", None, False),
+    (("crios/", "chrome/", "chromium/"), None, "Chrome", None, False),
+    (("msie ", "trident/"), None, "Internet Explorer", None, False),
+    (("iemobile",), _MOBILE, "Internet Explorer", None, False),
+    (("silk/",), _MOBILE, "Silk", None, False),
+    (("safari/",), None, "Safari", None, False),
+    # سیستم‌عامل‌ها
+    (("windows phone",), _MOBILE, None, "Windows Phone", False),
+    (("iphone", "ipod"), _MOBILE, None, "iOS", False),
+    (("ipad",), _TABLET, None, "iOS", False),
+    (("android",), None, None, "Android", False),
+    ((r"cros\b",), None, None, "Chrome OS", True),
+    (("windows nt", r"windows (?:xp|7|8|10|11)\b"), None, None, "Windows", True),
+    (("macintosh", "mac os x"), None, None, "macOS", True),
+    (("blackberry", r"bb10\b"), _MOBILE, None, "BlackBerry", False),
+    (("webos", "hpwos"), _MOBILE, None, "webOS", False),
+    (("symbian",), _MOBILE, None, "Symbian", False),
+    (("x11", "linux"), None, None, "Linux", True),
+    # نشانه‌های تبلت
+    (("tablet", "kindle fire", "playbook", "galaxy tab", "xoom", "touchpad"), _TABLET, None, None, False),
+    ((r"kf[a-z]{2,4}\b", r"nexus (?:7|9|10)\b", r"sm-[tpx]\d{3}"), _TABLET, None, None, False),
+    # نشانه‌های موبایل
+    (("mobile", r"mobi\b", "palm", "fennec", "maemo", "kindle", "miui"), _MOBILE, None, None, False),
+    # برندها (نشانه ضعیف)
+    (
+        ("huawei", "samsung", "sonyericsson", r"sony\b", "motorola", "xiaomi", "redmi", "oneplus",
+         "oppo", "vivo", "realme", "meizu", "zte", "nokia", "lge", "lg-", "lg_"),
+        _BRAND, None, None, False,
+    ),
+]
+
+_LITERAL_RE = re.compile(r"[a-z0-9 /_-]+")
+
+# برای "iPhone ... like Mac OS X" و "Android ... Linux" سیستم‌عامل دقیق‌تر اولویت دارد؛
+# Windows Phone خود را Android و iPhone هم معرفی می‌کند پس پیش از هر دو می‌آید
+_OS_PRIORITY = ["Windows Phone", "iOS", "Android", "BlackBerry", "webOS", "Symbian", "Chrome OS", "Windows", "macOS", "Linux"]
+_BROWSER_PRIORITY = [token[2] for token in _TOKENS if token[2]]
+
+# هر ردیف جدول به یک bitmask تبدیل می‌شود و نتیجه از OR ماسک کلیدواژه‌های پیدا‌شده
+# به دست می‌آید: بیت‌های 0 تا 15 رتبه مرورگر، 16 تا 31 رتبه سیستم‌عامل (کم‌ارزش‌ترین
+# بیت روشن = بالاترین اولویت) و بیت‌های بعدی نقش دستگاه و سیستم‌عامل دسکتاپ.
+_OS_SHIFT = 16
+_RANK_MASK = (1 << _OS_SHIFT) - 1
+_ROLE_BITS = {_TABLET: 1 << 32, _MOBILE: 1 << 33, _BRAND: 1 << 34}
+_DESKTOP_OS_BIT = 1 << 35
+_ANDROID_BIT = 1 << (_OS_SHIFT + _OS_PRIORITY.index("Android"))
+
+
+def _row_mask(token):
+    _patterns, role, browser, os_family, desktop = token
+    mask = _ROLE_BITS.get(role, 0)
+    if browser:
+        mask |= 1 << _BROWSER_PRIORITY.index(browser)
+    if os_family:
+        mask |= 1 << (_OS_SHIFT + _OS_PRIORITY.index(os_family))
+    if desktop:
+        mask |= _DESKTOP_OS_BIT
+    return mask
+
+
+# متن تطبیق‌داده‌شده -> ماسک (برای کلیدواژه‌های ثابت) و لیست الگوهای regex برای بقیه
+_LITERALS = {}
+_PATTERNS = []
+
+
+def _build_token_re():
+    """
+    یک alternation پس از پیشوند ثابت " "؛ جستجوی پیشوند ثابت در
+    موتور regex بسیار سریع‌تر از lookbehind در هر موقعیت رشته است. گزینه‌ها بر اساس
+    حرف اول دسته‌بندی می‌شوند تا در هر موقعیت فقط چند شاخه امتحان شود. فاصله
+    پایانی کلیدواژه (مثل "msie ") با lookahead بررسی می‌شود تا برای کلیدواژه بعدی
+    مصرف نشود.
+    """
+    branches = {}
+    for token in _TOKENS:
+        mask = _row_mask(token)
+        for alternative in token[0]:
+            if _LITERAL_RE.fullmatch(alternative):
+                key = alternative.rstrip(" ")
+                _LITERALS.setdefault(key, mask)
+                body = re.escape(key) + ("(?= )" if key != alternative else "")
+            else:
+                body = alternative
+                _PATTERNS.append((re.compile(alternative), mask))
+            branches.setdefault(alternative[0], []).append(body[1:])
+    return re.compile(" (" + "|".join(f"{char}(?:{'|'.join(rest)})" for char, rest in branches.items()) + ")")
+
+
+_TOKEN_RE = _build_token_re()
+_findall = _TOKEN_RE.findall
+
+
+def _pattern_mask(text):
+    for pattern, mask in _PATTERNS:
+        if pattern.fullmatch(text):
+            return mask
+    return 0
+
+
+def _classify(user_agent):
+    mask = 0
+    literals = _LITERALS
+    # فاصله ابتدایی برای کلیدواژه اول رشته و حذف "(" پس از فاصله برای کلمه داخل پرانتز
+    for text in _findall(" " + user_agent.lower().replace(" (", " ")):
+        mask |= literals.get(text) or _pattern_mask(text)
+    # نتیجه فقط به مجموعه ردیف‌های پیدا‌شده بستگی دارد و تعداد ترکیب‌های متمایز کم است
+    info = _RESULTS.get(mask)
+    if info is None:
+        info = _info(mask)
+        if len(_RESULTS) < _RESULTS_SIZE:
+            _RESULTS[mask] = info
+    return info
+
+
+_RESULTS = {}
+_RESULTS_SIZE = 4096
+
+
+def _lowest(bits, names):
+    return names[(bits & -bits).bit_length() - 1] if bits else ""
+
+
+def _info(mask):
+    if mask & _ROLE_BITS[_TABLET]:
+        device_type = DEVICE_TABLET
+    elif mask & _ROLE_BITS[_MOBILE]:
+        device_type = DEVICE_MOBILE
+    elif mask & _ANDROID_BIT:
+        # اندروید بدون "Mobile" معمولاً تبلت است
+        device_type = DEVICE_TABLET
+    elif mask & _ROLE_BITS[_BRAND] and not mask & _DESKTOP_OS_BIT:
+        device_type = DEVICE_MOBILE
+    else:
+        device_type = DEVICE_DESKTOP
+    return UserAgentInfo(
+        device_type,
+        _lowest(mask & _RANK_MASK, _BROWSER_PRIORITY),
+        _lowest((mask >> _OS_SHIFT) & _RANK_MASK, _OS_PRIORITY),
+    )
+
+
+@lru_cache(maxsize=4096)
+def parse_user_agent(user_agent):
+    """
+    نوع دستگاه، خانواده مرورگر و سیستم‌عامل برای یک User Agent
+
+    Returns:
+        UserAgentInfo(device_type, browser, os)؛ مقادیر ناشناخته رشته خالی هستند
+    """
+    if not user_agent:
+        return UserAgentInfo(DEVICE_UNKNOWN, "", "")
+    return _classify(user_agent[:1000])
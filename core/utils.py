@@ -5,7 +5,6 @@ import logging
 import requests
 import ipaddress
 import re
-from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
@@ -44,13 +43,16 @@ def validate_ip_address(ip_str):
 def get_country_from_ip(ip_address):
     """
     تشخیص کشور بر اساس IP address
-    استفاده از ipapi.co API (رایگان تا 1000 درخواست در روز)
+    به‌صورت پیش‌فرض از پایگاه داده محلی (core.geoip) استفاده می‌شود و
+    هیچ درخواست شبکه‌ای انجام نمی‌دهد. با GEOIP_BACKEND = "http" رفتار قدیمی
+    (ipapi.co و ip-api.com) فعال می‌شود.
     
     Args:
         ip_address: آدرس IP
         
     Returns:
-        کد کشور دو حرفی (مثل 'IR', 'US') یا رشته خالی در صورت خطا
+        کد کشور دو حرفی (مثل 'IR', 'US')، رشته خالی اگر کشوری برای IP یافت نشود
+        یا None اگر کشور فعلاً معلوم نباشد (مثلاً خطای موقت resolver)
     """
     if not ip_address or ip_address in ['127.0.0.1', 'localhost', '::1']:
         return ''
@@ -60,15 +62,24 @@ def get_country_from_ip(ip_address):
     if not clean_ip:
         return ''
     
-    # بررسی cache برای جلوگیری از درخواست‌های تکراری
-    cache_key = f'country_ip_{clean_ip}'
-    cached_country = cache.get(cache_key)
-    if cached_country is not None:
-        return cached_country
+    from .geoip import get_resolver
+    return get_resolver().resolve(clean_ip)
+
+
+def lookup_country_http(ip_address):
+    """
+    تشخیص کشور با ipapi.co API (رایگان تا 1000 درخواست در روز)
+    و در صورت خطا با ip-api.com
+
+    این تابع cache ندارد؛ cache مثبت/منفی و حذف درخواست‌های همزمان تکراری
+    در core.geoip.CachingResolver انجام می‌شود.
+    """
+    clean_ip = validate_ip_address(ip_address)
+    if not clean_ip:
+        return ''
     
     try:
         # استفاده از ipapi.co API
-        # می‌توانید از API های دیگر مثل ip-api.com هم استفاده کنید
         response = requests.get(
             f'https://ipapi.co/{clean_ip}/country_code/',
             timeout=3,
@@ -79,9 +90,7 @@ def get_country_from_ip(ip_address):
             country_code = response.text.strip()
             # اعتبارسنجی کد کشور (باید 2 حرف باشد)
             if len(country_code) == 2 and country_code.isalpha():
-                # ذخیره در cache برای 24 ساعت
-                cache.set(cache_key, country_code, 86400)
-                return country_code
+                return country_code.upper()
         
         # در صورت خطا، از API جایگزین استفاده کن
         return _get_country_from_ip_api(clean_ip)
@@ -114,9 +123,7 @@ def _get_country_from_ip_api(ip_address):
             data = response.json()
             country_code = data.get('countryCode', '')
             if len(country_code) == 2 and country_code.isalpha():
-                cache_key = f'country_ip_{clean_ip}'
-                cache.set(cache_key, country_code, 86400)
-                return country_code
+                return country_code.upper()
     except Exception as e:
         logger.warning(f"خطا در API جایگزین برای IP {clean_ip}: {str(e)}")
     
@@ -133,39 +140,9 @@ def detect_device_type(user_agent):
     Returns:
         'mobile', 'tablet', 'desktop', یا 'unknown'
     """
-    if not user_agent:
-        return 'unknown'
-    
-    user_agent_lower = user_agent.lower()
-    
-    # تشخیص موبایل
-    mobile_keywords = [
-        'mobile', 'android', 'iphone', 'ipod', 'blackberry', 
-        'windows phone', 'opera mini', 'opera mobi', 'iemobile',
-        'mobile safari', 'webos', 'palm', 'symbian', 'nokia',
-        'fennec', 'maemo', 'mib', 'kindle', 'silk', 'miui',
-        'huawei', 'samsung', 'lg', 'sony', 'motorola', 'xiaomi',
-        'oneplus', 'oppo', 'vivo', 'realme', 'meizu', 'zte'
-    ]
-    
-    # تشخیص تبلت
-    tablet_keywords = [
-        'tablet', 'ipad', 'playbook', 'kindle fire', 'nexus 7',
-        'nexus 10', 'galaxy tab', 'surface', 'xoom', 'touchpad'
-    ]
-    
-    # بررسی تبلت
-    for keyword in tablet_keywords:
-        if keyword in user_agent_lower:
-            return 'tablet'
-    
-    # بررسی موبایل
-    for keyword in mobile_keywords:
-        if keyword in user_agent_lower:
-            return 'mobile'
-    
-    # اگر هیچکدام نبود، دسکتاپ است
-    return 'desktop'
+    from .useragents import parse_user_agent
+
+    return parse_user_agent(user_agent).device_type
 
 
 def get_device_type_display(device_type):
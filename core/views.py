@@ -2,9 +2,12 @@ from django.views.generic import TemplateView, FormView, View
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from urllib.parse import urlparse, parse_qs
+import json
 from .forms import ContactForm
 from .models import YouTubeClick
 from courses.models import Video
@@ -209,78 +212,97 @@ class ContactView(FormView):
 
 
 class YouTubeClickView(View):
-    """API endpoint برای ثبت کلیک‌های یوتیوب"""
-    
+    """
+    API endpoint برای ثبت یک کلیک یوتیوب (فرم POST)
+
+    کلیک مثل API دسته‌ای از فیلتر ربات، نمونه‌برداری و صف آمار (بافر / spool)
+    می‌گذرد و در core.analytics.write_visits نوشته می‌شود. ردیف هنگام پاسخ هنوز
+    ساخته نشده است؛ click_id فقط برای سازگاری با کلاینت‌های قدیمی در پاسخ مانده،
+    همیشه None است و منسوخ شده (به جای آن queued را بخوانید).
+    """
+
+    MAX_EVENTS = 50
+
     def post(self, request):
+        youtube_url = request.POST.get("youtube_url", "").strip()
+        if not youtube_url:
+            return JsonResponse({"success": False, "error": "youtube_url is required"}, status=400)
+        youtube_id = self._extract_youtube_id(youtube_url[:200])
+        if not youtube_id:
+            return JsonResponse({"success": False, "error": "youtube_url is not a YouTube video URL"}, status=400)
+        event = {
+            "youtube_url": youtube_url,
+            "source_type": request.POST.get("source_type"),
+            "source_id": request.POST.get("source_id"),
+            "source_title": request.POST.get("source_title"),
+        }
+        from .visitors import set_visitor_cookie
         try:
-            youtube_url = request.POST.get("youtube_url", "").strip()
-            source_type = request.POST.get("source_type", "other")
-            source_id = request.POST.get("source_id")
-            source_title = request.POST.get("source_title", "").strip()
-            
-            if not youtube_url:
-                return JsonResponse({"success": False, "error": "youtube_url is required"}, status=400)
-            
-            # استخراج شناسه ویدیو یوتیوب
-            youtube_id = self._extract_youtube_id(youtube_url)
-            
-            # دریافت اطلاعات کاربر و درخواست
-            user = request.user if request.user.is_authenticated else None
-            ip_address = self._get_client_ip(request)
-            user_agent = request.META.get("HTTP_USER_AGENT", "")
-            referrer = request.META.get("HTTP_REFERER", "")
-            
-            # تشخیص کشور بر اساس IP
-            from .utils import get_country_from_ip
-            country = get_country_from_ip(ip_address) if ip_address else ""
-            
-            # مدیریت بازدیدکنندگان ناشناس
-            anonymous_visitor = None
-            if not user:
-                from .models import AnonymousVisitor
-                # اطمینان از وجود session
-                if not request.session.session_key:
-                    request.session.create()
-                session_key = request.session.session_key
-                if session_key:
-                    anonymous_visitor, _ = AnonymousVisitor.objects.get_or_create(
-                        session_key=session_key,
-                        defaults={
-                            "first_ip": ip_address or "",
-                            "first_country": country,
-                            "first_user_agent": user_agent,
-                        }
-                    )
-                    # به‌روزرسانی اطلاعات آخرین بازدید
-                    anonymous_visitor.last_ip = ip_address or ""
-                    anonymous_visitor.last_country = country
-                    anonymous_visitor.last_user_agent = user_agent
-                    anonymous_visitor.save(update_fields=["last_ip", "last_country", "last_user_agent", "last_seen"])
-            
-            # ثبت کلیک
-            click = YouTubeClick.objects.create(
-                user=user,
-                anonymous_visitor=anonymous_visitor,
-                youtube_url=youtube_url,
-                youtube_id=youtube_id or "",
-                source_type=source_type,
-                source_id=int(source_id) if source_id and source_id.isdigit() else None,
-                source_title=source_title,
-                ip_address=ip_address,
-                country=country,
-                user_agent=user_agent,
-                referrer=referrer,
-            )
-            
-            return JsonResponse({
-                "success": True,
-                "click_id": click.id,
-                "youtube_id": youtube_id,
-            })
-            
+            queued = self._record_events(request, [event])
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)}, status=500)
-    
+        return set_visitor_cookie(request, JsonResponse({
+            "success": True,
+            # منسوخ: کلیک در صف آمار است و هنوز شناسه ردیف ندارد
+            "click_id": None,
+            "youtube_id": youtube_id,
+            "queued": bool(queued),
+        }))
+
+    def _record_events(self, request, events):
+        """
+        اعتبارسنجی رویدادهای کلیک و قرار دادن آن‌ها در صف آمار؛ تعداد رکوردهای صف‌شده
+
+        درخواست ربات‌ها و کلیک‌های حذف‌شده در نمونه‌برداری ثبت نمی‌شوند.
+        """
+        from .analytics import record_clicks
+        from .bots import classify_bot
+        from .sampling import sample_weight
+        from .visitors import get_visitor_id
+
+        user = request.user if request.user.is_authenticated else None
+        ip_address = self._get_client_ip(request)
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
+        if not user and classify_bot(user_agent, ip_address):
+            return 0
+
+        now = timezone.now()
+        base = {
+            "user_id": user.pk if user else None,
+            "session_key": None if user else get_visitor_id(request),
+            "ip_address": ip_address or "",
+            "user_agent": user_agent[:500],
+            "referrer": request.META.get("HTTP_REFERER", "")[:500],
+            "created_at": now,
+        }
+        source_types = set(YouTubeClick.ClickSource.values)
+        records = []
+        for event in events[: self.MAX_EVENTS]:
+            if not isinstance(event, dict):
+                continue
+            youtube_url = str(event.get("youtube_url") or "").strip()[:200]
+            youtube_id = self._extract_youtube_id(youtube_url)
+            if not youtube_id:
+                continue
+            weight = sample_weight(f"youtube:{youtube_id}") if not user else 1
+            if not weight:
+                continue
+            source_type = event.get("source_type")
+            source_id = str(event.get("source_id") or "")
+            records.append({
+                **base,
+                "youtube_url": youtube_url,
+                "youtube_id": youtube_id[:20],
+                "source_type": source_type if source_type in source_types else "other",
+                "source_id": int(source_id) if source_id.isdigit() else None,
+                "source_title": str(event.get("source_title") or "").strip()[:255],
+                "sample_weight": weight,
+            })
+
+        if records:
+            record_clicks(records)
+        return len(records)
+
     def _extract_youtube_id(self, url):
         """استخراج شناسه ویدیو از URL یوتیوب"""
         if not url:
@@ -312,4 +334,44 @@ class YouTubeClickView(View):
         return ip
 
 
+
+@method_decorator(csrf_exempt, name="dispatch")
+class YouTubeClickBatchView(YouTubeClickView):
+    """
+    API دسته‌ای برای ثبت کلیک‌های یوتیوب (ارسال با navigator.sendBeacon)
+
+    بدنه: آرایه JSON از {"youtube_url", "source_type", "source_id", "source_title"}.
+    رویدادها اعتبارسنجی و در صف آمار قرار می‌گیرند و پاسخ فوراً 204 است؛
+    کشور، بازدیدکننده و درج با یک bulk_create در core.analytics.write_visits انجام می‌شود.
+    sendBeacon هدر CSRF نمی‌فرستد، پس فقط درخواست‌های هم‌مبدأ پذیرفته می‌شوند.
+    """
+
+    MAX_BODY_SIZE = 64 * 1024
+
+    def post(self, request):
+        origin = request.META.get("HTTP_ORIGIN")
+        if origin and urlparse(origin).netloc != request.get_host():
+            return HttpResponse(status=403)
+        # پیش از خواندن request.body تا بدنه بزرگ در حافظه بارگذاری نشود
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return HttpResponse(status=400)
+        if content_length > self.MAX_BODY_SIZE:
+            return HttpResponse(status=413)
+        try:
+            events = json.loads(request.body or b"[]")
+        except ValueError:
+            return HttpResponse(status=400)
+        if isinstance(events, dict):
+            events = [events]
+        if not isinstance(events, list):
+            return HttpResponse(status=400)
+
+        from .visitors import set_visitor_cookie
+        self._record_events(request, events)
+        return set_visitor_cookie(request, HttpResponse(status=204))
+
+
+
 # Create your views here.
@@ -0,0 +1,57 @@
+"""
+شناسه بازدیدکننده ناشناس برای آمار با یک کوکی امضاشده first-party
+
+به جای ساختن session در پایگاه داده برای هر بازدیدکننده (و هر crawler)،
+یک شناسه تصادفی در کوکی امضاشده ذخیره می‌شود. اگر کاربر از قبل session
+داشته باشد، کلید همان session به عنوان شناسه پذیرفته می‌شود تا ردیف‌های
+قبلی AnonymousVisitor ادامه پیدا کنند.
+"""
+import secrets
+
+from django.conf import settings
+
+
+SIGNING_SALT = "core.visitors"
+
+
+def _cookie_name():
+    return getattr(settings, "ANALYTICS_VISITOR_COOKIE_NAME", "sami_vid")
+
+
+def get_visitor_id(request):
+    """
+    شناسه بازدیدکننده ناشناس این درخواست
+
+    اگر کوکی معتبر نباشد شناسه جدید ساخته می‌شود؛ کوکی آن با
+    set_visitor_cookie روی پاسخ تنظیم می‌شود.
+    """
+    visitor_id = getattr(request, "_analytics_visitor_id", None)
+    if visitor_id:
+        return visitor_id
+
+    visitor_id = request.get_signed_cookie(_cookie_name(), default=None, salt=SIGNING_SALT)
+    if not visitor_id:
+        session = getattr(request, "session", None)
+        visitor_id = session.session_key if session is not None else None
+        if not visitor_id:
+            visitor_id = secrets.token_hex(16)
+        request._analytics_new_visitor_id = True
+    request._analytics_visitor_id = visitor_id
+    return visitor_id
+
+
+def set_visitor_cookie(request, response):
+    """تنظیم کوکی شناسه بازدیدکننده، فقط اگر در همین درخواست ساخته شده باشد"""
+    if not getattr(request, "_analytics_new_visitor_id", False):
+        return response
+    response.set_signed_cookie(
+        _cookie_name(),
+        request._analytics_visitor_id,
+        salt=SIGNING_SALT,
+        max_age=getattr(settings, "ANALYTICS_VISITOR_COOKIE_AGE", 365 * 86400),
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+    request._analytics_new_visitor_id = False
+    return response
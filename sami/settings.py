@@ -12,11 +12,15 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 import environ
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# اجرای تست‌ها با "manage.py test"
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 # Environment
 env = environ.Env(
     DEBUG=(bool, True),
@@ -214,6 +218,76 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 MEILI_URL = env("MEILI_URL", default="http://127.0.0.1:7700")
 MEILI_API_KEY = env("MEILI_API_KEY", default=None)
 
+############################
+# Site Analytics (core.middleware.SiteAnalyticsMiddleware)
+############################
+
+# بازدیدها در صف حافظه قرار گرفته و در یک thread پس‌زمینه به‌صورت دسته‌ای (bulk_create) نوشته می‌شوند
+ANALYTICS_ASYNC_WRITES = env.bool("ANALYTICS_ASYNC_WRITES", default=not TESTING)
+ANALYTICS_BATCH_SIZE = env.int("ANALYTICS_BATCH_SIZE", default=200)  # نوشتن پس از N رکورد
+ANALYTICS_FLUSH_INTERVAL_MS = env.int("ANALYTICS_FLUSH_INTERVAL_MS", default=2000)  # یا پس از T میلی‌ثانیه
+ANALYTICS_MAX_QUEUE = env.int("ANALYTICS_MAX_QUEUE", default=10000)  # حداکثر طول صف در هر پروسس
+# رفتار در صورت پر بودن صف: "drop" (دور ریختن) یا "sync" (نوشتن همزمان در همان درخواست)
+ANALYTICS_OVERFLOW_POLICY = env("ANALYTICS_OVERFLOW_POLICY", default="drop")
+# کشور هنگام ثبت خالی می‌ماند و با "python manage.py enrich_countries" (مثلاً در cron) پر می‌شود
+ANALYTICS_DEFER_COUNTRY = env.bool("ANALYTICS_DEFER_COUNTRY", default=True)
+# آخرین بازدید بازدیدکننده ناشناس حداکثر هر N ثانیه یک بار نوشته می‌شود (مگر آی‌پی / کشور / مرورگر تغییر کند)
+ANALYTICS_VISITOR_UPDATE_INTERVAL = env.int("ANALYTICS_VISITOR_UPDATE_INTERVAL", default=300)
+# شناسه بازدیدکننده ناشناس در یک کوکی امضاشده (به جای ساختن session در پایگاه داده)
+ANALYTICS_VISITOR_COOKIE_NAME = env("ANALYTICS_VISITOR_COOKIE_NAME", default="sami_vid")
+ANALYTICS_VISITOR_COOKIE_AGE = env.int("ANALYTICS_VISITOR_COOKIE_AGE", default=365 * 86400)
+# ربات‌ها (User Agent شناخته‌شده یا بیش از N درخواست در دقیقه از یک آی‌پی) فقط در DailyBotCounter شمرده می‌شوند
+ANALYTICS_FILTER_BOTS = env.bool("ANALYTICS_FILTER_BOTS", default=True)
+ANALYTICS_BOT_MAX_REQUESTS_PER_MINUTE = env.int("ANALYTICS_BOT_MAX_REQUESTS_PER_MINUTE", default=120)  # 0 = غیرفعال
+# نمونه‌برداری از بازدیدها و کلیک‌های ناشناس: ثبت یک مورد از هر N برای هر مسیر (1 = ثبت همه)
+ANALYTICS_SAMPLE_RATE = env.int("ANALYTICS_SAMPLE_RATE", default=1)
+# با پر شدن صف بافر (50٪ / 75٪ / 90٪) نرخ به‌صورت خودکار 2 / 4 / 8 برابر می‌شود، حداکثر تا ANALYTICS_MAX_SAMPLE_RATE
+ANALYTICS_ADAPTIVE_SAMPLING = env.bool("ANALYTICS_ADAPTIVE_SAMPLING", default=True)
+ANALYTICS_MAX_SAMPLE_RATE = env.int("ANALYTICS_MAX_SAMPLE_RATE", default=100)
+# با تنظیم پوشه، رکوردها به جای پایگاه داده در فایل‌های JSONL فقط-افزودنی نوشته می‌شوند و
+# "python manage.py ingest_analytics_spool" (در cron یا با --follow) آن‌ها را به پایگاه داده منتقل می‌کند
+ANALYTICS_SPOOL_DIR = env("ANALYTICS_SPOOL_DIR", default="")
+ANALYTICS_SPOOL_SEGMENT_SECONDS = env.int("ANALYTICS_SPOOL_SEGMENT_SECONDS", default=60)  # طول هر segment
+# تعداد شمارنده‌های Space-Saving هر روز برای پنل‌های پرتکرار (صفحات، ارجاع‌دهنده‌ها، کشورها، ویدیوها)
+ANALYTICS_TOP_K = env.int("ANALYTICS_TOP_K", default=200)
+# داده خام قدیمی‌تر از N روز با "python manage.py archive_analytics" بایگانی و حذف می‌شود (0 = غیرفعال)
+ANALYTICS_RETENTION_DAYS = env.int("ANALYTICS_RETENTION_DAYS", default=180)
+# فایل‌های gzip JSONL به تفکیک روز: <dir>/<model>/YYYY/MM/<model>-YYYY-MM-DD.jsonl.gz
+ANALYTICS_ARCHIVE_DIR = env("ANALYTICS_ARCHIVE_DIR", default=str(BASE_DIR / "archives" / "analytics"))
+
+# شمارنده‌های داشبورد مدیریت برای N ثانیه cache می‌شوند و با ذخیره / حذف مدل‌های مرتبط باطل می‌شوند (0 = بدون cache)
+ADMIN_DASHBOARD_CACHE_TIMEOUT = env.int("ADMIN_DASHBOARD_CACHE_TIMEOUT", default=60)
+
+############################
+# Assessments (assessments.bank)
+############################
+
+# snapshot بانک سوالات هر آزمون N ثانیه در cache می‌ماند؛ ویرایش آزمون / سوالات نسخه بانک را عوض می‌کند
+ASSESSMENT_BANK_CACHE_TIMEOUT = env.int("ASSESSMENT_BANK_CACHE_TIMEOUT", default=86400)
+# تعداد snapshot های نگه‌داشته‌شده در LRU درون‌پروسسی
+ASSESSMENT_BANK_LRU_SIZE = env.int("ASSESSMENT_BANK_LRU_SIZE", default=64)
+# نسخه بانک سوالات (در پایگاه داده) هر N ثانیه یک بار در هر پروسس دوباره خوانده می‌شود
+ASSESSMENT_BANK_VERSION_TTL = env.int("ASSESSMENT_BANK_VERSION_TTL", default=2)
+# آزمون تطبیقی (assessments.cat): تعداد سوال هر مرحله، حداکثر تعداد سوال و خطای استاندارد هدف برای توقف
+ASSESSMENT_CAT_BATCH_SIZE = env.int("ASSESSMENT_CAT_BATCH_SIZE", default=3)
+ASSESSMENT_CAT_MAX_ITEMS = env.int("ASSESSMENT_CAT_MAX_ITEMS", default=15)
+ASSESSMENT_CAT_TARGET_SE = env.float("ASSESSMENT_CAT_TARGET_SE", default=0.6)
+
+############################
+# GeoIP (core.geoip)
+############################
+
+# "local": جستجو در فایل بازه‌های IP (بدون درخواست شبکه) | "http": ipapi.co / ip-api.com
+GEOIP_BACKEND = env("GEOIP_BACKEND", default="local")
+# فایل با دستور "python manage.py build_geoip_db <csv>" ساخته می‌شود
+GEOIP_DATABASE_PATH = env("GEOIP_DATABASE_PATH", default=str(BASE_DIR / "geoip" / "ip-country.bin"))
+# فاصله (ثانیه) بررسی تغییر فایل یا تلاش دوباره وقتی فایل در دسترس نیست
+GEOIP_DATABASE_RECHECK_INTERVAL = env.int("GEOIP_DATABASE_RECHECK_INTERVAL", default=60)
+# cache نتایج resolver های کند (http): نتیجه موفق، نتیجه منفی و اندازه LRU درون‌پروسسی
+GEOIP_CACHE_TTL = env.int("GEOIP_CACHE_TTL", default=86400)
+GEOIP_NEGATIVE_CACHE_TTL = env.int("GEOIP_NEGATIVE_CACHE_TTL", default=3600)
+GEOIP_LRU_SIZE = env.int("GEOIP_LRU_SIZE", default=4096)
+
 ############################
 # Payments (django-payments) - configure providers via env
 ############################
@@ -283,11 +357,13 @@ SECURE_BROWSER_XSS_FILTER = True
 X_FRAME_OPTIONS = "DENY"  # Changed from default to DENY for better security
 
 # Session Security
+# موتور session: "django.contrib.sessions.backends.db" (پیش‌فرض)، "...cached_db" یا "...signed_cookies"
+SESSION_ENGINE = env("SESSION_ENGINE", default="django.contrib.sessions.backends.db")
 SESSION_COOKIE_SECURE = env.bool("SESSION_COOKIE_SECURE", default=False)  # Set to True in production with HTTPS
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = "Lax"
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True  # Prevent session fixation
+SESSION_SAVE_EVERY_REQUEST = env.bool("SESSION_SAVE_EVERY_REQUEST", default=True)  # Prevent session fixation
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Session expires when browser closes
 
 # CSRF Security
@@ -31,6 +31,41 @@
         return null;
     }
 
+    // کلیک‌ها در صف جمع شده و به‌صورت دسته‌ای (sendBeacon) به سرور ارسال می‌شوند
+    const BATCH_ENDPOINT = '/api/youtube-clicks/';
+    const MAX_BATCH = 20;
+    const FLUSH_DELAY_MS = 5000;
+    let pendingClicks = [];
+    let flushTimer = null;
+
+    // ارسال کلیک‌های صف (بدون انتظار برای پاسخ)
+    function flushClicks() {
+        if (flushTimer) {
+            clearTimeout(flushTimer);
+            flushTimer = null;
+        }
+        if (!pendingClicks.length) {
+            return;
+        }
+        const body = JSON.stringify(pendingClicks);
+        pendingClicks = [];
+
+        // sendBeacon حتی پس از بسته شدن صفحه هم ارسال می‌شود
+        if (navigator.sendBeacon && navigator.sendBeacon(BATCH_ENDPOINT, new Blob([body], { type: 'text/plain' }))) {
+            return;
+        }
+        fetch(BATCH_ENDPOINT, {
+            method: 'POST',
+            headers: { 'Content-Type': 'text/plain' },
+            body: body,
+            credentials: 'same-origin',
+            keepalive: true
+        }).catch(function(error) {
+            // خطا را نادیده بگیر (برای اینکه لینک باز شود)
+            console.warn('Failed to track YouTube clicks:', error);
+        });
+    }
+
     // تابع ثبت کلیک
     function trackYouTubeClick(event) {
         const link = event.currentTarget;
@@ -42,46 +77,29 @@
         }
 
         // دریافت اطلاعات منبع از data attributes
-        const sourceType = link.dataset.sourceType || 'other';
-        const sourceId = link.dataset.sourceId || '';
-        const sourceTitle = link.dataset.sourceTitle || link.textContent.trim() || '';
-
-        // ارسال درخواست به سرور (بدون انتظار برای پاسخ)
-        fetch('/api/youtube-click/', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'X-CSRFToken': getCookie('csrftoken') || ''
-            },
-            body: new URLSearchParams({
-                'youtube_url': youtubeUrl,
-                'source_type': sourceType,
-                'source_id': sourceId,
-                'source_title': sourceTitle
-            }),
-            keepalive: true // برای اینکه درخواست حتی بعد از بسته شدن صفحه هم ارسال شود
-        }).catch(function(error) {
-            // خطا را نادیده بگیر (برای اینکه لینک باز شود)
-            console.warn('Failed to track YouTube click:', error);
+        pendingClicks.push({
+            'youtube_url': youtubeUrl,
+            'source_type': link.dataset.sourceType || 'other',
+            'source_id': link.dataset.sourceId || '',
+            'source_title': link.dataset.sourceTitle || link.textContent.trim() || ''
         });
-    }
 
-    // تابع دریافت CSRF token از cookie
-    function getCookie(name) {
-        let cookieValue = null;
-        if (document.cookie && document.cookie !== '') {
-            const cookies = document.cookie.split(';');
-            for (let i = 0; i < cookies.length; i++) {
-                const cookie = cookies[i].trim();
-                if (cookie.substring(0, name.length + 1) === (name + '=')) {
-                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
-                    break;
-                }
-            }
+        if (pendingClicks.length >= MAX_BATCH) {
+            flushClicks();
+        } else if (!flushTimer) {
+            // لینک‌هایی که در تب جدید باز می‌شوند صفحه را پنهان نمی‌کنند
+            flushTimer = setTimeout(flushClicks, FLUSH_DELAY_MS);
         }
-        return cookieValue;
     }
 
+    // ارسال صف هنگام ترک یا پنهان شدن صفحه
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') {
+            flushClicks();
+        }
+    });
+    window.addEventListener('pagehide', flushClicks);
+
     // اضافه کردن event listener به همه لینک‌های یوتیوب
     function initTracking() {
         // لینک‌های موجود در صفحه